@@ -0,0 +1,365 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: benchmark
+
+This module provides microbenchmarks for the hot paths of the
+`Robotics in Concert`_ (ROCON) scheduler: :class:`.PriorityQueue`
+operations under churn, backfill dispatching of a long ready queue,
+and :class:`.ResourcePool` allocation, matching, client updates and
+``KnownResources`` conversion, across a range of fleet sizes and
+request widths.
+
+No ROS master is needed.  Results are saved as JSON, keyed by case
+name, so runs from different commits can be compared with
+:func:`.compare`.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import json
+import platform
+import random
+import uuid
+
+import unique_id
+from concert_msgs.msg import ConcertClient
+from rocon_app_manager_msgs.msg import App
+from rocon_scheduler_requests.transitions import ActiveRequest
+from rocon_std_msgs.msg import PlatformInfo
+from scheduler_msgs.msg import Request, Resource
+
+from .match_stats import clock
+from .priority_queue import PriorityQueue, QueueElement
+from .resource_pool import CurrentStatus, KnownResources, ResourcePool
+from .scheduler_core import LocalScheduler, SchedulerCore
+
+FLEET_SIZES = (10, 100, 1000, 10000, 100000)
+""" Default numbers of resources in the benchmark pools. """
+REQUEST_WIDTHS = (1, 2, 4, 8, 16)
+""" Default numbers of resources wanted by each benchmark request. """
+BATCH = 100
+""" Number of queue operations timed together. """
+RAPP = 'rocon_apps/teleop'
+""" Rapp advertised by every benchmark resource. """
+NAMESPACE = 'rocon:/turtlebot'
+""" Namespace of every benchmark resource. """
+
+
+def case_name(op, fleet, width=None):
+    """ :returns: (str) benchmark case name, like
+        ``'pool_allocate/n=1000/w=4'``. """
+    name = op + '/n=' + str(fleet)
+    if width is not None:
+        name += '/w=' + str(width)
+    return name
+
+
+def compare(old, new, threshold=0.1):
+    """ Compare two sets of benchmark results.
+
+    :param old: Baseline results :class:`dict`, as saved by :func:`main`.
+    :param new: New results :class:`dict`.
+    :param threshold: (float) Relative slowdown reported as a
+        regression.
+    :returns: Sorted list of ``(name, ratio, regressed)`` tuples for
+        every case in both, where *ratio* is the new best time over
+        the old one.
+    """
+    report = []
+    old_cases = old['cases']
+    for name, case in sorted(new['cases'].items()):
+        if name in old_cases and old_cases[name]['best'] > 0.0:
+            ratio = case['best'] / old_cases[name]['best']
+            report.append((name, ratio, ratio > 1.0 + threshold))
+    return report
+
+
+def make_clients(fleet):
+    """ :returns: list of *fleet* ``ConcertClient`` messages. """
+    return [ConcertClient(name='r' + str(i),
+                          platform_info=PlatformInfo(uri=NAMESPACE + '/r'
+                                                     + str(i)),
+                          apps=[App(name=RAPP)])
+            for i in range(fleet)]
+
+
+def make_pool(fleet, engine=None):
+    """ :returns: :class:`.ResourcePool` of *fleet* available
+        resources, built from a ``KnownResources`` message. """
+    return ResourcePool(KnownResources(resources=[
+        CurrentStatus(uri=NAMESPACE + '/r' + str(i), rapps=[RAPP])
+        for i in range(fleet)]), engine=engine)
+
+
+def make_request(width, priority=0, rng=random):
+    """ :returns: :class:`.ActiveRequest` wanting *width* resources
+        from :const:`NAMESPACE`. """
+    rq_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+    return ActiveRequest(Request(
+        id=unique_id.toMsg(rq_id), priority=priority,
+        resources=[Resource(rapp=RAPP, uri=NAMESPACE)
+                   for i in range(width)]))
+
+
+def measure(func, ops=1, min_time=0.1, setup=None):
+    """ Time repeated calls to a benchmark function.
+
+    :param func: Function to time, called with no arguments.
+    :param ops: (int) Number of operations each call performs.
+    :param min_time: (float) Minimum total seconds to spend timing.
+    :param setup: Untimed function called before each call, or ``None``.
+    :returns: :class:`dict` with the ``best`` and ``mean`` seconds per
+        operation and the total ``ops`` timed.
+
+    Without a *setup* function, quick calls are timed in loops of
+    increasing length, until one loop takes a tenth of *min_time*.
+    Keeps timing until that has been done at least three times for
+    *min_time* seconds in all, or ten times *min_time* has elapsed,
+    including the *setup*.  The best time is least affected by other
+    activity on the machine, so :func:`.compare` uses that.
+    """
+    loops = 1
+    if setup is None:
+        while True:
+            start = clock()
+            for i in range(loops):
+                func()
+            if clock() - start >= min_time / 10.0 or loops >= 1000000:
+                break
+            loops *= 10
+    times = []
+    deadline = clock() + 10.0 * min_time
+    while (not times or clock() < deadline
+           and (len(times) < 3 or sum(times) < min_time)):
+        if setup is not None:
+            setup()
+        start = clock()
+        for i in range(loops):
+            func()
+        times.append(clock() - start)
+    ops *= loops
+    return {'best': min(times) / ops,
+            'mean': sum(times) / (len(times) * ops),
+            'ops': len(times) * ops}
+
+
+def bench_dispatch(size, min_time=0.1, seed=0):
+    """ Benchmark backfill dispatching of a long ready queue.
+
+    :param size: (int) Number of requests waiting in the ready queue.
+    :returns: :class:`dict` of results, by case name.
+
+    Every resource is already granted, so no waiting request can be
+    satisfied, and each dispatch walks the whole queue, as a busy
+    scheduler in ``backfill`` mode does after every request message.
+    The waiting requests have several priorities and widths.
+    """
+    rng = random.Random(seed)
+    requester_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+    core = SchedulerCore(pool=make_pool(4), dispatch_mode='backfill')
+    core.sch = LocalScheduler(core.callback)
+    core.sch.submit(requester_id, [make_request(2, 10, rng),
+                                   make_request(2, 10, rng)])
+    for i in range(size):
+        core.queue(make_request(rng.randrange(1, 4), rng.randrange(3), rng),
+                   requester_id)
+    return {case_name('dispatch_backfill', size): measure(
+        core.dispatch, min_time=min_time)}
+
+
+def bench_pool(fleet, widths, engine=None, min_time=0.1):
+    """ Benchmark :class:`.ResourcePool` operations for one fleet size.
+
+    :returns: :class:`dict` of results, by case name.
+
+    Each ``pool_allocate`` operation also releases its resources
+    again.  Each ``pool_update`` alternates between the whole fleet
+    and one missing a tenth of its clients.
+    """
+    results = {}
+    pool = make_pool(fleet, engine)
+    criteria = {CurrentStatus.AVAILABLE}
+    for width in widths:
+        if width > fleet:
+            continue
+        request = make_request(width)
+
+        def allocate():
+            pool.release_resources(pool.allocate(request))
+
+        def match():
+            pool.match_list(request.msg.resources, criteria)
+
+        results[case_name('pool_allocate', fleet, width)] = measure(
+            allocate, min_time=min_time)
+        results[case_name('pool_match_list', fleet, width)] = measure(
+            match, min_time=min_time)
+
+    results[case_name('pool_known_resources', fleet)] = measure(
+        pool.known_resources, min_time=min_time)
+    clients = make_clients(fleet)
+    lists = [clients, clients[fleet // 10:]]
+
+    def update():
+        pool.update(lists[0])
+        lists.reverse()
+
+    results[case_name('pool_update', fleet)] = measure(
+        update, min_time=min_time)
+    return results
+
+
+def bench_queue(size, min_time=0.1, seed=0):
+    """ Benchmark :class:`.PriorityQueue` operations under churn.
+
+    :param size: (int) Number of elements kept in the queue.
+    :returns: :class:`dict` of results, by case name.
+
+    Times batches of :const:`BATCH` adds, pops, removes and priority
+    changes.  Removed elements stay in the heap until popped, as they
+    would in a busy scheduler.
+    """
+    rng = random.Random(seed)
+    requester_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+    queue = PriorityQueue()
+    for i in range(size):
+        queue.add(QueueElement(make_request(1, rng.randrange(10), rng),
+                               requester_id))
+    batch = [QueueElement(make_request(1, 10, rng), requester_id)
+             for i in range(BATCH)]
+    results = {}
+
+    def add():
+        for elem in batch:
+            queue.add(elem)
+
+    def discard():
+        for elem in batch:
+            if elem in queue:
+                queue.remove(elem)
+
+    def pop():
+        for i in range(BATCH):
+            queue.pop()
+
+    def remove():
+        for elem in batch:
+            queue.remove(elem)
+
+    def reprioritize():
+        for elem in rng.sample(list(queue), min(BATCH, len(queue))):
+            queue.add(elem, rng.randrange(10))
+
+    results[case_name('queue_add', size)] = measure(
+        add, BATCH, min_time, setup=discard)
+    results[case_name('queue_pop', size)] = measure(
+        pop, BATCH, min_time, setup=add)
+    results[case_name('queue_remove', size)] = measure(
+        remove, BATCH, min_time, setup=add)
+    if size > 0:
+        results[case_name('queue_reprioritize', size)] = measure(
+            reprioritize, BATCH, min_time)
+    return results
+
+
+def run(sizes=FLEET_SIZES, widths=REQUEST_WIDTHS, engine=None,
+        min_time=0.1, label=''):
+    """ Run the benchmark suite.
+
+    :param sizes: Fleet and queue sizes to benchmark.
+    :param widths: Request widths to benchmark.
+    :param engine: Resource pool storage engine, see :class:`.ResourcePool`.
+    :param min_time: (float) Minimum seconds to spend timing each case.
+    :param label: (str) Label saved with the results, like a commit ID.
+    :returns: :class:`dict` containing a ``cases`` :class:`dict` of
+        results, by case name, and information about this run.
+    """
+    cases = {}
+    for size in sizes:
+        cases.update(bench_queue(size, min_time))
+        cases.update(bench_dispatch(size, min_time))
+        cases.update(bench_pool(size, widths, engine, min_time))
+    return {'label': label,
+            'engine': engine or 'object',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cases': cases}
+
+
+def main(argv=None):
+    """ Benchmark command line entry point.
+
+    Runs the suite, saves or prints its results as JSON, and
+    optionally compares them with a baseline file, returning 1 if
+    anything regressed.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark ROCON scheduler queue and pool operations.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=FLEET_SIZES,
+                        help='fleet and queue sizes')
+    parser.add_argument('--widths', type=int, nargs='+',
+                        default=REQUEST_WIDTHS, help='request widths')
+    parser.add_argument('--engine', default='object',
+                        choices=['object', 'columnar'])
+    parser.add_argument('--min-time', type=float, default=0.1,
+                        help='minimum seconds timed for each case')
+    parser.add_argument('--label', default='',
+                        help='label saved with the results')
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON results file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args(argv)
+    results = run(args.sizes, args.widths, args.engine, args.min_time,
+                  args.label)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    elif not args.compare:
+        print(text)
+    if not args.compare:
+        return 0
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    regressed = False
+    for name, ratio, slower in compare(baseline, results, args.threshold):
+        print('{0:40s} {1:7.3f}{2}'.format(name, ratio,
+                                           '  REGRESSION' if slower else ''))
+        regressed = regressed or slower
+    return int(regressed)
@@ -0,0 +1,157 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: blocked_index
+
+This module indexes blocked `Robotics in Concert`_ (ROCON) scheduler
+requests by the resources they are waiting for, so that when a
+resource appears only the requests it could help are re-evaluated.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+from .resource_pool import CurrentStatus, rocon_name
+from .sharded_pool import ROCON_PREFIX, literal_prefix, rocon_namespace
+
+
+def pattern_namespace(pattern):
+    """ Get the top-level namespace every match of a ROCON name
+    *pattern* must belong to.
+
+    :param pattern: Canonical ROCON name, maybe a regular expression.
+    :returns: (str) Namespace, like ``'turtlebot'`` for
+        ``'rocon:/turtlebot/.*'``, or ``None`` if the pattern could
+        match names in more than one namespace.
+    """
+    prefix = literal_prefix(pattern)
+    if not prefix.startswith(ROCON_PREFIX):
+        return None
+    parts = prefix[len(ROCON_PREFIX):].split('/', 1)
+    if len(parts) < 2:                  # namespace not terminated?
+        return None                     # 'rocon:/turtlebot' matches more
+    return parts[0]
+
+
+class BlockedIndex(object):
+    """ Index of blocked requests, by the rapp and resource name
+    patterns of the requested items they are waiting for.
+
+    .. describe:: len(index)
+
+       :returns: The number of requests in the *index*.
+
+    .. describe:: request_id in index
+
+       :returns: ``True`` if the request with :class:`uuid.UUID`
+           *request_id* is in the *index*.
+
+    Items are filed under their rapp and the namespace their name
+    pattern is confined to, or no namespace for patterns like
+    ``rocon:/.*/roberto`` that could match anywhere.
+    """
+    def __init__(self):
+        """ Constructor. """
+        self._buckets = {}
+        self._keys = {}
+
+    def __contains__(self, request_id):
+        return request_id in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, request, pool):
+        """ Add a blocked *request* to the index.
+
+        :param request: Request waiting for resources.
+        :type request: :class:`.ActiveRequest`
+        :param pool: Current resource pool.
+        :type pool: :class:`.ResourcePool`
+
+        Only items no current pool resource could satisfy are indexed.
+        If every item matches something, there are just not enough
+        resources, so all items are indexed.
+        """
+        self.remove(request.uuid)
+        criteria = {CurrentStatus.AVAILABLE, CurrentStatus.ALLOCATED}
+        resources = request.msg.resources
+        waiting = [res for res in resources
+                   if not pool.match_list([res], criteria)]
+        if not waiting:                 # just not enough resources?
+            waiting = resources
+        keys = set()
+        for res in waiting:
+            pattern = rocon_name(res.uri)
+            key = (res.rapp, pattern_namespace(pattern))
+            patterns = self._buckets.setdefault(key, {}).setdefault(
+                request.uuid, set())
+            patterns.add(pattern)
+            keys.add(key)
+        self._keys[request.uuid] = keys
+
+    def candidates(self, pool_res):
+        """ Find blocked requests a resource could help.
+
+        :param pool_res: Resource that just appeared.
+        :type pool_res: :class:`.PoolResource`
+        :returns: :class:`set` of :class:`uuid.UUID` of requests
+            waiting for some item *pool_res* matches.
+        """
+        found = set()
+        namespace = rocon_namespace(pool_res.uri)
+        for rapp in pool_res.rapps:
+            for key in [(rapp, namespace), (rapp, None)]:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                for request_id, patterns in bucket.items():
+                    if request_id in found:
+                        continue
+                    for pattern in patterns:
+                        if pool_res.match_pattern(pattern, rapp):
+                            found.add(request_id)
+                            break
+        return found
+
+    def remove(self, request_id):
+        """ Remove a request from the index, if present.
+
+        :param request_id: :class:`uuid.UUID` of the request.
+        """
+        for key in self._keys.pop(request_id, ()):
+            bucket = self._buckets[key]
+            del bucket[request_id]
+            if not bucket:
+                del self._buckets[key]
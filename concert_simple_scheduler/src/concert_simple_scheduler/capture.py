@@ -0,0 +1,370 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: capture
+
+This module records the traffic seen by a `Robotics in Concert`_
+(ROCON) scheduler, and replays it offline, so production slowdowns
+can be reproduced and captured traces used as regression benchmarks.
+
+A capture file is gzip-compressed text, with one JSON array per
+line.  The first is a header, each of the others holds one scheduler
+request set or one concert clients list, with the seconds elapsed
+since recording started.  Messages are stored as plain data, only
+the fields the scheduler uses, and rebuilt when loaded, so captures
+do not depend on the message class layout or Python version.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import copy
+import gzip
+import json
+import threading
+import time
+import uuid
+
+from concert_msgs.msg import ConcertClient, ConcertClients
+from rocon_app_manager_msgs.msg import App
+from rocon_scheduler_requests.transitions import ActiveRequest
+from rocon_scheduler_requests.transitions import TransitionError
+from rocon_std_msgs.msg import PlatformInfo
+from scheduler_msgs.msg import Request
+
+from .journal import request_data, request_msg
+from .match_stats import clock
+from .metrics import Histogram
+from .policy import POLICIES, make_policy
+from .scheduler_core import LocalScheduler, SchedulerCore
+
+HEADER = 'rocon_scheduler_capture'
+""" Header record: [:const:`HEADER`, format version, start time]. """
+REQUESTS = 'requests'
+""" Request set record: [:const:`REQUESTS`, elapsed seconds,
+requester ID, list of requests].  Loaded, the requester ID is a
+:class:`uuid.UUID` and the requests ``scheduler_msgs/Request``
+messages. """
+CLIENTS = 'clients'
+""" Concert clients record: [:const:`CLIENTS`, elapsed seconds, list
+of clients].  Loaded, the clients are ``ConcertClient`` messages. """
+
+VERSION = 2
+""" Capture file format version. """
+
+
+class Recorder(object):
+    """ Scheduler traffic recorder.
+
+    :param path: Name of the capture file to write.
+
+    Records may be written from several threads.  The file is only
+    complete after :meth:`close`, but records written before a crash
+    can usually still be read.
+    """
+    def __init__(self, path):
+        """ Constructor. """
+        self.path = path
+        """ Capture file name. """
+        self.records = 0
+        """ Number of records written, not counting the header. """
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wb')
+        self._start = clock()
+        self._write([HEADER, VERSION, time.time()])
+
+    def clients(self, msg):
+        """ Record a ``concert_msgs/ConcertClients`` message. """
+        self._write([CLIENTS, clock() - self._start,
+                     [client_data(client) for client in msg.clients]])
+
+    def close(self):
+        """ Close the capture file. """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def requests(self, rset):
+        """ Record a scheduler request set.
+
+        :param rset: Request set passed to the scheduler callback,
+            with a *requester_id* attribute and :class:`.ActiveRequest`
+            values.
+        """
+        self._write([REQUESTS, clock() - self._start,
+                     rset.requester_id.hex,
+                     [request_data(rq.msg) for rq in rset.values()]])
+
+    def _write(self, record):
+        """ Write one *record*, unless closed. """
+        data = (json.dumps(record, separators=(',', ':'))
+                + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is not None:
+                self._file.write(data)
+                self.records += 1
+
+
+def client_data(client):
+    """ :returns: :class:`dict` of the name, URI and rapp names of a
+        ``concert_msgs/ConcertClient`` message, for a capture file. """
+    return {'name': client.name,
+            'uri': client.platform_info.uri,
+            'rapps': [app.name for app in client.apps]}
+
+
+def client_msg(data):
+    """ :returns: ``concert_msgs/ConcertClient`` message rebuilt from
+        :func:`client_data`. """
+    return ConcertClient(name=data['name'],
+                         platform_info=PlatformInfo(uri=data['uri']),
+                         apps=[App(name=name) for name in data['rapps']])
+
+
+def load(path):
+    """ Read a capture file.
+
+    :param path: Name of the capture file.
+    :returns: (start time, list of records), not including the header,
+        with their messages rebuilt.
+    :raises: :exc:`ValueError` if not a scheduler capture file.
+
+    A partial record at the end, left by a crash while recording, is
+    ignored.
+    """
+    records = []
+    with gzip.open(path, 'rb') as f:
+        try:
+            header = json.loads(f.readline().decode('utf-8'))
+        except (EOFError, IOError, ValueError):
+            raise ValueError('not a scheduler capture: ' + str(path))
+        if (not isinstance(header, list) or len(header) != 3
+                or header[0] != HEADER or header[1] != VERSION):
+            raise ValueError('not a scheduler capture: ' + str(path))
+        try:
+            for line in f:
+                if not line.endswith(b'\n'):  # truncated record?
+                    break
+                record = json.loads(line.decode('utf-8'))
+                if record[0] == REQUESTS:
+                    record[2] = uuid.UUID(record[2])
+                    record[3] = [request_msg(data) for data in record[3]]
+                elif record[0] == CLIENTS:
+                    record[2] = [client_msg(data) for data in record[2]]
+                records.append(tuple(record))
+        except (EOFError, IOError):     # compressed data cut short
+            pass
+    return header[2], records
+
+
+class Replayer(object):
+    """ Replay driver for captured scheduler traffic.
+
+    :param core: :class:`.SchedulerCore` to drive, or ``None`` for a
+        new one with an empty :class:`.ResourcePool`.
+    :param speed: (float) Replay speed relative to the recording,
+        like 1.0 for real time or 10.0 for ten times faster, or zero
+        to replay as fast as possible.
+
+    New requests in each recorded request set are submitted to the
+    *core*, and canceled ones are canceled, through a
+    :class:`.LocalScheduler`.  Other request states are what the
+    original scheduler reported, so they are ignored: the replayed
+    *core* makes its own decisions.
+    """
+    def __init__(self, core=None, speed=0.0):
+        """ Constructor. """
+        if core is None:
+            core = SchedulerCore()
+        self.core = core
+        """ :class:`.SchedulerCore` being driven. """
+        self.sch = LocalScheduler(core.callback, self.feedback)
+        """ :class:`.LocalScheduler` delivering the requests. """
+        core.sch = self.sch
+        self.speed = speed
+        """ Replay speed, or zero for as fast as possible. """
+        self.decisions = []
+        """ List of grant decisions, in order, each a :class:`dict`
+        with the request and requester IDs, the resources granted,
+        and the replay ``time`` and ``latency`` in seconds. """
+        self.timings = {'requests': Histogram(), 'clients': Histogram()}
+        """ :class:`.Histogram` of the seconds spent handling each
+        kind of record. """
+        self.lag = Histogram()
+        """ :class:`.Histogram` of seconds each record was handled
+        behind schedule, when not replaying as fast as possible. """
+        self.requests = {}              # active requests, by UUID
+        self.waiting = {}               # submit times, by requester
+        self._start = None
+
+    def feedback(self, requester_id):
+        """ Requester feedback callback from the :class:`.LocalScheduler`.
+
+        Records any waiting requests that were just granted.
+        """
+        granted = self.core.granted
+        now = clock() - self._start
+        waiting = self.waiting.get(requester_id, {})
+        for request_id, submitted in list(waiting.items()):
+            if request_id in granted:
+                del waiting[request_id]
+                msg = granted[request_id].request.msg
+                self.decisions.append({
+                    'request': request_id.hex,
+                    'requester': requester_id.hex,
+                    'resources': [res.uri for res in msg.resources],
+                    'time': now,
+                    'latency': now - submitted})
+
+    def replay_clients(self, clients):
+        """ Replay a concert clients record. """
+        self.core.track_clients(ConcertClients(clients=clients))
+
+    def replay_requests(self, requester_id, msgs):
+        """ Replay a request set record.
+
+        :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+        :param msgs: List of ``scheduler_msgs/Request`` messages, as
+            passed to the original scheduler.
+        """
+        changes = []
+        waiting = self.waiting.setdefault(requester_id, {})
+        for msg in msgs:
+            rq = ActiveRequest(copy.deepcopy(msg))
+            if msg.status == Request.NEW:
+                if rq.uuid not in self.requests:
+                    self.requests[rq.uuid] = rq
+                    waiting[rq.uuid] = clock() - self._start
+                    changes.append(rq)
+            elif msg.status == Request.CANCELING:
+                active = self.requests.pop(rq.uuid, None)
+                if active is None:      # unknown, or already canceled
+                    continue
+                waiting.pop(rq.uuid, None)
+                elem = self.core.granted.get(rq.uuid)
+                if elem is not None:    # cancel the granted copy
+                    active = elem.request
+                try:
+                    active.cancel()
+                except TransitionError:  # already closed?
+                    continue
+                changes.append(active)
+        if changes:
+            self.sch.submit(requester_id, changes)
+
+    def results(self):
+        """ :returns: :class:`dict` of replay results, by name.
+
+        Contains the list of grant ``decisions``, and summaries of
+        the handling time for each kind of record, the schedule lag,
+        and the scheduler core's own metrics, prefixed with ``core_``.
+        """
+        values = {'decisions': self.decisions,
+                  'grants': len(self.decisions),
+                  'waiting': sum(len(waiting)
+                                 for waiting in self.waiting.values())}
+        for kind, hist in self.timings.items():
+            for key, value in hist.as_dict().items():
+                values[kind + '_' + key] = value
+        for key, value in self.lag.as_dict().items():
+            values['lag_' + key] = value
+        for key, value in self.core.metrics_sample().items():
+            values['core_' + key] = value
+        return values
+
+    def run(self, records):
+        """ Replay captured records.
+
+        :param records: List of records, as returned by :func:`load`.
+        :returns: :class:`dict` of :meth:`results`, plus the number of
+            ``records`` replayed and the ``wall_time`` spent.
+        """
+        self._start = clock()
+        for record in records:
+            kind, elapsed = record[:2]
+            if self.speed > 0.0:
+                delay = elapsed / self.speed - (clock() - self._start)
+                if delay > 0.0:
+                    time.sleep(delay)
+                else:
+                    self.lag.add(-delay)
+            start = clock()
+            if kind == REQUESTS:
+                self.replay_requests(*record[2:])
+            elif kind == CLIENTS:
+                self.replay_clients(*record[2:])
+            else:
+                continue                # unknown record kind
+            self.timings[kind].add(clock() - start)
+        values = self.results()
+        values['records'] = len(records)
+        values['wall_time'] = clock() - self._start
+        return values
+
+
+def main(argv=None):
+    """ Replay command line entry point.
+
+    Replays one capture file and prints a summary of the results as
+    JSON, optionally saving them all, with every grant decision.
+    """
+    parser = argparse.ArgumentParser(
+        description='Replay captured ROCON scheduler traffic, without ROS.')
+    parser.add_argument('capture', help='capture file to replay')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='replay speed, or 0 for as fast as possible')
+    parser.add_argument('--dispatch-mode', default='strict',
+                        choices=['strict', 'backfill'])
+    parser.add_argument('--fair-share', action='store_true',
+                        help='share resources fairly among requesters')
+    parser.add_argument('--preemption', action='store_true')
+    parser.add_argument('--policy', default='priority',
+                        choices=sorted(POLICIES))
+    parser.add_argument('--output',
+                        help='JSON file for all results and decisions')
+    args = parser.parse_args(argv)
+    start_time, records = load(args.capture)
+    core = SchedulerCore(preemption=args.preemption,
+                         dispatch_mode=args.dispatch_mode,
+                         policy=make_policy(args.policy),
+                         fair_share={} if args.fair_share else None)
+    results = Replayer(core, args.speed).run(records)
+    results['start_time'] = start_time
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    del results['decisions']
+    print(json.dumps(results, indent=2, sort_keys=True))
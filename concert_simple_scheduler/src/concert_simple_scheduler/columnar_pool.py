@@ -0,0 +1,433 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: columnar_pool
+
+This module provides a columnar storage engine for the resource pool
+of the `Robotics in Concert`_ (ROCON) scheduler.  It keeps the state
+of every resource in NumPy_ arrays, so matching a request against
+very large pools of (possibly simulated) resources is vectorized,
+instead of scanning a dictionary of Python objects.
+
+The NumPy_ package is an optional dependency, only needed when this
+engine is selected.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import re
+
+try:
+    import numpy
+except ImportError:                     # NumPy is optional
+    numpy = None
+
+from .resource_pool import CurrentStatus, PoolResource, ResourcePool
+from .resource_pool import rocon_name
+
+
+class ColumnarResourcePool(ResourcePool):
+    """
+    This class manages a pool of resources known to the scheduler,
+    storing their state in NumPy arrays.
+
+    :param msg: An optional ``scheduler_msgs/KnownResources`` or
+        ``scheduler_msgs/Request`` message or a list of
+        ``CurrentStatus`` or ``Resource`` messages, like the
+        ``resources`` component of one of those messages.
+    :param engine: ``None`` or ``'columnar'``, accepted for
+        compatibility with the :class:`.ResourcePool` constructor.
+    :raises: :exc:`ImportError` if NumPy is not available.
+    :raises: :exc:`ValueError` if *engine* is anything else.
+
+    Each resource occupies one row of these parallel arrays:
+
+     * ``status``: the ``CurrentStatus`` value of each resource.
+     * ``owner_index``: index of the owning request in an interned
+       owner table, or -1 if not allocated.
+     * ``priority``: priority of the owning request.
+     * ``capabilities``: boolean matrix with one column for each
+       known rapp name.
+
+    The ``allocate()``, ``match_list()`` and release methods have the
+    same interface as :class:`.ResourcePool`.  The *pool* attribute
+    is a :class:`.ColumnarViews` mapping, which returns a
+    :class:`.ColumnarResource` view for each resource, so the
+    existing object API continues to work.
+
+    Snapshots share the arrays with their parent pool, until either
+    one modifies them.
+
+    """
+    def __init__(self, msg=None, engine=None):
+        """ Constructor. """
+        if numpy is None:
+            raise ImportError('NumPy is required for the columnar '
+                              'resource pool engine')
+        super(ColumnarResourcePool, self).__init__()
+        self.pool = ColumnarViews(self)
+        self.status = numpy.zeros(0, dtype=numpy.int8)
+        """ Status of each resource row. """
+        self.owner_index = numpy.zeros(0, dtype=numpy.int32)
+        """ Owner table index for each resource row, -1 if none. """
+        self.priority = numpy.zeros(0, dtype=numpy.int32)
+        """ Owner priority for each resource row. """
+        self.capabilities = numpy.zeros((0, 0), dtype=numpy.bool_)
+        """ Matrix of rapps advertised by each resource row. """
+        self.uris = []
+        """ Resource name for each row. """
+        self.rapp_columns = {}
+        """ Dictionary of capability column numbers, by rapp name. """
+        self.rapp_names = []
+        """ Rapp name for each capability column. """
+        self._rows = {}
+        self._owners = []
+        self._owner_refs = []
+        self._owner_slots = {}
+        self._free_slots = []
+        self._pattern_masks = {}
+        self._columns_shared = False
+        self._rows_shared = False
+        if msg is not None:
+            if hasattr(msg, 'resources'):
+                msg = msg.resources
+            for res in msg:
+                self._insert(PoolResource(res))
+
+    def _get_owner(self, row):
+        """ :returns: :class:`uuid.UUID` owning *row*, or ``None``. """
+        slot = self.owner_index[row]
+        if slot < 0:
+            return None
+        return self._owners[slot]
+
+    def _grow_rows(self, capacity):
+        """ Extend all row arrays to *capacity*. """
+        extra = capacity - len(self.status)
+        self.status = numpy.concatenate(
+            (self.status, numpy.zeros(extra, dtype=numpy.int8)))
+        self.owner_index = numpy.concatenate(
+            (self.owner_index, numpy.full(extra, -1, dtype=numpy.int32)))
+        self.priority = numpy.concatenate(
+            (self.priority, numpy.zeros(extra, dtype=numpy.int32)))
+        self.capabilities = numpy.concatenate(
+            (self.capabilities,
+             numpy.zeros((extra, self.capabilities.shape[1]),
+                         dtype=numpy.bool_)))
+
+    def _insert(self, pool_res):
+        """ Add a new resource to the pool, as a new row.
+
+        :param pool_res: Resource to add.
+        :type pool_res: :class:`.PoolResource`
+        """
+        self._own_rows()
+        self._own_columns()
+        row = self._rows.get(pool_res.uri)
+        if row is not None:             # replacing an existing row?
+            self._set_owner(row, None)
+            self.capabilities[row, :] = False
+        else:
+            row = len(self.uris)
+            if row >= len(self.status):
+                self._grow_rows(max(16, 2 * row))
+            self.uris.append(pool_res.uri)
+            self._rows[pool_res.uri] = row
+            self.owner_index[row] = -1
+            self._pattern_masks = {}    # cached masks now too short
+        for rapp in pool_res.rapps:
+            col = self._rapp_column(rapp)  # may reallocate the matrix
+            self.capabilities[row, col] = True
+        self.status[row] = pool_res.status
+        self.priority[row] = pool_res.priority
+        self._set_owner(row, pool_res.owner)
+
+    def _match_subset(self, resource_msg, criteria):
+        """
+        Make a set of names of all available resources matching
+        *resource_msg*, using vectorized operations on the resource
+        arrays.
+
+        :param resource_msg: Resource message from a scheduler Request.
+        :type resource_msg: ``scheduler_msgs/Resource``
+        :param criteria: :class:`set` of resource status values allowed.
+        :returns: :class:`set` containing matching resource names.
+        """
+        col = self.rapp_columns.get(resource_msg.rapp)
+        if col is None:                 # nobody advertises this rapp?
+            return set()
+        n_rows = len(self.uris)
+        if self.stats is not None:
+            self.stats.resources_scanned += n_rows
+        mask = self.capabilities[:n_rows, col].copy()
+        mask &= numpy.isin(self.status[:n_rows], list(criteria))
+        mask &= self._pattern_mask(rocon_name(resource_msg.uri))
+        return set(self.uris[row] for row in numpy.flatnonzero(mask))
+
+    def _own_columns(self):
+        """ Copy the status, owner and priority columns, if still
+        shared with a snapshot, before modifying them. """
+        if self._columns_shared:
+            self.status = self.status.copy()
+            self.owner_index = self.owner_index.copy()
+            self.priority = self.priority.copy()
+            self._owners = list(self._owners)
+            self._owner_refs = list(self._owner_refs)
+            self._owner_slots = dict(self._owner_slots)
+            self._free_slots = list(self._free_slots)
+            self._columns_shared = False
+
+    def _own_rows(self):
+        """ Copy the resource names and capabilities, if still shared
+        with a snapshot, before adding rows. """
+        if self._rows_shared:
+            self.uris = list(self.uris)
+            self._rows = dict(self._rows)
+            self.rapp_columns = dict(self.rapp_columns)
+            self.rapp_names = list(self.rapp_names)
+            self.capabilities = self.capabilities.copy()
+            self._pattern_masks = dict(self._pattern_masks)
+            self._rows_shared = False
+
+    def _pattern_mask(self, pattern):
+        """ :returns: boolean array of the rows whose names match
+        the regular expression *pattern*.
+
+        Resource names only change when rows are added, so each mask
+        is cached until then.
+        """
+        mask = self._pattern_masks.get(pattern)
+        if self.stats is not None:
+            if mask is None:
+                self.stats.cache_misses += 1
+                self.stats.regex_evaluations += len(self.uris)
+            else:
+                self.stats.cache_hits += 1
+        if mask is None:
+            if len(self._pattern_masks) >= 1024:  # too many patterns?
+                self._pattern_masks = {}
+            matcher = re.compile(pattern).match
+            mask = numpy.fromiter((matcher(uri) is not None
+                                   for uri in self.uris),
+                                  dtype=numpy.bool_, count=len(self.uris))
+            self._pattern_masks[pattern] = mask
+        return mask
+
+    def _rapp_column(self, rapp):
+        """ :returns: capability column number for *rapp*, adding
+        a new column if that name was not previously known. """
+        col = self.rapp_columns.get(rapp)
+        if col is None:
+            col = len(self.rapp_columns)
+            self.rapp_columns[rapp] = col
+            self.rapp_names.append(rapp)
+            if col >= self.capabilities.shape[1]:
+                extra = max(8, self.capabilities.shape[1])
+                self.capabilities = numpy.concatenate(
+                    (self.capabilities,
+                     numpy.zeros((self.capabilities.shape[0], extra),
+                                 dtype=numpy.bool_)), axis=1)
+        return col
+
+    def _set_owner(self, row, owner):
+        """ Set the owner of a resource *row*.
+
+        Owner identifiers are interned in a reference-counted table,
+        so slots of requests no longer owning anything get reused.
+        """
+        self._own_columns()
+        old_slot = self.owner_index[row]
+        if old_slot >= 0:
+            self._owner_refs[old_slot] -= 1
+            if self._owner_refs[old_slot] == 0:
+                del self._owner_slots[self._owners[old_slot]]
+                self._owners[old_slot] = None
+                self._free_slots.append(old_slot)
+        if owner is None:
+            self.owner_index[row] = -1
+            return
+        slot = self._owner_slots.get(owner)
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._owners[slot] = owner
+                self._owner_refs[slot] = 0
+            else:
+                slot = len(self._owners)
+                self._owners.append(owner)
+                self._owner_refs.append(0)
+            self._owner_slots[owner] = slot
+        self._owner_refs[slot] += 1
+        self.owner_index[row] = slot
+
+    def _share_with(self, snap):
+        """ Share the pool arrays with a new snapshot, copy-on-write. """
+        snap.pool = ColumnarViews(snap)
+        snap._columns_shared = snap._rows_shared = True
+        self._columns_shared = self._rows_shared = True
+
+    def status_counts(self):
+        """ :returns: :class:`dict` of the number of pool resources
+            in each ``CurrentStatus`` value. """
+        counts = numpy.bincount(self.status[:len(self.uris)], minlength=3)
+        return {CurrentStatus.AVAILABLE: int(counts[CurrentStatus.AVAILABLE]),
+                CurrentStatus.ALLOCATED: int(counts[CurrentStatus.ALLOCATED]),
+                CurrentStatus.MISSING: int(counts[CurrentStatus.MISSING])}
+
+    def _writable(self, uri):
+        """ Get a pool resource that is about to be modified.
+
+        :param uri: Name of the resource.
+        :returns: :class:`.ColumnarResource` view; its setters copy
+            any arrays still shared with a snapshot.
+        """
+        return self.pool[uri]
+
+
+class ColumnarViews(object):
+    """
+    Dictionary-like mapping of resource names to
+    :class:`.ColumnarResource` views of a :class:`.ColumnarResourcePool`.
+
+    :param pool: Pool containing the resources.
+    :type pool: :class:`.ColumnarResourcePool`
+
+    Views are created on demand, so no Python object is kept for
+    each resource.  Resources are added with the *pool* methods,
+    not by assigning to this mapping.
+    """
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __contains__(self, uri):
+        return uri in self._pool._rows
+
+    def __getitem__(self, uri):
+        return ColumnarResource(self._pool, self._pool._rows[uri])
+
+    def __iter__(self):
+        return iter(self._pool.uris)
+
+    def __len__(self):
+        return len(self._pool.uris)
+
+    def get(self, uri, default=None):
+        """ :returns: view of resource *uri*, or *default*. """
+        row = self._pool._rows.get(uri)
+        if row is None:
+            return default
+        return ColumnarResource(self._pool, row)
+
+    def items(self):
+        """ :returns: list of (name, view) pairs. """
+        return [(uri, ColumnarResource(self._pool, row))
+                for row, uri in enumerate(self._pool.uris)]
+
+    def keys(self):
+        """ :returns: list of resource names. """
+        return list(self._pool.uris)
+
+    def values(self):
+        """ :returns: list of resource views. """
+        return [ColumnarResource(self._pool, row)
+                for row in range(len(self._pool.uris))]
+
+
+class ColumnarResource(PoolResource, object):
+    """
+    View of a single ROCON_ resource stored in a
+    :class:`.ColumnarResourcePool`.
+
+    :param pool: Pool containing this resource.
+    :type pool: :class:`.ColumnarResourcePool`
+    :param row: Row number of this resource in the *pool* arrays.
+
+    The *status*, *owner* and *priority* attributes read and write the
+    corresponding *pool* arrays, so all :class:`.PoolResource` methods
+    work unchanged.  The *rapps* set should not be modified, because
+    the *pool* capability matrix would not be updated.
+    """
+    def __init__(self, pool, row):
+        """ Constructor. """
+        self._pool = pool
+        self.row = row
+        """ Row number in the pool arrays. """
+
+    def __copy__(self):
+        """ :returns: detached :class:`.PoolResource` copy of this
+            resource, not affected by later changes to the *pool*,
+            nor affecting it. """
+        res = PoolResource(CurrentStatus(uri=self.uri,
+                                         rapps=sorted(self.rapps)))
+        res.status = self.status
+        res.owner = self.owner
+        res.priority = self.priority
+        return res
+
+    @property
+    def owner(self):
+        return self._pool._get_owner(self.row)
+
+    @owner.setter
+    def owner(self, value):
+        self._pool._set_owner(self.row, value)
+
+    @property
+    def priority(self):
+        return int(self._pool.priority[self.row])
+
+    @priority.setter
+    def priority(self, value):
+        self._pool._own_columns()
+        self._pool.priority[self.row] = value
+
+    @property
+    def rapps(self):
+        names = self._pool.rapp_names
+        return set(names[col] for col in
+                   numpy.flatnonzero(self._pool.capabilities[self.row]))
+
+    @property
+    def status(self):
+        return int(self._pool.status[self.row])
+
+    @status.setter
+    def status(self, value):
+        self._pool._own_columns()
+        self._pool.status[self.row] = value
+
+    @property
+    def uri(self):
+        return self._pool.uris[self.row]
@@ -0,0 +1,326 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: journal
+
+This module provides a write-ahead journal of the state changes of a
+`Robotics in Concert`_ (ROCON) scheduler, so it can quickly recover
+its queues and resource allocations after a restart.
+
+The journal file is append-only text, with one JSON array per
+operation.  Periodically, the current state is written as a compacted
+checkpoint, and the journal is truncated.  Request messages are
+stored as plain data, like those in a scheduler capture, so the files
+do not depend on the message class layout or Python version.  Files
+that cannot be read, like those of an older format, are logged and
+ignored, so the scheduler starts clean.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import logging
+import os
+import uuid
+
+import unique_id
+from genpy import Duration, Time
+from scheduler_msgs.msg import Request, Resource
+
+from .policy import seconds
+
+QUEUE = 'queue'
+""" Request queued: (request message, requester ID, sequence). """
+BLOCK = 'block'
+""" Request moved to the blocked queue: (request :class:`uuid.UUID`,). """
+READY = 'ready'
+""" Blocked request moved back to the ready queue: (request
+:class:`uuid.UUID`,). """
+GRANT = 'grant'
+""" Resources allocated: (request message, requester ID). """
+CANCEL = 'cancel'
+""" Request canceled, its resources released: (request
+:class:`uuid.UUID`,). """
+
+VERSION = 2
+""" Journal checkpoint format version. """
+
+logger = logging.getLogger('rosout')
+
+_DATA_ERRORS = (AttributeError, IndexError, KeyError, TypeError, ValueError)
+# raised decoding malformed data, like a file of an older format
+
+
+class Journal(object):
+    """ Append-only journal of scheduler state changes.
+
+    :param path: Name of the journal file.  The checkpoint is written
+        to the same name with a ``.checkpoint`` suffix.
+    :param checkpoint_interval: (int) Number of records after which
+        :meth:`needs_checkpoint` returns ``True``.
+    """
+    def __init__(self, path, checkpoint_interval=1000):
+        """ Constructor. """
+        self.path = path
+        """ Journal file name. """
+        self.checkpoint_path = path + '.checkpoint'
+        """ Checkpoint file name. """
+        self.checkpoint_interval = checkpoint_interval
+        """ Number of records between checkpoints. """
+        self.records = 0
+        """ Number of records appended since the last checkpoint. """
+        self._file = None
+
+    def append(self, op, *args):
+        """ Append one record to the journal.
+
+        :param op: Operation code, like :const:`QUEUE`.
+        :param args: Operation arguments, as documented for each code.
+        """
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(_dumps(record_data((op,) + args)))
+        self._file.flush()
+        self.records += 1
+
+    def checkpoint(self, state):
+        """ Write a compacted checkpoint and truncate the journal.
+
+        :param state: Current scheduler state, as returned by
+            :func:`replay`.
+
+        The checkpoint is first written to a temporary file, then
+        renamed, so a crash never leaves a partial checkpoint.
+        """
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(_dumps(state_data(state)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_path, self.checkpoint_path)
+        self.close()
+        self._file = open(self.path, 'wb')  # truncate the journal
+        self.records = 0
+
+    def close(self):
+        """ Close the journal file. """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def load(self):
+        """ Read the latest checkpoint and journal records.
+
+        :returns: (checkpoint state or ``None``, list of records),
+            with their messages rebuilt.
+
+        A partial record at the end of the journal, left by a crash
+        while it was being written, is ignored.  If the checkpoint
+        cannot be read, a warning is logged and nothing is restored.
+        If a journal record cannot be read, a warning is logged and
+        only the records before it are returned.
+        """
+        state = None
+        records = []
+        if os.path.exists(self.checkpoint_path):
+            try:
+                with open(self.checkpoint_path, 'rb') as f:
+                    state = state_from_data(_loads(f.read()))
+            except _DATA_ERRORS as ex:
+                logger.warning('unreadable journal checkpoint '
+                               + self.checkpoint_path + ' ignored: '
+                               + repr(ex))
+                self.records = 0
+                return None, []
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):  # truncated record?
+                        break
+                    try:
+                        records.append(record_from_data(_loads(line)))
+                    except _DATA_ERRORS as ex:
+                        logger.warning('unreadable journal record in '
+                                       + self.path + ' ignored: '
+                                       + repr(ex))
+                        break
+        self.records = len(records)
+        return state, records
+
+    def needs_checkpoint(self):
+        """ :returns: ``True`` if enough records have been appended
+        since the last checkpoint. """
+        return self.records >= self.checkpoint_interval
+
+
+def _dumps(data):
+    """ :returns: (bytes) one line of JSON text for plain *data*. """
+    return (json.dumps(data, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def empty_state():
+    """ :returns: scheduler state with nothing queued or granted. """
+    return {'queued': [], 'granted': []}
+
+
+def _loads(line):
+    """ :returns: plain data decoded from one line of JSON text. """
+    return json.loads(line.decode('utf-8'))
+
+
+def record_data(record):
+    """ :returns: list of plain data for a journal *record*, with
+        request messages as :func:`request_data` and UUIDs as
+        hexadecimal strings. """
+    op = record[0]
+    if op in (QUEUE, GRANT):
+        return ([op, request_data(record[1]), record[2].hex]
+                + list(record[3:]))
+    return [op, record[1].hex]
+
+
+def record_from_data(data):
+    """ :returns: journal record tuple rebuilt from :func:`record_data`.
+    :raises: :exc:`ValueError` for an unknown operation code.
+    """
+    op = data[0]
+    if op in (QUEUE, GRANT):
+        return ((op, request_msg(data[1]), uuid.UUID(data[2]))
+                + tuple(data[3:]))
+    if op in (BLOCK, READY, CANCEL):
+        return (op, uuid.UUID(data[1]))
+    raise ValueError('unknown journal operation: ' + str(op))
+
+
+def replay(state, records):
+    """ Replay journal records on top of a checkpoint.
+
+    :param state: Checkpoint state, or ``None``.
+    :param records: List of journal records.
+    :returns: Resulting state, a :class:`dict` containing:
+
+     * ``'queued'``: list of (request message, requester ID,
+       sequence, blocked) tuples, in sequence order.
+     * ``'granted'``: list of (request message, requester ID) tuples.
+    """
+    if state is None:
+        state = empty_state()
+    queued = {}
+    for msg, requester_id, sequence, blocked in state['queued']:
+        queued[unique_id.fromMsg(msg.id)] = [msg, requester_id,
+                                             sequence, blocked]
+    granted = {}
+    for msg, requester_id in state['granted']:
+        granted[unique_id.fromMsg(msg.id)] = (msg, requester_id)
+    for record in records:
+        op = record[0]
+        if op == QUEUE:
+            msg, requester_id, sequence = record[1:]
+            queued[unique_id.fromMsg(msg.id)] = [msg, requester_id,
+                                                 sequence, False]
+        elif op == BLOCK:
+            if record[1] in queued:
+                queued[record[1]][3] = True
+        elif op == READY:
+            if record[1] in queued:
+                queued[record[1]][3] = False
+        elif op == GRANT:
+            msg, requester_id = record[1:]
+            rq_id = unique_id.fromMsg(msg.id)
+            queued.pop(rq_id, None)
+            granted[rq_id] = (msg, requester_id)
+        elif op == CANCEL:
+            queued.pop(record[1], None)
+            granted.pop(record[1], None)
+    return {'queued': sorted((tuple(entry) for entry in queued.values()),
+                             key=lambda entry: entry[2]),
+            'granted': list(granted.values())}
+
+
+def request_data(msg):
+    """ :returns: :class:`dict` of the fields of a
+        ``scheduler_msgs/Request`` message used for scheduling, for a
+        journal or capture file.
+
+    Times are stored in seconds, and each resource as a [uri, rapp]
+    pair.  Other resource fields, like remappings, are not kept.
+    """
+    return {'id': unique_id.fromMsg(msg.id).hex,
+            'status': msg.status,
+            'reason': msg.reason,
+            'priority': msg.priority,
+            'availability': seconds(msg.availability),
+            'hold_time': seconds(msg.hold_time),
+            'resources': [[res.uri, res.rapp] for res in msg.resources]}
+
+
+def request_msg(data):
+    """ :returns: ``scheduler_msgs/Request`` message rebuilt from
+        :func:`request_data`. """
+    return Request(id=unique_id.toMsg(uuid.UUID(data['id'])),
+                   status=data['status'],
+                   reason=data['reason'],
+                   priority=data['priority'],
+                   availability=Time.from_sec(data['availability']),
+                   hold_time=Duration.from_sec(data['hold_time']),
+                   resources=[Resource(uri=uri, rapp=rapp)
+                              for uri, rapp in data['resources']])
+
+
+def state_data(state):
+    """ :returns: :class:`dict` of plain data for a scheduler *state*,
+        as returned by :func:`replay`, for a checkpoint. """
+    return {'version': VERSION,
+            'queued': [[request_data(msg), requester_id.hex,
+                        sequence, blocked]
+                       for msg, requester_id, sequence, blocked
+                       in state['queued']],
+            'granted': [[request_data(msg), requester_id.hex]
+                        for msg, requester_id in state['granted']]}
+
+
+def state_from_data(data):
+    """ :returns: scheduler state rebuilt from :func:`state_data`.
+    :raises: :exc:`ValueError` for another format version.
+    """
+    if data.get('version') != VERSION:
+        raise ValueError('journal checkpoint version: '
+                         + str(data.get('version')))
+    return {'queued': [(request_msg(msg), uuid.UUID(requester_id),
+                        sequence, blocked)
+                       for msg, requester_id, sequence, blocked
+                       in data['queued']],
+            'granted': [(request_msg(msg), uuid.UUID(requester_id))
+                        for msg, requester_id in data['granted']]}
@@ -0,0 +1,175 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: lock_monitor
+
+This module measures contention on the `Robotics in Concert`_ (ROCON)
+scheduler lock: how long each caller waits for it, how long it is
+held, and where it was acquired.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import sys
+import threading
+import traceback
+
+import rospy
+
+from .match_stats import clock
+from .metrics import Histogram
+
+
+class MonitoredLock(object):
+    """ Reentrant lock recording wait and hold times.
+
+    :param lock: Reentrant lock to wrap, or ``None`` to make a new
+        :class:`threading.RLock`.
+    :param threshold: (float) Hold time in seconds above which a
+        warning is logged, with the stack of the releasing thread.
+        Zero disables the warnings.
+    :param name: (str) Lock name used in log messages.
+
+    Only the outermost acquisition by each thread is measured.  Each
+    is attributed to the call site acquiring the lock, identified by
+    file name, line number and function.  All statistics are updated
+    while the lock is held, so they need no other locking.
+    """
+    def __init__(self, lock=None, threshold=0.1, name='scheduler lock'):
+        """ Constructor. """
+        if lock is None:
+            lock = threading.RLock()
+        self.lock = lock
+        """ The wrapped lock. """
+        self.threshold = threshold
+        """ Hold time in seconds above which a warning is logged. """
+        self.name = name
+        """ Lock name used in log messages. """
+        self.wait = Histogram()
+        """ :class:`.Histogram` of all wait times. """
+        self.hold = Histogram()
+        """ :class:`.Histogram` of all hold times. """
+        self.sites = {}
+        """ Dictionary of (wait, hold) histogram pairs, by call site. """
+        self.long_holds = 0
+        """ Number of holds exceeding the threshold. """
+        self._local = threading.local()
+
+    def __enter__(self):
+        self._acquire(True, sys._getframe(1))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+
+    def acquire(self, blocking=True):
+        """ Acquire the lock.
+
+        :param blocking: (bool) Wait for the lock, if ``True``.
+        :returns: ``True`` if the lock was acquired.
+        """
+        return self._acquire(blocking, sys._getframe(1))
+
+    def _acquire(self, blocking, frame):
+        """ Acquire the lock, for a caller running *frame*. """
+        depth = getattr(self._local, 'depth', 0)
+        if depth > 0:                   # already held by this thread?
+            self.lock.acquire()
+            self._local.depth = depth + 1
+            return True
+        start = clock()
+        if not self.lock.acquire(blocking):
+            return False
+        now = clock()
+        site = (os.path.basename(frame.f_code.co_filename) + ':'
+                + str(frame.f_lineno) + ' ' + frame.f_code.co_name)
+        self._local.depth = 1
+        self._local.start = now
+        self._local.site = site
+        histograms = self.sites.get(site)
+        if histograms is None:
+            histograms = self.sites[site] = (Histogram(), Histogram())
+        self.wait.add(now - start)
+        histograms[0].add(now - start)
+        return True
+
+    def release(self):
+        """ Release the lock. """
+        depth = self._local.depth - 1
+        self._local.depth = depth
+        if depth > 0:                   # still held by this thread?
+            self.lock.release()
+            return
+        held = clock() - self._local.start
+        site = self._local.site
+        self.hold.add(held)
+        self.sites[site][1].add(held)
+        long_hold = (self.threshold > 0.0 and held > self.threshold)
+        if long_hold:
+            self.long_holds += 1
+        self.lock.release()
+        if long_hold:                   # log after releasing the lock
+            rospy.logwarn('%s held %.3f s, acquired at %s, released at:\n%s'
+                          % (self.name, held, site,
+                             ''.join(traceback.format_stack(
+                                 sys._getframe(1)))))
+
+    def report(self, limit=10):
+        """ Describe the call sites holding the lock longest.
+
+        :param limit: (int) Maximum number of sites listed.
+        :returns: Human-readable string, one line per site, in
+            decreasing order of total hold time.
+        """
+        sites = sorted(self.sites.items(),
+                       key=lambda item: item[1][1].total, reverse=True)
+        lines = []
+        for site, (wait, hold) in sites[:limit]:
+            lines.append('%s: %d holds, %.6f s total, %.6f s max, '
+                         '%.6f s mean wait, %.6f s max wait'
+                         % (site, hold.count, hold.total, hold.max,
+                            wait.mean(), wait.max))
+        return '\n'.join(lines)
+
+    def summary(self):
+        """ :returns: :class:`dict` summarizing wait and hold times,
+            with keys like ``lock_wait_p99`` and ``lock_hold_max``. """
+        values = {'lock_long_holds': self.long_holds}
+        for prefix, hist in (('lock_wait_', self.wait),
+                             ('lock_hold_', self.hold)):
+            for key, value in hist.as_dict().items():
+                values[prefix + key] = value
+        return values
@@ -0,0 +1,127 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: match_stats
+
+This module provides optional instrumentation counters for resource
+matching and allocation in the `Robotics in Concert`_ (ROCON)
+scheduler resource pool.
+
+Counting is disabled unless a :class:`.MatchStats` object is assigned
+to the pool's *stats* attribute, so the disabled path only costs one
+attribute test per call.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import timeit
+
+clock = timeit.default_timer
+""" Most precise wall clock available, in seconds. """
+
+COUNTERS = ('allocations', 'allocations_granted', 'allocate_time',
+            'max_allocate_time', 'matches', 'match_time',
+            'resources_scanned', 'regex_evaluations', 'permutations',
+            'cache_hits', 'cache_misses')
+""" Names of all :class:`.MatchStats` counters. """
+
+
+class MatchStats(object):
+    """ Aggregate matching counters for a :class:`.ResourcePool`.
+
+    .. describe:: str(stats)
+
+       :returns: Human-readable string with all counter values.
+
+    Counters are plain attributes, updated without locking, so values
+    scraped from a pool used by several threads are approximate.
+
+    """
+    def __init__(self):
+        """ Constructor. """
+        self.reset()
+
+    def __str__(self):
+        return ', '.join(name + ': ' + str(getattr(self, name))
+                         for name in COUNTERS)
+
+    def add_allocation(self, elapsed, granted):
+        """ Count one :meth:`.ResourcePool.allocate` call.
+
+        :param elapsed: Wall time for this call, in seconds.
+        :param granted: ``True`` if the resources were allocated.
+        """
+        self.allocations += 1
+        if granted:
+            self.allocations_granted += 1
+        self.allocate_time += elapsed
+        if elapsed > self.max_allocate_time:
+            self.max_allocate_time = elapsed
+
+    def as_dict(self):
+        """ :returns: :class:`dict` of counter values, by name. """
+        return dict((name, getattr(self, name)) for name in COUNTERS)
+
+    def reset(self):
+        """ Reset all counters to zero. """
+        self.allocations = 0
+        """ Number of :meth:`.ResourcePool.allocate` calls. """
+        self.allocations_granted = 0
+        """ Number of those calls allocating the requested resources. """
+        self.allocate_time = 0.0
+        """ Total wall time in :meth:`.ResourcePool.allocate`, in
+        seconds. """
+        self.max_allocate_time = 0.0
+        """ Longest single :meth:`.ResourcePool.allocate` call, in
+        seconds. """
+        self.matches = 0
+        """ Number of :meth:`.ResourcePool.match_list` calls. """
+        self.match_time = 0.0
+        """ Total wall time in :meth:`.ResourcePool.match_list`, in
+        seconds.  This includes calls made by
+        :meth:`.ResourcePool.allocate`. """
+        self.resources_scanned = 0
+        """ Number of pool resources examined while matching. """
+        self.regex_evaluations = 0
+        """ Number of resource names tested against a regular
+        expression pattern. """
+        self.permutations = 0
+        """ Number of allocation orders tried. """
+        self.cache_hits = 0
+        """ Number of answers found in the feasibility or pattern
+        caches. """
+        self.cache_misses = 0
+        """ Number of answers that had to be computed, and were then
+        cached. """
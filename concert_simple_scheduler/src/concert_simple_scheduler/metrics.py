@@ -0,0 +1,240 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: metrics
+
+This module collects operational metrics for the `Robotics in
+Concert`_ (ROCON) scheduler: event counters and rates, and latency
+histograms.
+
+Every event costs constant time.  Queue lengths and resource counts
+are only gathered when a sample is taken.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import bisect
+
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+
+from .match_stats import clock
+from .resource_pool import CurrentStatus
+
+BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+          1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+""" Default :class:`.Histogram` bucket upper bounds, in seconds. """
+
+COUNTERS = ('granted', 'rejected', 'canceled', 'expired')
+""" Names of the :class:`.SchedulerMetrics` event counters. """
+
+HISTOGRAMS = ('latency', 'callback', 'dispatch', 'reschedule')
+""" Names of the :class:`.SchedulerMetrics` histograms.  The
+``latency`` histogram measures time from queuing to granting each
+request, the others measure how long those node methods run. """
+
+
+class Histogram(object):
+    """ Histogram of durations, with fixed buckets.
+
+    :param bounds: Ascending sequence of bucket upper bounds, in
+        seconds.  Values above the last bound are counted in an extra
+        overflow bucket.
+    """
+    def __init__(self, bounds=BOUNDS):
+        """ Constructor. """
+        self.bounds = tuple(bounds)
+        """ Bucket upper bounds. """
+        self.reset()
+
+    def add(self, value):
+        """ Count one *value*.
+
+        :param value: (float) Duration in seconds.
+        """
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self):
+        """ :returns: :class:`dict` summarizing this histogram. """
+        return {'count': self.count,
+                'mean': self.mean(),
+                'max': self.max,
+                'p50': self.percentile(50.0),
+                'p90': self.percentile(90.0),
+                'p99': self.percentile(99.0)}
+
+    def mean(self):
+        """ :returns: mean of all values counted, zero if none. """
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """ Estimate a percentile.
+
+        :param percent: (float) Percentile wanted, from 0 to 100.
+        :returns: upper bound of the bucket containing that
+            percentile, or the maximum value if that is smaller or it
+            fell in the overflow bucket; zero if nothing was counted.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = percent * self.count / 100.0
+        seen = 0
+        for bound, n in zip(self.bounds, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def reset(self):
+        """ Discard all values counted. """
+        self.buckets = [0] * (len(self.bounds) + 1)
+        """ Number of values in each bucket. """
+        self.count = 0
+        """ Number of values counted. """
+        self.total = 0.0
+        """ Sum of values counted. """
+        self.max = 0.0
+        """ Largest value counted. """
+
+
+class SchedulerMetrics(object):
+    """ Scheduler event counters and latency histograms.
+
+    :param name: (str) Name reported in the diagnostics message.
+
+    The event methods are called with the Big Scheduler Lock held,
+    which also serializes access to the metrics.
+    """
+    def __init__(self, name='rocon_scheduler'):
+        """ Constructor. """
+        self.name = name
+        """ Name reported in the diagnostics message. """
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        """ Number of each kind of event, since the node started. """
+        self.histograms = dict((key, Histogram()) for key in HISTOGRAMS)
+        """ :class:`.Histogram` of each kind of duration. """
+        self._queued = {}               # queue times, by request UUID
+        self._last_counters = dict(self.counters)
+        self._last_time = clock()
+
+    def canceled(self, request_id):
+        """ Count a request canceled by its requester. """
+        self.counters['canceled'] += 1
+        self._queued.pop(request_id, None)
+
+    def expired(self, request_id):
+        """ Count a request canceled for waiting too long. """
+        self.counters['expired'] += 1
+        self._queued.pop(request_id, None)
+
+    def granted(self, request_id):
+        """ Count a granted request, and how long it was queued. """
+        self.counters['granted'] += 1
+        queued = self._queued.pop(request_id, None)
+        if queued is not None:
+            self.histograms['latency'].add(clock() - queued)
+
+    def observe(self, name, elapsed):
+        """ Count one duration.
+
+        :param name: (str) One of the :const:`.HISTOGRAMS`.
+        :param elapsed: (float) Duration in seconds.
+        """
+        self.histograms[name].add(elapsed)
+
+    def queued(self, request_id):
+        """ Note when a request was queued. """
+        self._queued[request_id] = clock()
+
+    def rejected(self, request_id):
+        """ Count a request rejected as invalid. """
+        self.counters['rejected'] += 1
+        self._queued.pop(request_id, None)
+
+    def sample(self, ready, blocked, resources):
+        """ Take a sample of the current scheduler metrics.
+
+        :param ready: (int) Ready queue length.
+        :param blocked: (int) Blocked queue length.
+        :param resources: :class:`dict` of resource counts by
+            ``CurrentStatus`` value, see
+            :meth:`.ResourcePool.status_counts`.
+        :returns: :class:`dict` of metric values, by name.
+
+        Event rates are per second, averaged since the previous
+        sample.
+        """
+        now = clock()
+        elapsed = now - self._last_time
+        values = {'ready_queue': ready,
+                  'blocked_queue': blocked,
+                  'available': resources.get(CurrentStatus.AVAILABLE, 0),
+                  'allocated': resources.get(CurrentStatus.ALLOCATED, 0),
+                  'missing': resources.get(CurrentStatus.MISSING, 0)}
+        for name in COUNTERS:
+            count = self.counters[name]
+            values[name] = count
+            rate = 0.0
+            if elapsed > 0.0:
+                rate = (count - self._last_counters[name]) / elapsed
+            values[name + '_rate'] = rate
+        for name, hist in self.histograms.items():
+            for key, value in hist.as_dict().items():
+                values[name + '_' + key] = value
+        self._last_counters = dict(self.counters)
+        self._last_time = now
+        return values
+
+    def to_msg(self, values, stamp=None):
+        """ Convert a metrics sample to a diagnostics message.
+
+        :param values: :class:`dict` returned by :meth:`sample`.
+        :param stamp: :class:`rospy.Time` for the message header.
+        :returns: ``diagnostic_msgs/DiagnosticArray`` message.
+        """
+        msg = DiagnosticArray()
+        if stamp is not None:
+            msg.header.stamp = stamp
+        status = DiagnosticStatus(level=DiagnosticStatus.OK,
+                                  name=self.name, message='metrics')
+        for key in sorted(values.keys()):
+            status.values.append(KeyValue(key=key, value=str(values[key])))
+        msg.status.append(status)
+        return msg
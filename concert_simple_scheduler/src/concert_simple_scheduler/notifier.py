@@ -0,0 +1,140 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: notifier
+
+This module delivers `Robotics in Concert`_ (ROCON) scheduler
+feedback to requesters in a separate thread, so publishing does not
+extend the scheduler's critical sections.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import threading
+import time
+
+import rospy
+
+
+class Notifier(object):
+    """ Deduplicating requester notification thread.
+
+    :param send: Function called in the notifier thread with each
+        requester identifier to notify.
+
+    Requesters queued again before their notification is sent are
+    only notified once.  The *send* function runs without any
+    scheduler locks held, so it must acquire whatever it needs.
+    """
+    def __init__(self, send):
+        """ Constructor. """
+        self.send = send
+        """ Function delivering one notification. """
+        self.sent = 0
+        """ Number of notifications delivered. """
+        self._pending = set()
+        self._busy = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run,
+                                        name='scheduler_notifier')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        """ :returns: number of requesters waiting to be notified. """
+        return len(self._pending)
+
+    def flush(self, timeout=None):
+        """ Wait until all queued notifications have been sent.
+
+        :param timeout: (float) Maximum seconds to wait, or ``None``.
+        :returns: ``True`` if nothing remains to be sent.
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        with self._condition:
+            while self._pending or self._busy:
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0.0:
+                        break
+                    self._condition.wait(remaining)
+            return not (self._pending or self._busy)
+
+    def notify(self, requester_ids):
+        """ Queue requesters for notification.
+
+        :param requester_ids: Iterable of requester identifiers.
+
+        Returns immediately; the notifications are sent later by the
+        notifier thread.
+        """
+        with self._condition:
+            self._pending.update(requester_ids)
+            self._condition.notify_all()
+
+    def shutdown(self):
+        """ Stop the notifier thread, discarding pending notifications. """
+        with self._condition:
+            self._stopped = True
+            self._pending.clear()
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        """ Notifier thread main loop. """
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()  # wake flush()
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                batch = self._pending
+                self._pending = set()
+                self._busy = True
+            for requester_id in batch:
+                try:
+                    self.send(requester_id)
+                    self.sent += 1
+                except Exception as e:  # keep the thread alive
+                    rospy.logerr('Notification to requester '
+                                 + str(requester_id) + ' failed: ' + str(e))
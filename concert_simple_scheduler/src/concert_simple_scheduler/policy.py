@@ -0,0 +1,167 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: policy
+
+This module provides pluggable scheduling policies for the `Robotics
+in Concert`_ (ROCON) scheduler.
+
+A :class:`.SchedulerCore` consults its policy to order its queues,
+admit new requests, choose among matching resources and decide
+which requests to block.  The default :class:`.SchedulingPolicy`
+is the original fixed-priority, first-come, first-served behavior.
+Derived classes override only the hooks they need.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+NO_DEADLINE = float('inf')
+""" Sort key for requests without a deadline or duration. """
+
+
+def seconds(value):
+    """ :returns: (float) seconds in a ROS time or duration *value*,
+        or a plain number. """
+    try:
+        return value.to_sec()
+    except AttributeError:
+        return float(value)
+
+
+class SchedulingPolicy(object):
+    """ Fixed-priority, first-come, first-served scheduling policy.
+
+    Requests with higher priorities are granted first, and those with
+    the same priority in the order they arrived.  Every request is
+    admitted, matching resources are tried in no particular order,
+    and requests are blocked when no pool member could ever satisfy
+    them.
+
+    The :meth:`order`, :meth:`admit` and :meth:`select` hooks are
+    called holding the Big Scheduler Lock.  The :meth:`block` hook is
+    usually called without it, so it must not modify anything.
+    """
+    name = 'priority'
+    """ Name of this policy, for the ``~policy`` parameter. """
+
+    def admit(self, element):
+        """ Decide whether to queue a new request.
+
+        :param element: Queue element for the new request.
+        :type element: :class:`.QueueElement`
+        :raises: :exc:`.InvalidRequestError` to reject it.
+        """
+        pass
+
+    def block(self, element, feasible):
+        """ Decide whether a ready request should be blocked.
+
+        :param element: Queue element waiting for resources.
+        :type element: :class:`.QueueElement`
+        :param feasible: (bool) ``True`` if the current pool members
+            could satisfy it, once they are available.
+        :returns: ``True`` to move it to the blocked queue, where it
+            waits for suitable resources to appear.
+        """
+        return not feasible
+
+    def order(self, element):
+        """ :returns: sort key for a queue *element*.  Lower keys are
+            granted first, and equal keys in order of arrival. """
+        return -element.request.msg.priority
+
+    def select(self, request, names):
+        """ Choose among the resources matching one requested item.
+
+        :param request: Request being allocated.
+        :type request: :class:`.ActiveRequest`
+        :param names: :class:`set` of available resource names.
+        :returns: Iterable of those *names*, in order of preference.
+        """
+        return names
+
+
+class EarliestDeadlinePolicy(SchedulingPolicy):
+    """ Earliest-deadline-first scheduling policy.
+
+    Within each priority, requests with the earliest ``availability``
+    time are granted first.  Requests without one come after them, in
+    order of arrival.
+    """
+    name = 'edf'
+
+    def order(self, element):
+        """ :returns: (priority, deadline) sort key. """
+        msg = element.request.msg
+        deadline = seconds(msg.availability) or NO_DEADLINE
+        return (-msg.priority, deadline)
+
+
+class ShortestRequestPolicy(SchedulingPolicy):
+    """ Shortest-request-first scheduling policy.
+
+    Within each priority, requests with the shortest estimated
+    ``hold_time`` are granted first, then those wanting the fewest
+    resources.  Requests with no estimate come after them.  This
+    raises throughput when request durations vary widely, but a
+    steady stream of short requests may delay long ones.
+    """
+    name = 'shortest'
+
+    def order(self, element):
+        """ :returns: (priority, hold time, width) sort key. """
+        msg = element.request.msg
+        hold_time = seconds(msg.hold_time) or NO_DEADLINE
+        return (-msg.priority, hold_time, len(msg.resources))
+
+
+POLICIES = dict((cls.name, cls) for cls in [SchedulingPolicy,
+                                            EarliestDeadlinePolicy,
+                                            ShortestRequestPolicy])
+""" Dictionary of the scheduling policy classes, by name. """
+
+
+def make_policy(name):
+    """ Make a scheduling policy.
+
+    :param name: (str) Policy name: ``priority``, ``edf`` or
+        ``shortest``.
+    :returns: the new policy.
+    :raises: :exc:`ValueError` for an unknown *name*.
+    """
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError('unknown scheduling policy: ' + str(name))
@@ -0,0 +1,345 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: pool_file
+
+This module provides a compact binary file format for the contents of
+a `Robotics in Concert`_ (ROCON) scheduler resource pool, for
+checkpoints, debugging captures and test fixtures.  It is much faster
+than YAML or ROS messages for very large pools.
+
+The file contains:
+
+ * an eight-byte magic number,
+ * one fixed-width record for each resource, holding its owner
+   :class:`uuid.UUID` (all zeros if none), priority, status and the
+   location of its rapp references,
+ * a table of rapp references, one 32-bit index for each rapp of
+   each resource, in record order,
+ * the interned resource names, one per record, separated by newlines,
+ * the interned rapp names, separated by newlines,
+ * a fixed-width trailer with the size of each section, ending with
+   the magic number again.
+
+All numbers are little-endian.  Records are written while iterating
+over the pool, and the trailer last, so a file can be written to any
+stream.  Files are read via :py:mod:`mmap`, decoding each record only
+when needed.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import mmap
+import struct
+import uuid
+
+try:
+    import numpy
+except ImportError:                     # NumPy is optional
+    numpy = None
+
+from .columnar_pool import ColumnarResourcePool
+from .resource_pool import CurrentStatus, PoolResource, ResourcePool
+
+MAGIC = b'ROCNPL\x00\x01'
+""" Magic number at the beginning and end of a pool file. """
+
+_RECORD = struct.Struct(str('<16siIIb3x'))
+""" Resource record: owner, priority, first rapp reference, number of
+rapp references, status. """
+_TRAILER = struct.Struct(str('<5I4x8s'))
+""" Trailer: number of resources, number of rapp references, number
+of rapps, size of resource names, size of rapp names, magic. """
+_NO_OWNER = b'\x00' * 16
+
+if numpy is not None:
+    _RECORD_DTYPE = numpy.dtype([(str('owner'), numpy.uint8, (16,)),
+                                 (str('priority'), str('<i4')),
+                                 (str('link_start'), str('<u4')),
+                                 (str('link_count'), str('<u4')),
+                                 (str('status'), numpy.int8),
+                                 (str('pad'), str('V3'))])
+
+
+class PoolFileError(Exception):
+    """ Error exception: not a valid resource pool file. """
+    pass
+
+
+class PoolFile(object):
+    """ Memory-mapped reader for a resource pool file.
+
+    :param path: Name of the file to read.
+    :raises: :exc:`.PoolFileError` if not a valid pool file.
+
+    .. describe:: len(pool_file)
+
+       :returns: Number of resources in the file.
+
+    .. describe:: pool_file[index]
+
+       :returns: A new :class:`.PoolResource` for the resource record
+           at *index*.
+
+    .. describe:: iter(pool_file)
+
+       :returns: Iterator over a new :class:`.PoolResource` for each
+           record, in file order.
+
+    The resource and rapp name tables are decoded when the file is
+    opened.  Records are only decoded when accessed.
+    """
+    def __init__(self, path):
+        """ Constructor. """
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:              # empty file
+            self._file.close()
+            raise PoolFileError('empty pool file: ' + path)
+        size = len(self._map)
+        if (size < len(MAGIC) + _TRAILER.size
+                or self._map[:len(MAGIC)] != MAGIC):
+            self.close()
+            raise PoolFileError('not a resource pool file: ' + path)
+        (self.n_resources, self.n_links, n_rapps, uri_size, rapp_size,
+         magic) = _TRAILER.unpack_from(self._map, size - _TRAILER.size)
+        self._links_offset = len(MAGIC) + self.n_resources * _RECORD.size
+        uri_offset = self._links_offset + 4 * self.n_links
+        rapp_offset = uri_offset + uri_size
+        if (magic != MAGIC
+                or rapp_offset + rapp_size + _TRAILER.size != size):
+            self.close()
+            raise PoolFileError('truncated resource pool file: ' + path)
+        self.uris = _split(self._map[uri_offset:rapp_offset],
+                           self.n_resources)
+        """ List of resource names, in record order. """
+        self.rapps = _split(
+            self._map[rapp_offset:rapp_offset + rapp_size], n_rapps)
+        """ List of interned rapp names. """
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.n_resources
+        if not 0 <= index < self.n_resources:
+            raise IndexError('pool file record index out of range')
+        owner, priority, start, count, status = _RECORD.unpack_from(
+            self._map, len(MAGIC) + index * _RECORD.size)
+        links = struct.unpack_from(str('<%dI' % count), self._map,
+                                   self._links_offset + 4 * start)
+        pool_res = PoolResource(CurrentStatus(
+            uri=self.uris[index],
+            rapps=[self.rapps[link] for link in links]))
+        pool_res.status = status
+        pool_res.priority = priority
+        if owner != _NO_OWNER:
+            pool_res.owner = uuid.UUID(bytes=owner)
+        return pool_res
+
+    def __iter__(self):
+        for index in range(self.n_resources):
+            yield self[index]
+
+    def __len__(self):
+        return self.n_resources
+
+    def close(self):
+        """ Close the file. """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _load_columns(self, pool):
+        """ Load all records into an empty columnar *pool*.
+
+        :param pool: Empty pool to fill.
+        :type pool: :class:`.ColumnarResourcePool`
+
+        The record fields are converted to columns directly from the
+        memory map, without creating any resource objects.
+        """
+        n = self.n_resources
+        records = numpy.frombuffer(self._map, dtype=_RECORD_DTYPE,
+                                   count=n, offset=len(MAGIC))
+        links = numpy.frombuffer(self._map, dtype=str('<u4'),
+                                 count=self.n_links,
+                                 offset=self._links_offset)
+        pool.status = records['status'].astype(numpy.int8)
+        pool.priority = records['priority'].astype(numpy.int32)
+        pool.owner_index = numpy.full(n, -1, dtype=numpy.int32)
+        pool.capabilities = numpy.zeros((n, max(8, len(self.rapps))),
+                                        dtype=numpy.bool_)
+        counts = records['link_count'].astype(numpy.intp)
+        pool.capabilities[numpy.repeat(numpy.arange(n), counts),
+                          links] = True
+        pool.uris = list(self.uris)
+        pool._rows = dict(zip(pool.uris, range(n)))
+        pool.rapp_names = list(self.rapps)
+        pool.rapp_columns = dict((rapp, col)
+                                 for col, rapp in enumerate(self.rapps))
+        owners = records['owner']
+        owned = numpy.flatnonzero(owners.any(axis=1))
+        if len(owned):
+            slots, inverse, refs = numpy.unique(
+                owners[owned], axis=0, return_inverse=True,
+                return_counts=True)
+            pool._owners = [uuid.UUID(bytes=slot.tobytes())
+                            for slot in slots]
+            pool._owner_refs = refs.tolist()
+            pool._owner_slots = dict((owner, slot) for slot, owner
+                                     in enumerate(pool._owners))
+            pool.owner_index[owned] = inverse.reshape(-1)
+            for row, slot in zip(owned.tolist(), inverse.reshape(-1).tolist()):
+                pool._index_owner(pool.uris[row], pool._owners[slot],
+                                  int(pool.priority[row]))
+
+
+def dump(pool, stream):
+    """ Write the contents of a resource pool to a binary stream.
+
+    :param pool: Resource pool to write.  The caller must prevent
+        concurrent changes, either by holding the scheduler lock or
+        by passing a :meth:`.ResourcePool.snapshot`.
+    :type pool: :class:`.ResourcePool` or :class:`.ShardedResourcePool`
+    :param stream: Binary file-like object, which need not be seekable.
+
+    Columnar pools are written directly from their arrays, in row
+    order.  Other pools are written one resource at a time, sorted by
+    name.
+    """
+    stream.write(MAGIC)
+    if isinstance(pool, ColumnarResourcePool):
+        _dump_columns(pool, stream)
+        return
+    rapp_index = {}
+    uris = []
+    links = []
+    for pool_res in _pool_resources(pool):
+        start = len(links)
+        for rapp in sorted(pool_res.rapps):
+            link = rapp_index.get(rapp)
+            if link is None:
+                link = rapp_index[rapp] = len(rapp_index)
+            links.append(link)
+        owner = _NO_OWNER
+        if pool_res.owner is not None:
+            owner = pool_res.owner.bytes
+        stream.write(_RECORD.pack(owner, pool_res.priority, start,
+                                  len(links) - start, pool_res.status))
+        uris.append(pool_res.uri)
+    stream.write(struct.pack(str('<%dI' % len(links)), *links))
+    rapps = sorted(rapp_index, key=rapp_index.get)
+    uri_data = '\n'.join(uris).encode('utf-8')
+    rapp_data = '\n'.join(rapps).encode('utf-8')
+    stream.write(uri_data)
+    stream.write(rapp_data)
+    stream.write(_TRAILER.pack(len(uris), len(links), len(rapps),
+                               len(uri_data), len(rapp_data), MAGIC))
+
+
+def _dump_columns(pool, stream):
+    """ Write the sections following the magic number, for a columnar
+    *pool*, without creating any resource objects. """
+    n = len(pool.uris)
+    rows, links = numpy.nonzero(pool.capabilities[:n])
+    counts = numpy.bincount(rows, minlength=n)
+    records = numpy.zeros(n, dtype=_RECORD_DTYPE)
+    records['link_start'][1:] = numpy.cumsum(counts)[:-1]
+    records['link_count'] = counts
+    records['status'] = pool.status[:n]
+    records['priority'] = pool.priority[:n]
+    owners = numpy.zeros((len(pool._owners) + 1, 16), dtype=numpy.uint8)
+    for slot, owner in enumerate(pool._owners):
+        if owner is not None:
+            owners[slot] = numpy.frombuffer(owner.bytes, dtype=numpy.uint8)
+    records['owner'] = owners[pool.owner_index[:n]]  # -1 is the last row
+    stream.write(records.tobytes())
+    stream.write(links.astype(str('<u4')).tobytes())
+    uri_data = '\n'.join(pool.uris).encode('utf-8')
+    rapp_data = '\n'.join(pool.rapp_names).encode('utf-8')
+    stream.write(uri_data)
+    stream.write(rapp_data)
+    stream.write(_TRAILER.pack(n, len(links), len(pool.rapp_names),
+                               len(uri_data), len(rapp_data), MAGIC))
+
+
+def load(path, engine=None):
+    """ Load a resource pool from a binary file.
+
+    :param path: Name of the file to read.
+    :param engine: Resource pool storage engine, as for the
+        :class:`.ResourcePool` constructor.
+    :returns: A new :class:`.ResourcePool` with the file contents,
+        including current allocations.
+    :raises: :exc:`.PoolFileError` if not a valid pool file.
+
+    The ``'columnar'`` engine loads its arrays directly from the
+    memory-mapped records, which is much faster for large pools.
+    """
+    pool_file = PoolFile(path)
+    try:
+        pool = ResourcePool(engine=engine)
+        if isinstance(pool, ColumnarResourcePool):
+            pool_file._load_columns(pool)
+        else:
+            for pool_res in pool_file:
+                pool._insert(pool_res)
+                if pool_res.owner is not None:
+                    pool._index_owner(pool_res.uri, pool_res.owner,
+                                      pool_res.priority)
+    finally:
+        pool_file.close()
+    return pool
+
+
+def _pool_resources(pool):
+    """ Generate each resource in a pool, in a repeatable order. """
+    shards = getattr(pool, 'shards', None)
+    if shards is None:
+        shards = {'': pool}
+    for key in sorted(shards):
+        shard_pool = shards[key].pool
+        for uri in sorted(shard_pool):
+            yield shard_pool[uri]
+
+
+def _split(data, count):
+    """ :returns: list of *count* strings, decoded from
+    newline-separated UTF-8 *data*. """
+    if count == 0:
+        return []
+    return data.decode('utf-8').split('\n')
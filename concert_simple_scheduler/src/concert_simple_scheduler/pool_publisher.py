@@ -0,0 +1,126 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: pool_publisher
+
+This module publishes the contents of the `Robotics in Concert`_
+(ROCON) scheduler resource pool, coalescing bursts of changes.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import rospy
+from scheduler_msgs.msg import KnownResources
+
+
+class PoolPublisher(object):
+    """ Coalescing, rate-limited publisher for the resource pool.
+
+    :param pool: Resource pool to publish.
+    :type pool: :class:`.ResourcePool` or :class:`.ShardedResourcePool`
+    :param lock: Lock serializing access to the *pool*, normally the
+        Big Scheduler Lock.
+    :param interval: (float) Minimum seconds between updates caused
+        by allocation changes; zero publishes every change at once.
+    :param topic: (str) Name of the latched
+        ``scheduler_msgs/KnownResources`` topic.
+
+    Allocation changes made within *interval* of the previous update
+    are held back, then published together by a one-shot timer.
+    Membership changes, when resources appear or go missing, are
+    always published immediately.
+    """
+    def __init__(self, pool, lock, interval=0.0, topic='resource_pool'):
+        """ Constructor. """
+        self.pool = pool
+        """ Resource pool being published. """
+        self.lock = lock
+        """ Lock serializing access to the pool. """
+        self.interval = interval
+        """ Minimum seconds between allocation updates. """
+        self.published = 0
+        """ Number of messages published. """
+        self.pub = rospy.Publisher(topic, KnownResources,
+                                   queue_size=1, latch=True)
+        self._generation = None
+        self._last_time = 0.0
+        self._timer = None
+        self.publish()
+
+    def flush(self, event=None):
+        """ Publish any changes held back.
+
+        :param event: :class:`rospy.TimerEvent`, when called by the
+            coalescing timer.
+
+        Acquires the pool lock.
+        """
+        with self.lock:
+            self._timer = None
+            if self.pool.changed:
+                self.publish()
+
+    def publish(self):
+        """ Publish the current pool contents.
+
+        :pre: The pool lock is held.
+        """
+        self._generation = self.pool.generation
+        self._last_time = rospy.Time.now().to_sec()
+        self.pub.publish(self.pool.known_resources())
+        self.published += 1
+
+    def update(self):
+        """ Publish pool changes, if any, unless an update was sent
+        too recently.
+
+        :pre: The pool lock is held.
+
+        Changes held back will be published by a one-shot timer when
+        the interval expires.
+        """
+        if not self.pool.changed:
+            return
+        if (self.interval <= 0.0
+                or self.pool.generation != self._generation):
+            self.publish()              # membership changed, flush now
+            return
+        elapsed = rospy.Time.now().to_sec() - self._last_time
+        if elapsed >= self.interval:
+            self.publish()
+        elif self._timer is None:       # no flush scheduled yet?
+            self._timer = rospy.Timer(
+                rospy.Duration(self.interval - elapsed),
+                self.flush, oneshot=True)
@@ -43,6 +43,18 @@ import copy
 import heapq
 import itertools
 
+from .resource_pool import request_signature
+
+
+def _tally(counts, signature, delta):
+    """ Adjust the number of queued elements with a request
+    *signature* in the *counts* dictionary, forgetting it at zero. """
+    count = counts.get(signature, 0) + delta
+    if count:
+        counts[signature] = count
+    else:
+        del counts[signature]
+
 
 class PriorityQueue(object):
     """ This is a container class for ROCON_ scheduler request queue elements.
@@ -50,11 +62,20 @@ class PriorityQueue(object):
     :param iterable: Iterable yielding initial contents, either
         :class:`.QueueElement` objects, or something that behaves
         similarly.
+    :param key: Optional function returning a sort key for each
+        element added.  Elements with lower keys come first, and
+        those with equal keys in sequence order.  By default, higher
+        priorities come first.
 
     This implementation is based on the :py:mod:`heapq` module and
     uses some of the ideas explained in its `priority queue
     implementation notes`_.
 
+    .. describe:: iter(queue)
+
+       :returns: Iterator over the elements in the *queue*, in no
+           particular order.
+
     .. describe:: len(queue)
 
        :returns: The number of elements in the *queue*.
@@ -66,17 +87,24 @@ class PriorityQueue(object):
        :returns: ``True`` if *request* is in the *queue*.
 
     """
-    def __init__(self, iterable=[]):
+    def __init__(self, iterable=[], key=None):
         self._queue = []
         """ Priority queue of :class:`.QueueElement`. """
         self._requests = {}
         """ Dictionary of queued requests. """
+        self._signatures = {}
+        """ Number of queued elements, by request signature. """
+        self.key = key
+        """ Sort key function, or ``None``. """
         for element in iterable:
             self.add(element)
 
     def __contains__(self, request):
         return hash(request) in self._requests
 
+    def __iter__(self):
+        return iter(self._requests.values())
+
     def __len__(self):
         return len(self._requests)
 
@@ -87,6 +115,7 @@ class PriorityQueue(object):
         :type element: :class:`.QueueElement`
         :param priority: (Optional) new priority for this *element*.
         :type priority: int
+        :returns: The copy of *element* queued.
 
         If a request with the same identifier was already in the
         queue, it is removed and replaced by the new *element*,
@@ -101,8 +130,12 @@ class PriorityQueue(object):
         element.active = True
         if priority is not None:
             element.request.msg.priority = priority
+        if self.key is not None:
+            element.sort_key = self.key(element)
         self._requests[hash(element)] = element
+        _tally(self._signatures, element.signature, 1)
         heapq.heappush(self._queue, element)
+        return element
 
     def peek(self):
         """ Return the top-priority element from the queue head
@@ -110,10 +143,13 @@ class PriorityQueue(object):
 
         :raises: :exc:`IndexError` if queue was empty.
         """
-        # Return the top element that was not previously removed.
-        for element in self._queue:
+        # Discard any previously removed elements from the top.
+        queue = self._queue
+        while queue:
+            element = queue[0]
             if element.active:          # not previously removed?
                 return element
+            heapq.heappop(queue)
         raise IndexError('pop from an empty priority queue')
 
     def pop(self):
@@ -126,6 +162,7 @@ class PriorityQueue(object):
             element = heapq.heappop(self._queue)
             if element.active:          # not previously removed?
                 del self._requests[hash(element)]
+                _tally(self._signatures, element.signature, -1)
                 return element
         raise IndexError('pop from an empty priority queue')
 
@@ -134,12 +171,260 @@ class PriorityQueue(object):
 
         :param request_id: Identifier of the request to remove.
         :type request_id: :class:`uuid.UUID` or :class:`.QueueElement`
+        :returns: The :class:`.QueueElement` removed.
         :raises: :exc:`KeyError` if *request_id* not in the queue.
         """
         # Remove it from the dictionary and mark it inactive, but
         # leave it in the queue to avoid re-sorting.
         element = self._requests.pop(hash(request_id))
         element.active = False
+        _tally(self._signatures, element.signature, -1)
+        return element
+
+    def requeue(self, element):
+        """ Return a popped *element* to the queue, in its place.
+
+        :param element: Queue element returned by :meth:`pop`.
+        :type element: :class:`.QueueElement`
+
+        Unlike :meth:`add`, the *element* is neither copied nor given
+        a new sort key, so it must not have changed since it was
+        popped.  This makes returning elements that could not be
+        granted cheap.
+        """
+        element.active = True
+        self._requests[hash(element)] = element
+        _tally(self._signatures, element.signature, 1)
+        heapq.heappush(self._queue, element)
+
+    def signatures(self):
+        """ :returns: iterable of the distinct request
+            :attr:`~.QueueElement.signature` values of the queued
+            elements. """
+        return self._signatures.keys()
+
+
+class FairShareQueue(object):
+    """ Weighted fair queue of ROCON_ scheduler request queue elements.
+
+    :param iterable: Iterable yielding initial contents.
+    :param weights: Optional dictionary of positive relative weights,
+        indexed by requester :class:`uuid.UUID`.  Other requesters
+        have weight 1.0.
+    :param key: Optional sort key function, as for
+        :class:`.PriorityQueue`.
+    :raises: :exc:`ValueError` if any weight is not positive.
+
+    This container behaves like a :class:`.PriorityQueue`, but keeps
+    a separate sub-queue for each requester, so one requester sending
+    many requests cannot monopolize the resources.
+
+    Each requester has a virtual finish time.  The next element
+    popped is the sub-queue head that sorts first, by the same key
+    as each sub-queue, and among equal keys, the head of the
+    requester with the earliest virtual finish time.  Popping an
+    element charges its requester: the element's virtual start is
+    the later of the queue's virtual time and the requester's finish
+    time, which advances by the number of resources requested,
+    divided by the requester's weight.  The queue's virtual time
+    advances to that start.  So, among requests with equal keys,
+    like those of each priority with the default key, each busy
+    requester gets a share of the resources granted proportional to
+    its weight, and an idle requester does not bank credit while it
+    is idle.  Its finish time is forgotten once the virtual time
+    passes it.
+
+    An element popped and added again, because it could not be
+    granted after all, is refunded its charge.
+
+    A heap of requester sub-queue heads, updated lazily, makes
+    selecting the next element O(log R) for R requesters.
+
+    """
+    def __init__(self, iterable=[], weights=None, key=None):
+        self.weights = dict(weights or {})
+        """ Dictionary of requester weights. """
+        for weight in self.weights.values():
+            if not weight > 0.0:
+                raise ValueError('fair share weight must be positive: '
+                                 + str(weight))
+        self.key = key
+        """ Sort key function, or ``None``. """
+        self.vtime = 0.0
+        """ Current virtual time. """
+        self._queues = {}               # sub-queues, by requester
+        self._finish = {}               # virtual finish times, by requester
+        self._idle = []                 # (finish, requester) when idle
+        self._owners = {}               # requesters, by request hash
+        self._signatures = {}           # element counts, by signature
+        self._entries = {}              # current heap entry, by requester
+        self._heap = []                 # (rank, start, sequence, requester)
+        for element in iterable:
+            self.add(element)
+
+    def __contains__(self, request):
+        return hash(request) in self._owners
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(
+            list(self._queues.values()))
+
+    def __len__(self):
+        return len(self._owners)
+
+    def add(self, element, priority=None):
+        """ Add a new *element* to its requester's sub-queue.
+
+        :param element: Queue *element* to add.
+        :type element: :class:`.QueueElement`
+        :param priority: (Optional) new priority for this *element*.
+        :type priority: int
+        :returns: The copy of *element* queued.
+
+        As with :meth:`.PriorityQueue.add`, an element for the same
+        request is replaced.
+        """
+        if hash(element) in self._owners:  # already in the queue?
+            self.remove(element)
+        element = self._queue(element.requester_id).add(element, priority)
+        self._enqueued(element)
+        return element
+
+    def _cost(self, element):
+        """ :returns: virtual time charged for granting *element*. """
+        return (len(element.request.msg.resources)
+                / float(self.weights.get(element.requester_id, 1.0)))
+
+    def _enqueued(self, element):
+        """ Account for an *element* just added to its requester's
+        sub-queue, refunding any charge for popping it. """
+        requester_id = element.requester_id
+        if element.virtual_start is not None:  # charged when popped?
+            if requester_id in self._finish:    # not forgotten yet?
+                self._finish[requester_id] -= self._cost(element)
+            element.virtual_start = None
+        self._owners[hash(element)] = requester_id
+        _tally(self._signatures, element.signature, 1)
+        self._update(requester_id)
+
+    def _head(self):
+        """ :returns: the current heap entry for the requester whose
+            sub-queue head comes first.
+        :raises: :exc:`IndexError` if queue was empty.
+
+        Discards any out-of-date heap entries on top.
+        """
+        heap = self._heap
+        while heap:
+            entry = heap[0]
+            if self._entries.get(entry[3]) is entry:
+                return entry
+            heapq.heappop(heap)
+        raise IndexError('pop from an empty priority queue')
+
+    def peek(self):
+        """ Return the next element, without removing it.
+
+        :raises: :exc:`IndexError` if queue was empty.
+        """
+        return self._queues[self._head()[3]].peek()
+
+    def pop(self):
+        """ Remove the next element, advancing the virtual time.
+
+        :raises: :exc:`IndexError` if queue was empty.
+        """
+        requester_id = self._head()[3]
+        element = self._queues[requester_id].pop()
+        del self._owners[hash(element)]
+        _tally(self._signatures, element.signature, -1)
+        start = max(self.vtime, self._finish.get(requester_id, 0.0))
+        element.virtual_start = self.vtime = start
+        self._finish[requester_id] = start + self._cost(element)
+        self._update(requester_id)
+        self._prune()
+        return element
+
+    def _prune(self):
+        """ Forget the finish times of idle requesters that the
+        virtual time has passed, which no longer matter. """
+        idle = self._idle
+        while idle and idle[0][0] <= self.vtime:
+            finish, requester_id = heapq.heappop(idle)
+            if (requester_id not in self._queues
+                    and self._finish.get(requester_id) == finish):
+                del self._finish[requester_id]
+
+    def _queue(self, requester_id):
+        """ :returns: the sub-queue of *requester_id*, created if
+            necessary. """
+        queue = self._queues.get(requester_id)
+        if queue is None:
+            queue = self._queues[requester_id] = PriorityQueue(key=self.key)
+        return queue
+
+    def remove(self, request_id):
+        """ Remove element corresponding to *request_id*.
+
+        :param request_id: Identifier of the request to remove.
+        :type request_id: :class:`uuid.UUID` or :class:`.QueueElement`
+        :returns: The :class:`.QueueElement` removed.
+        :raises: :exc:`KeyError` if *request_id* not in the queue.
+        """
+        requester_id = self._owners.pop(hash(request_id))
+        element = self._queues[requester_id].remove(request_id)
+        _tally(self._signatures, element.signature, -1)
+        self._update(requester_id)
+        return element
+
+    def requeue(self, element):
+        """ Return a popped *element* to its requester's sub-queue,
+        without copying it, as :meth:`.PriorityQueue.requeue` does.
+
+        :param element: Queue element returned by :meth:`pop`.
+        :type element: :class:`.QueueElement`
+
+        Like :meth:`add`, refunds the charge for popping it.
+        """
+        self._queue(element.requester_id).requeue(element)
+        self._enqueued(element)
+
+    def signatures(self):
+        """ :returns: iterable of the distinct request signatures of
+            the queued elements, as for :meth:`.PriorityQueue.signatures`.
+        """
+        return self._signatures.keys()
+
+    def _update(self, requester_id):
+        """ Update the heap entry for a requester's sub-queue head.
+
+        Out-of-date entries stay in the heap until they reach the top,
+        or the heap gets too large and is rebuilt.
+        """
+        queue = self._queues[requester_id]
+        if len(queue) == 0:             # requester now idle?
+            del self._queues[requester_id]
+            self._entries.pop(requester_id, None)
+            finish = self._finish.get(requester_id)
+            if finish is not None:
+                if finish <= self.vtime:
+                    del self._finish[requester_id]
+                else:                   # forget it later
+                    heapq.heappush(self._idle, (finish, requester_id))
+            return
+        head = queue.peek()
+        rank = head.sort_key
+        if rank is None:                # no key function?
+            rank = -head.request.msg.priority
+        entry = (rank, self._finish.get(requester_id, 0.0),
+                 head.sequence, requester_id)
+        if self._entries.get(requester_id) == entry:
+            return                      # head unchanged
+        self._entries[requester_id] = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
 
 
 class QueueElement(object):
@@ -183,7 +468,8 @@ class QueueElement(object):
 
        :returns: ``True`` if *element* has higher priority than *other*, or
            their priorities are the same and *element* has a lower sequence
-           number.
+           number.  Elements with a *sort_key* compare those instead
+           of their priorities.
 
     This class does *not* provide a total ordering.  The ``==`` and
     ``<`` operators test completely different fields.  However, the
@@ -208,6 +494,18 @@ class QueueElement(object):
         """
         self.active = True
         """ ``True`` unless this element has been removed from its queue. """
+        self.signature = request_signature(request.msg.resources)
+        """ Canonical :func:`.request_signature` of the resources
+        requested, shared by every request of the same shape. """
+        self.sort_key = None
+        """ Sort key set by a :class:`.PriorityQueue` with a *key*
+        function, or ``None``. """
+        self.deadline = None
+        """ Time in seconds when this request stops waiting and is
+        canceled, or ``None``. """
+        self.virtual_start = None
+        """ Virtual start time charged when popped from a
+        :class:`.FairShareQueue`, or ``None``. """
 
     def __eq__(self, other):
         return self.request.msg.id == other.request.msg.id
@@ -216,6 +514,9 @@ class QueueElement(object):
         return hash(self.request.uuid)
 
     def __lt__(self, other):
+        if self.sort_key is not None:
+            return ((self.sort_key, self.sequence)
+                    < (other.sort_key, other.sequence))
         return (self.request.msg.priority > other.request.msg.priority
                 or (self.request.msg.priority == other.request.msg.priority
                     and self.sequence < other.sequence))
@@ -70,6 +70,9 @@ except ImportError:
         def __init__(self, resources=[]):
             self.resources = resources
 
+from .match_stats import clock
+from .tracing import traced
+
 
 ## Exceptions
 class InvalidRequestError(Exception):
@@ -87,6 +90,21 @@ class ResourceNotOwnedError(Exception):
     pass
 
 
+def request_signature(resources):
+    """ Generate a canonical signature for a list of requested resources.
+
+    :param resources: List of ``scheduler_msgs/Resource`` messages,
+        which may include regular expression syntax.
+    :returns: Hashable :class:`tuple` of (ROCON name, rapp) pairs,
+        which is the same for every request of the same shape.
+
+    Matching does not depend on the order of the requested items,
+    so they are sorted.
+    """
+    return tuple(sorted((rocon_name(res.uri), res.rapp)
+                        for res in resources))
+
+
 def rocon_name(uri):
     """ Generate canonical ROCON resource name.
 
@@ -126,6 +144,14 @@ class ResourcePool(object):
         ``scheduler_msgs/Request`` message or a list of
         ``CurrentStatus`` or ``Resource`` messages, like the
         ``resources`` component of one of those messages.
+    :param engine: (str) Storage engine for the pool contents:
+        ``'object'`` (the default) keeps a dictionary of
+        :class:`.PoolResource` objects; ``'columnar'`` creates a
+        :class:`.ColumnarResourcePool`, which keeps resource state in
+        NumPy arrays and vectorizes matching for very large pools.
+    :raises: :exc:`ValueError` if *engine* is not recognized, or
+        names a different engine than the subclass being created
+        provides.
 
     :class:`.ResourcePool` supports these standard container operations:
 
@@ -154,7 +180,20 @@ class ResourcePool(object):
            :class:`.ResourcePool`.
 
     """
-    def __init__(self, msg=None):
+    def __new__(cls, msg=None, engine=None):
+        if engine not in (None, 'object', 'columnar'):
+            raise ValueError('unknown resource pool engine: ' + str(engine))
+        if engine is not None:
+            from .columnar_pool import ColumnarResourcePool
+            columnar = issubclass(cls, ColumnarResourcePool)
+            if engine == 'columnar' and cls is ResourcePool:
+                cls = ColumnarResourcePool
+            elif columnar != (engine == 'columnar'):
+                raise ValueError(cls.__name__ + ' does not provide the '
+                                 + engine + ' resource pool engine')
+        return object.__new__(cls)
+
+    def __init__(self, msg=None, engine=None):
         self.pool = {}
         """ Dictionary of known :class:`.PoolResource` objects,
         indexed by the fully-resolved ROCON resource name.
@@ -162,12 +201,32 @@ class ResourcePool(object):
         self.changed = True
         """ True, if resource pool has changed since the previous
         known_resources() call. """
+        self.generation = 0
+        """ Membership generation, incremented whenever resources are
+        added or go missing.  Allocations do not change it. """
+        self._feasible = {}
+        self._feasible_generation = 0
+        self._candidates = {}           # names, by (pattern, rapp)
+        self._members = None            # cached membership() copy
+        self._shared = False
+        self._copied = set()
+        self.owned = {}
+        """ Dictionary of the :class:`set` of resource names allocated
+        to each request, indexed by request :class:`uuid.UUID`. """
+        self.by_priority = {}
+        """ Dictionary of the :class:`set` of allocated resource
+        names, indexed by the priority of their owners. """
+        self.stats = None
+        """ :class:`.MatchStats` counters for matching and allocation,
+        or ``None`` (the default) to disable them. """
+        self.thread_safe = False
+        """ True if the pool methods do their own locking, so it
+        may be updated without holding the Big Scheduler Lock. """
         if msg is not None:
             if hasattr(msg, 'resources'):
                 msg = msg.resources
             for res in msg:
-                pool_res = PoolResource(res)
-                self.pool[pool_res.uri] = pool_res
+                self._insert(PoolResource(res))
 
     def __contains__(self, uri):
         return uri in self.pool
@@ -184,23 +243,47 @@ class ResourcePool(object):
             s += '\n  ' + str(resource)
         return s
 
-    def allocate(self, request):
+    @traced('allocate')
+    def allocate(self, request, exclude=None, select=None):
         """ Try to allocate all resources for a *request*.
 
         :param request: Scheduler request object, some resources may
             include regular expression syntax.
         :type request: :class:`.ActiveRequest`
+        :param exclude: Optional :class:`set` of resource names that
+            must not be allocated, like those reserved for some
+            higher-priority request.
+        :param select: Optional function called with the *request*
+            and the :class:`set` of names matching one requested item,
+            returning the names to try, in order of preference.  By
+            default, they are tried in no particular order.
 
         :returns: List of ``scheduler_msgs/Resource`` messages
             allocated, in requested order with platform info fully
             resolved; or ``[]`` if not everything is available.
 
         :raises: :exc:`.InvalidRequestError` if the request is not valid.
+            A request that could be satisfied if nothing were
+            excluded is valid.
 
         If successful, matching ROCON resources are allocated to this
         *request*.  Otherwise, the *request* remains unchanged.
 
         """
+        stats = self.stats
+        if stats is None:
+            return self._allocate(request, exclude, select)
+        start = clock()
+        alloc = []
+        try:
+            alloc = self._allocate(request, exclude, select)
+            return alloc
+        finally:
+            stats.add_allocation(clock() - start, bool(alloc))
+
+    def _allocate(self, request, exclude=None, select=None):
+        """ Try to allocate all resources for a *request*, see
+        :meth:`allocate`. """
         n_wanted = len(request.msg.resources)  # number of resources wanted
         if n_wanted == 0:
             raise InvalidRequestError('No resources requested.')
@@ -211,24 +294,37 @@ class ResourcePool(object):
                                   {CurrentStatus.AVAILABLE})
         if not matches:                 # unsuccessful?
             return []                   # give up
+        if exclude:
+            if not self._assignable(matches):  # invalid regardless?
+                raise InvalidRequestError(
+                    'Resources are available, but this request cannot'
+                    ' be satisfied.')
+            matches = [match_set - exclude for match_set in matches]
+            if (not all(matches)
+                    or len(set(chain.from_iterable(matches))) < n_wanted):
+                return []               # not enough left
 
         # At least one resource is available that satisfies each item
         # requested.  Try to allocate them all in the order requested.
-        alloc = self._allocate_permutation(range(n_wanted), request, matches)
+        alloc = self._allocate_permutation(range(n_wanted), request,
+                                           matches, select)
         if alloc:                       # successful?
             return alloc
 
         if n_wanted < 4:                # not too many permutations?
             # Look for some other permutation that satisfies them all.
             for perm in islice(permutations(range(n_wanted)), 1, None):
-                alloc = self._allocate_permutation(perm, request, matches)
+                alloc = self._allocate_permutation(perm, request,
+                                                   matches, select)
                 if alloc:               # successful?
                     return alloc
 
+        if exclude:                     # valid without exclusions
+            return []
         raise InvalidRequestError(
             'Resources are available, but this request cannot be satisfied.')
 
-    def _allocate_permutation(self, perm, request, matches):
+    def _allocate_permutation(self, perm, request, matches, select=None):
         """ Try to allocate some permutation of resources for a *request*.
 
         :param perm: List of permuted resource indices for this
@@ -238,6 +334,7 @@ class ResourcePool(object):
         :type request: :class:`.ActiveRequest`
         :param matches: List containing sets of the available
             resources matching each element of *request.msg.resources*.
+        :param select: Optional preference function, see :meth:`allocate`.
         :returns: List of ``scheduler_msgs/Resource`` messages
             allocated, in requested order with platform info fully
             resolved; or ``[]`` if not everything is available.
@@ -246,6 +343,9 @@ class ResourcePool(object):
         *request*.  Otherwise, the *request* remains unchanged.
 
         """
+        if self.stats is not None:
+            self.stats.permutations += 1
+
         # Copy the list of Resource messages and all their contents.
         alloc = copy.deepcopy(request.msg.resources)
 
@@ -253,7 +353,10 @@ class ResourcePool(object):
         names_allocated = set([])
         for i in perm:
             # try each matching name in order
-            for name in matches[i]:
+            candidates = matches[i]
+            if select is not None:
+                candidates = select(request, candidates)
+            for name in candidates:
                 if name not in names_allocated:  # still available?
                     names_allocated.add(name)
                     alloc[i].uri = name
@@ -263,10 +366,100 @@ class ResourcePool(object):
 
         # successful: allocate to this request
         for resource in alloc:
-            self.pool[resource.uri].allocate(request)
+            self._writable(resource.uri).allocate(request)
+            self._index_owner(resource.uri, request.uuid,
+                              request.msg.priority)
             self.changed = True
         return alloc                    # success
 
+    def _assignable(self, match_sets):
+        """ Check whether distinct resources can be assigned to every
+        item of a request.
+
+        :param match_sets: List containing sets of the resource names
+            usable for each requested item.
+        :returns: ``True`` if some assignment exists.
+
+        Uses augmenting paths to find a maximal bipartite matching of
+        items to resource names.
+        """
+        assigned = {}                   # resource name -> item index
+
+        def assign(item, visited):
+            for name in match_sets[item]:
+                if name not in visited:
+                    visited.add(name)
+                    if (name not in assigned
+                            or assign(assigned[name], visited)):
+                        assigned[name] = item
+                        return True
+            return False
+
+        for item in range(len(match_sets)):
+            if not assign(item, set()):
+                return False
+        return True
+
+    def _candidates_for(self, pattern, rapp):
+        """ :returns: list of the names of pool resources advertising
+            *rapp* whose names match the regular expression *pattern*,
+            whatever their status.
+
+        Resource names and rapps only change when resources are
+        inserted, so each list is cached until then, and every
+        request of the same shape shares it.
+        """
+        key = (pattern, rapp)
+        names = self._candidates.get(key)
+        stats = self.stats
+        if names is not None:
+            if stats is not None:
+                stats.cache_hits += 1
+            return names
+        if len(self._candidates) >= 1024:  # too many patterns?
+            self._candidates = {}
+        matcher = re.compile(pattern).match
+        advertised = [res.uri for res in self.pool.values()
+                      if rapp in res.rapps]
+        names = [uri for uri in advertised if matcher(uri)]
+        self._candidates[key] = names
+        if stats is not None:
+            stats.cache_misses += 1
+            stats.regex_evaluations += len(advertised)
+        return names
+
+    def feasible(self, resources, signature=None):
+        """ Could some requested *resources* ever be satisfied by the
+        current pool members?
+
+        :param resources: List of ``scheduler_msgs/Resource`` messages,
+            which may include regular expression syntax.
+        :param signature: The :func:`.request_signature` of
+            *resources*, if already known.
+        :returns: ``True`` if all *resources* match some available or
+            allocated pool resources, so the request only needs to wait.
+
+        The answer depends only on which resources are in the pool
+        and not missing, so it is cached by :func:`.request_signature`
+        until the membership :attr:`generation` changes.
+        """
+        if self._feasible_generation != self.generation:
+            self._feasible.clear()      # membership changed
+            self._feasible_generation = self.generation
+        if signature is None:
+            signature = request_signature(resources)
+        result = self._feasible.get(signature)
+        if result is None:
+            result = bool(self.match_list(resources,
+                                          {CurrentStatus.AVAILABLE,
+                                           CurrentStatus.ALLOCATED}))
+            self._feasible[signature] = result
+            if self.stats is not None:
+                self.stats.cache_misses += 1
+        elif self.stats is not None:
+            self.stats.cache_hits += 1
+        return result
+
     def get(self, resource_name, default=None):
         """ Get named pool resource, if known.
 
@@ -277,6 +470,21 @@ class ResourcePool(object):
         """
         return self.pool.get(resource_name, default)
 
+    def _index_owner(self, uri, owner, priority):
+        """ Add an allocated resource to the owner and priority indexes. """
+        self.owned.setdefault(owner, set()).add(uri)
+        self.by_priority.setdefault(priority, set()).add(uri)
+
+    def _insert(self, pool_res):
+        """ Add a new resource to the pool.
+
+        :param pool_res: Resource to add, replacing any previous
+            resource with the same name.
+        :type pool_res: :class:`.PoolResource`
+        """
+        self.pool[pool_res.uri] = pool_res
+        self._candidates = {}           # not shared with snapshots
+
     def known_resources(self):
         """ Convert resource pool to ``scheduler_msgs/KnownResources``. """
         msg = KnownResources()
@@ -298,6 +506,19 @@ class ResourcePool(object):
             are not enough resources, or the original *resources* list
             was empty.
         """
+        stats = self.stats
+        if stats is None:
+            return self._match_list(resources, criteria)
+        start = clock()
+        try:
+            return self._match_list(resources, criteria)
+        finally:
+            stats.matches += 1
+            stats.match_time += clock() - start
+
+    def _match_list(self, resources, criteria):
+        """ Make a list containing sets of the available resources
+        matching each item in *resources*, see :meth:`match_list`. """
         matches = []
         for res_req in resources:
             match_set = self._match_subset(res_req, criteria)
@@ -323,12 +544,139 @@ class ResourcePool(object):
         :type resource_msg: ``scheduler_msgs/Resource``
         :param criteria: :class:`set` of resource status values allowed.
         :returns: :class:`set` containing matching resource names.
+
+        Only the cached candidates for this item are examined, not
+        the whole pool.
         """
-        avail = set()
-        for res in self.pool.values():
-            if (res.status in criteria and res.match(resource_msg)):
-                avail.add(res.uri)
-        return avail
+        names = self._candidates_for(rocon_name(resource_msg.uri),
+                                     resource_msg.rapp)
+        if self.stats is not None:
+            self.stats.resources_scanned += len(names)
+        pool = self.pool
+        return set(uri for uri in names if pool[uri].status in criteria)
+
+    def membership(self):
+        """ Copy the pool membership, so :meth:`feasible` can be
+        analyzed without holding any locks.
+
+        :returns: New :class:`.ResourcePool` with the same
+            :attr:`generation`, holding the name, rapps and whether
+            it is missing of each resource.  Allocations are left
+            out, since feasibility does not depend on them.
+
+        Unlike a :meth:`snapshot`, it shares nothing with this pool.
+        The copy is cached until the membership changes, so it
+        usually costs nothing.
+        """
+        members = self._members
+        if members is None or members.generation != self.generation:
+            members = ResourcePool()
+            for pool_res in self.pool.values():
+                member = PoolResource(pool_res)
+                if pool_res.status == CurrentStatus.MISSING:
+                    member.status = CurrentStatus.MISSING
+                members.pool[member.uri] = member
+            members.generation = self.generation
+            if self._feasible_generation == self.generation:
+                members._feasible = dict(self._feasible)
+            members._feasible_generation = self.generation
+            self._members = members
+        members.stats = self.stats
+        return members
+
+    def merge_feasible(self, snap):
+        """ Keep :meth:`feasible` results computed on a snapshot.
+
+        :param snap: A :meth:`snapshot` or :meth:`membership` copy of
+            this pool.
+
+        Lets feasibility be analyzed on a snapshot, without holding
+        any locks, and still cache the answers here.  They are
+        discarded if the pool membership changed after the snapshot
+        was made.
+        """
+        if (snap.generation == self.generation
+                and snap._feasible_generation == self.generation):
+            if self._feasible_generation != self.generation:
+                self._feasible.clear()  # membership changed
+                self._feasible_generation = self.generation
+            self._feasible.update(snap._feasible)
+
+    def preemption_victims(self, request, preempting=()):
+        """ Find the cheapest set of lower-priority requests to
+        preempt, so this *request* can be satisfied.
+
+        :param request: Scheduler request object, blocked because
+            some of the resources it needs are allocated.
+        :type request: :class:`.ActiveRequest`
+        :param preempting: Identifiers of requests already being
+            preempted, whose resources will soon be released.
+        :returns: List of :class:`uuid.UUID` of additional requests
+            to preempt, empty if preempting others would not help or
+            is not needed.
+
+        Candidate victims are found using the priority index of
+        allocated resources, starting with the lowest priority.
+        Within each priority, requests holding fewer resources are
+        preferred.  Victims that turn out to be unnecessary are
+        dropped again, starting with the most expensive.
+        """
+        priority = request.msg.priority
+        matches = self.match_list(request.msg.resources,
+                                  {CurrentStatus.AVAILABLE,
+                                   CurrentStatus.ALLOCATED})
+        if not matches:                 # cannot be satisfied at all?
+            return []
+        wanted = set(chain.from_iterable(matches))
+        free = set(name for name in wanted
+                   if self.pool[name].status == CurrentStatus.AVAILABLE)
+        for owner in preempting:
+            free |= self.owned.get(owner, set()) & wanted
+
+        def satisfiable(victims):
+            names = set(free)
+            for owner in victims:
+                names |= self.owned[owner] & wanted
+            return self._assignable([match & names for match in matches])
+
+        if satisfiable([]):
+            return []                   # nothing more needs preempting
+        victims = []
+        for level in sorted(p for p in self.by_priority if p < priority):
+            owners = set(self.pool[name].owner
+                         for name in self.by_priority[level] & wanted)
+            owners.difference_update(preempting)
+            for owner in sorted(owners, key=lambda o: len(self.owned[o])):
+                victims.append(owner)
+                if satisfiable(victims):
+                    break
+            else:
+                continue                # try next priority level
+            break                       # enough victims found
+        else:
+            return []                   # preemption would not help
+
+        # Drop unnecessary victims, trying the most expensive first.
+        for owner in reversed(list(victims)):
+            others = [other for other in victims if other != owner]
+            if satisfiable(others):
+                victims = others
+        return victims
+
+    def _release(self, uri, request_id=None):
+        """ Release one resource, updating the owner indexes.
+
+        :param uri: Name of the resource to release.
+        :param request_id: Optional owning request.
+        :type request_id: :class:`uuid.UUID` or ``None``
+        :raises: :exc:`.ResourceNotOwnedError` if *request_id* is
+            specified and is not the owner.
+        """
+        pool_res = self._writable(uri)
+        if request_id is None or pool_res.owner == request_id:
+            self._unindex_owner(pool_res)
+        pool_res.release(request_id)
+        self.changed = True
 
     def release_request(self, request):
         """ Release all the resources owned by this *request*.
@@ -340,8 +688,7 @@ class ResourcePool(object):
         """
         rq_id = request.uuid
         for res in request.allocations:
-            self.pool[res.uri].release(rq_id)
-            self.changed = True
+            self._release(res.uri, rq_id)
 
     def release_resources(self, resources):
         """ Release a list of *resources*.
@@ -352,28 +699,147 @@ class ResourcePool(object):
         they cannot be assigned to a request for some reason.
         """
         for res in resources:
-            pool_res = self.pool[res.uri]
-            pool_res.release()
-            self.changed = True
+            self._release(res.uri)
+
+    def snapshot(self):
+        """ Make a copy-on-write snapshot of this pool.
+
+        :returns: New :class:`.ResourcePool` with the same contents.
+
+        The snapshot initially shares every :class:`.PoolResource`
+        with this pool.  Afterwards, whichever pool changes an entry
+        via ``allocate()``, the release methods or ``update()`` first
+        makes its own copy of it, so changes to the snapshot never
+        affect this pool, nor the other way around.  That makes it
+        cheap to try some allocations and then throw them away.
+
+        Modifying a shared :class:`.PoolResource` directly, instead of
+        via pool methods, would affect both pools.
+        """
+        snap = copy.copy(self)
+        snap.owned = dict((owner, set(names))
+                          for owner, names in self.owned.items())
+        snap.by_priority = dict((level, set(names))
+                                for level, names in self.by_priority.items())
+        snap._feasible = dict(self._feasible)
+        self._share_with(snap)
+        return snap
+
+    def _share_with(self, snap):
+        """ Share the pool contents with a new snapshot, copy-on-write. """
+        snap.pool = dict(self.pool)
+        snap._shared = self._shared = True
+        snap._copied = set()
+        self._copied = set()            # all entries shared again
+
+    def status_counts(self):
+        """ :returns: :class:`dict` of the number of pool resources
+            in each ``CurrentStatus`` value. """
+        counts = dict.fromkeys([CurrentStatus.AVAILABLE,
+                                CurrentStatus.ALLOCATED,
+                                CurrentStatus.MISSING], 0)
+        for pool_res in self.pool.values():
+            counts[pool_res.status] += 1
+        return counts
+
+    def _unindex_owner(self, pool_res):
+        """ Remove an allocated resource from the owner and priority
+        indexes, before it is released. """
+        owned = self.owned.get(pool_res.owner)
+        if owned is not None:
+            owned.discard(pool_res.uri)
+            if not owned:
+                del self.owned[pool_res.owner]
+        allocated = self.by_priority.get(pool_res.priority)
+        if allocated is not None:
+            allocated.discard(pool_res.uri)
+            if not allocated:
+                del self.by_priority[pool_res.priority]
+
+    def restore_allocation(self, resource, owner, priority):
+        """ Restore a previously-saved resource allocation.
+
+        :param resource: Resource allocated, with its name fully
+            resolved.
+        :type resource: ``scheduler_msgs/Resource``
+        :param owner: :class:`uuid.UUID` of the owning request.
+        :param priority: Priority of the owning request.
+        :returns: ``True`` if restored, ``False`` if the resource
+            already has a different owner.
+
+        If the resource is not known yet, it is added with
+        ``MISSING`` status, until the conductor reports it again.
+        """
+        uri = rocon_name(resource.uri)
+        if uri not in self.pool:
+            pool_res = PoolResource(resource)
+            pool_res.status = CurrentStatus.MISSING
+            self._insert(pool_res)
+        pool_res = self._writable(uri)
+        if pool_res.owner is not None:
+            return pool_res.owner == owner
+        pool_res.owner = owner
+        pool_res.priority = priority
+        if pool_res.status == CurrentStatus.AVAILABLE:
+            pool_res.status = CurrentStatus.ALLOCATED
+        self._index_owner(uri, owner, priority)
+        self.changed = True
+        return True
 
     def update(self, client_list):
         """ Update resource pool from a new concert clients list.
 
         :param client_list: current list of ``ConcertClient`` messages.
+        :returns: List of the names of resources added or restored.
+
+        Clients not previously known are added.  Missing clients
+        that reappear are restored, keeping any current owner.
         """
+        appeared = []
         clients_found = set()
         for client in client_list:
-            uri = client.platform_info.uri
+            uri = rocon_name(client.platform_info.uri)
             clients_found.add(uri)
-            if uri not in self.pool:    # not previously-known?
-                self.pool[uri] = PoolResource(client)
+            pool_res = self.pool.get(uri)
+            if pool_res is None:        # not previously-known?
+                self._insert(PoolResource(client))
+                appeared.append(uri)
+                self.generation += 1
+                self.changed = True
+            elif pool_res.status == CurrentStatus.MISSING:  # back again?
+                new_res = PoolResource(client)  # with current rapps
+                new_res.owner = pool_res.owner
+                new_res.priority = pool_res.priority
+                if new_res.owner is not None:
+                    new_res.status = CurrentStatus.ALLOCATED
+                self._insert(new_res)
+                appeared.append(uri)
+                self.generation += 1
                 self.changed = True
 
         # previously-known resources not in clients_found are missing
         missing_clients = set(self.pool.keys()) - clients_found
         for uri in missing_clients:
-            self.pool[uri].status = CurrentStatus.MISSING
+            pool_res = self._writable(uri)
+            if pool_res.status != CurrentStatus.MISSING:
+                self.generation += 1
+            pool_res.status = CurrentStatus.MISSING
             self.changed = True
+        return appeared
+
+    def _writable(self, uri):
+        """ Get a pool resource that is about to be modified.
+
+        :param uri: Name of the resource.
+        :returns: :class:`.PoolResource` owned by this pool, copying
+            it first if it is still shared with a snapshot.
+        """
+        pool_res = self.pool[uri]
+        if self._shared and uri not in self._copied:
+            pool_res = copy.copy(pool_res)
+            self.pool[uri] = pool_res
+            self._copied.add(uri)
+        return pool_res
 
 
 class PoolResource:
@@ -0,0 +1,885 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: scheduler_core
+
+Scheduling policy for the `Robotics in Concert`_ (ROCON) scheduler,
+independent of any transport.
+
+The :class:`.SchedulerCore` queues, grants, blocks and frees resource
+requests without a ROS node, topics, services or timers, so the same
+policy can run inside :class:`.SimpleSchedulerNode`, or offline in
+the :mod:`.simulator`.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import itertools
+import logging
+import threading
+
+from rocon_scheduler_requests.transitions import ActiveRequest
+from rocon_scheduler_requests.transitions import TransitionError
+from scheduler_msgs.msg import Request
+
+from .blocked_index import BlockedIndex
+from .match_stats import clock
+from .metrics import SchedulerMetrics
+from .policy import SchedulingPolicy
+from .priority_queue import FairShareQueue, PriorityQueue, QueueElement
+from .resource_pool import CurrentStatus
+from .resource_pool import InvalidRequestError
+from .resource_pool import ResourcePool
+from .timer_wheel import TimerWheel
+from .tracing import traced
+from . import journal
+
+logger = logging.getLogger('rosout')
+""" Logger for scheduler messages.  Within a ROS node, this is the
+logger :mod:`rospy` uses, so the messages still reach ``/rosout``. """
+
+
+def call_later(delay, function):
+    """ Call a *function* once, in a new daemon thread.
+
+    :param delay: (float) Seconds to wait first.
+    :param function: Function to call, with no arguments.
+    """
+    timer = threading.Timer(delay, function)
+    timer.daemon = True
+    timer.start()
+
+
+class SchedulerCore(object):
+    """ Transport-independent scheduling policy.
+
+    :param pool: Resource pool, or ``None`` for a new, empty
+        :class:`.ResourcePool`.
+    :type pool: :class:`.ResourcePool` or :class:`.ShardedResourcePool`
+    :param preemption: (bool) True if blocked requests may preempt
+        lower priorities.
+    :param dispatch_mode: (str) ``'strict'`` or ``'backfill'``, see
+        :meth:`dispatch`.
+    :param policy: :class:`.SchedulingPolicy` hooks for ordering,
+        admission, resource selection and blocking, or ``None`` for
+        the default fixed-priority policy.
+    :param fair_share: Dictionary of relative weights, indexed by
+        requester :class:`uuid.UUID`, to share resources fairly among
+        requesters using a :class:`.FairShareQueue`; or ``None`` to
+        grant requests in the policy's order.
+    :param wait_timeout: Default seconds a request may wait in the
+        ready or blocked queue before it is canceled, or zero to wait
+        indefinitely.  A policy's :meth:`.SchedulingPolicy.admit`
+        hook may change the ``deadline`` of each queue element.
+    :param batch_window: Seconds to gather request transitions
+        before dispatching them together, or zero to dispatch after
+        every callback, see :meth:`callback`.
+    :raises: :exc:`ValueError` for an unknown *dispatch_mode*.
+
+    The owner of the core sets :attr:`sch` to a scheduler providing
+    a ``lock``, a ``requesters`` dictionary and a
+    ``notify(requester_id)`` method, like
+    :class:`rocon_scheduler_requests.Scheduler` or
+    :class:`.LocalScheduler`, which calls :meth:`callback` with each
+    batch of requests.  It also calls :meth:`track_clients` when the
+    concert clients change, and :meth:`reschedule` periodically.
+
+    Different scheduling policies can be plugged in without deriving
+    from this class, see the :mod:`.policy` module.
+    """
+    def __init__(self, pool=None, preemption=False, dispatch_mode='strict',
+                 policy=None, fair_share=None, wait_timeout=0.0,
+                 batch_window=0.0):
+        """ Constructor. """
+        if dispatch_mode not in ('strict', 'backfill'):
+            raise ValueError('unknown dispatch mode: ' + str(dispatch_mode))
+        if pool is None:
+            pool = ResourcePool()
+        self.pool = pool
+        """ Resource pool. """
+        if policy is None:
+            policy = SchedulingPolicy()
+        self.policy = policy
+        """ :class:`.SchedulingPolicy` in effect. """
+        self.sch = None
+        """ Scheduler delivering requests, set by the owner. """
+        if fair_share is None:
+            self.ready_queue = PriorityQueue(key=policy.order)
+        else:
+            self.ready_queue = FairShareQueue(weights=fair_share,
+                                              key=policy.order)
+        """ Queue of waiting requests. """
+        self.blocked_queue = PriorityQueue(key=policy.order)
+        """ Queue of blocked requests. """
+        self.blocked_index = BlockedIndex()
+        """ :class:`.BlockedIndex` of the blocked queue requests. """
+        self.notification_set = set()
+        """ Set of requester identifiers to notify. """
+        self.granted = {}
+        """ Dictionary of granted queue elements, indexed by request UUID. """
+        self.preempting = set()
+        """ Set of UUIDs of granted requests being preempted. """
+        self.preemption = preemption
+        """ True if blocked requests may preempt lower priorities. """
+        self.backfill = (dispatch_mode == 'backfill')
+        """ True if requests behind one that cannot be satisfied may
+        use resources it is not waiting for. """
+        self.metrics = SchedulerMetrics()
+        """ :class:`.SchedulerMetrics` event counters and histograms. """
+        self.restored = {}
+        """ Dictionary of (queue element, state) pairs restored from
+        the journal, waiting for their requesters to reclaim them,
+        indexed by request UUID.  The state is ``'ready'``,
+        ``'blocked'`` or ``'granted'``. """
+        self.journal = None
+        """ :class:`.Journal` of state changes, or ``None``. """
+        self.recorder = None
+        """ :class:`.Recorder` capturing scheduler traffic, or ``None``. """
+        self.wait_timeout = wait_timeout
+        """ Default seconds a request may wait, or zero for no limit. """
+        self.clock = clock
+        """ Function returning the current time in seconds, for wait
+        deadlines.  A simulator may substitute its virtual clock. """
+        self.timers = TimerWheel()
+        """ :class:`.TimerWheel` of queued request deadlines. """
+        self.batch_window = batch_window
+        """ Seconds to gather transitions before dispatching, or zero. """
+        self.batch_pending = False
+        """ True while a batch of transitions awaits :meth:`flush`. """
+        self.call_later = call_later
+        """ Function called with a delay in seconds and a function to
+        call then, for ending batches and expiring deadlines.  A
+        simulator may substitute its own event queue. """
+        self.wakeup_time = None
+        """ Time of the next :meth:`wakeup` arranged, or ``None``. """
+
+    def block_requests(self, elements):
+        """ Move ready queue *elements* to the blocked queue, then
+        dispatch any remaining ready requests.
+
+        :param elements: :class:`.QueueElement` objects the policy
+            blocks.  Any no longer in the ready queue are skipped.
+
+        :pre: The Big Scheduler Lock is held.
+        """
+        for elem in elements:
+            if elem.request.uuid not in self.ready_queue:
+                continue                # granted or canceled meanwhile
+
+            # move elem to blocked_queue
+            logger.info('Request blocked: ' + str(elem.request.uuid))
+            elem = self.ready_queue.remove(elem)
+            elem.request.wait(reason=Request.UNAVAILABLE)
+            self.blocked_queue.add(elem)
+            self.blocked_index.add(elem.request, self.pool)
+            self.log_change(journal.BLOCK, elem.request.uuid)
+            self.notification_set.add(elem.requester_id)
+
+        # try to allocate any remaining ready requests
+        self.dispatch()
+        if self.pool.stats is not None:
+            logger.debug('Matching stats: ' + str(self.pool.stats))
+
+    @traced('callback')
+    def callback(self, rset):
+        """ Scheduler request callback.
+
+        Called in the scheduler callback thread holding the Big
+        Scheduler Lock.
+
+        New requests are queued and canceled ones freed right away.
+        Without a :attr:`batch_window`, ready requests are then
+        dispatched, which also publishes pool changes and notifies
+        requesters.  With one, the first callback of a batch arranges
+        a :meth:`flush` that many seconds later, and dispatching waits
+        until then, so a burst of callbacks is dispatched once.  Later
+        callbacks do not extend the window, which caps the latency
+        added.
+
+        See: :class:`.rocon_scheduler_requests.Scheduler` documentation.
+        """
+        start = clock()
+        if self.recorder is not None:
+            self.recorder.requests(rset)
+        self.expire()
+        logger.debug('scheduler callback:')
+        for rq in rset.values():
+            logger.debug('  ' + str(rq))
+            if rq.uuid in self.restored:  # resent after a restart?
+                if rq.msg.status == Request.NEW:
+                    self.forget_restored(rq.uuid)  # queue it afresh
+                else:
+                    self.reclaim(rq, rset.requester_id)
+            if rq.msg.status == Request.NEW:
+                self.queue(rq, rset.requester_id)
+            elif rq.msg.status == Request.CANCELING:
+                self.free(rq, rset.requester_id)
+        if self.batch_window > 0.0:
+            if not self.batch_pending:  # first callback of a batch?
+                self.batch_pending = True
+                self.call_later(self.batch_window, self.flush)
+        else:
+            self.dispatch()             # try to allocate ready requests
+        self.metrics.observe('callback', clock() - start)
+
+    @traced('dispatch')
+    def dispatch(self):
+        """ Grant any available resources to ready requests.
+
+        In strict mode, stops at the first request that cannot be
+        satisfied.  In backfill mode, each request that cannot be
+        satisfied reserves the available resources it could use, and
+        later requests may still be granted anything else.  Requests
+        like one already deferred are deferred too, and once all
+        those remaining are, dispatching stops.
+
+        Notifies all affected requesters.
+        """
+        start = clock()
+        deferred = []                   # elements not satisfied
+        reserved = set()                # resource names held for them
+        failed = set()                  # signatures of those requests
+        while len(self.ready_queue) > 0:
+            # Try to allocate top element in the ready queue.
+            elem = self.ready_queue.pop()
+            signature = elem.signature
+            if self.backfill:
+                if signature in failed:  # same as one already deferred?
+                    deferred.append(elem)
+                    continue
+            resources = []
+            try:
+                resources = self.pool.allocate(elem.request, reserved,
+                                               self.policy.select)
+            except InvalidRequestError as ex:
+                self.reject_request(elem, ex)
+                continue                # skip to next queue element
+
+            if not resources:           # request cannot be satisfied?
+                if self.preemption and not deferred:  # top request?
+                    self.preempt_for(elem)
+                deferred.append(elem)
+                if not self.backfill:
+                    break               # stop looking
+                failed.add(signature)
+                reserved |= self.reservation(elem)
+                if failed.issuperset(self.ready_queue.signatures()):
+                    break               # the rest would be deferred too
+                continue
+
+            try:
+                elem.request.grant(resources)
+                self.granted[elem.request.uuid] = elem
+                self.timers.remove(elem.request.uuid)
+                self.metrics.granted(elem.request.uuid)
+                self.log_change(journal.GRANT, elem.request.msg,
+                                elem.requester_id)
+                logger.info(
+                    'Request granted: ' + str(elem.request.uuid))
+            except TransitionError:     # request no longer active?
+                # Return allocated resources to the pool.
+                self.pool.release_resources(resources)
+            self.notification_set.add(elem.requester_id)
+
+        # Return unsatisfied requests to the queue, in their places.
+        # They are unchanged, so need not be copied again.
+        for elem in deferred:
+            self.ready_queue.requeue(elem)
+
+        # notify all affected requesters
+        self.notify_requesters()
+
+        # let the owner publish any resource pool changes
+        self.pool_updated()
+        self.metrics.observe('dispatch', clock() - start)
+
+    def drop_restored(self, event):
+        """ Drop restored requests not reclaimed by their requesters.
+
+        Releases the resources of any restored requests that are no
+        longer active.
+        """
+        with self.sch.lock:
+            for request_id in list(self.restored):
+                self.forget_restored(request_id)
+            self.dispatch()
+
+    def expire(self):
+        """ Cancel queued requests whose wait deadlines have passed.
+
+        Only the deadlines that expired are visited, not the whole
+        queues.
+
+        :pre: The Big Scheduler Lock is held.
+        """
+        for request_id in self.timers.advance(self.clock()):
+            for queue in [self.ready_queue, self.blocked_queue]:
+                if request_id in queue:
+                    elem = queue.remove(request_id)
+                    break
+            else:
+                continue                # no longer queued
+            logger.info('Request expired: ' + str(request_id))
+            self.blocked_index.remove(request_id)
+            elem.request.cancel(Request.TIMEOUT)
+            self.metrics.expired(request_id)
+            self.log_change(journal.CANCEL, request_id)
+            self.notification_set.add(elem.requester_id)
+
+    def flush(self):
+        """ End a batch of request transitions, dispatching them.
+
+        Acquires the Big Scheduler Lock.
+        """
+        with self.sch.lock:
+            self.batch_pending = False
+            self.dispatch()
+
+    def forget_restored(self, request_id):
+        """ Drop a request restored from the journal, releasing any
+        resources it held.
+
+        :param request_id: (:class:`uuid.UUID`) Unique request identifier.
+        """
+        elem, state = self.restored.pop(request_id)
+        logger.info('Restored request dropped: ' + str(request_id))
+        if state == 'granted':
+            self.pool.release_request(elem.request)
+        self.log_change(journal.CANCEL, request_id)
+
+    def free(self, request, requester_id):
+        """ Free all resources allocated for this *request*.
+
+        :param request: (:class:`.ActiveRequest`)
+        :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+        """
+        self.pool.release_request(request)
+        logger.info('Request canceled: ' + str(request.uuid))
+        request.close()
+        # remove request from any queues
+        request_id = request.uuid
+        self.granted.pop(request_id, None)
+        self.timers.remove(request_id)
+        self.preempting.discard(request_id)
+        self.blocked_index.remove(request_id)
+        self.metrics.canceled(request_id)
+        self.log_change(journal.CANCEL, request_id)
+        for queue in [self.ready_queue, self.blocked_queue]:
+            if request_id in queue:
+                queue.remove(request_id)
+                break                   # should not be in any other queue
+        self.notification_set.add(requester_id)
+
+    def journal_state(self):
+        """ :returns: current scheduler state, for a journal checkpoint.
+
+        See :func:`.journal.replay` for the format.
+        """
+        state = journal.empty_state()
+        for queue, blocked in [(self.ready_queue, False),
+                               (self.blocked_queue, True)]:
+            for elem in queue:
+                state['queued'].append((elem.request.msg, elem.requester_id,
+                                        elem.sequence, blocked))
+        for elem in self.granted.values():
+            state['granted'].append((elem.request.msg, elem.requester_id))
+        for elem, restored_state in self.restored.values():
+            if restored_state == 'granted':
+                state['granted'].append((elem.request.msg,
+                                         elem.requester_id))
+            else:
+                state['queued'].append((elem.request.msg, elem.requester_id,
+                                        elem.sequence,
+                                        restored_state == 'blocked'))
+        state['queued'].sort(key=lambda entry: entry[2])
+        return state
+
+    def log_change(self, op, *args):
+        """ Record a state change in the journal, if enabled.
+
+        :param op: Journal operation code, like :const:`.journal.QUEUE`.
+        :param args: Operation arguments.
+
+        Writes a compacted checkpoint when enough changes have
+        accumulated.
+        """
+        if self.journal is not None:
+            self.journal.append(op, *args)
+            if self.journal.needs_checkpoint():
+                self.journal.checkpoint(self.journal_state())
+
+    def metrics_sample(self):
+        """ Take a sample of the scheduler metrics.
+
+        :returns: :class:`dict` of metric values, by name, see
+            :meth:`.SchedulerMetrics.sample`.
+
+        Acquires the Big Scheduler Lock.
+        """
+        with self.sch.lock:
+            return self.metrics.sample(len(self.ready_queue),
+                                       len(self.blocked_queue),
+                                       self.pool.status_counts())
+
+    def notify_requesters(self):
+        """ Notify affected requesters.
+
+        :pre: self.notification_set contains requesters to notify.
+        :post: self.notification_set is empty.
+        """
+        for requester_id in list(self.notification_set):
+            try:
+                self.sch.notify(requester_id)
+            except KeyError:            # requester now missing?
+                # shut down this requester
+                self.shutdown_requester(requester_id)
+        self.notification_set.clear()
+
+    def pool_updated(self):
+        """ Called after each dispatch, when the resource pool may
+        have changed.
+
+        Does nothing here.  Derived classes may publish the changes.
+        """
+        pass
+
+    def preempt_for(self, element):
+        """ Preempt lower-priority requests holding resources needed
+        by a queue *element* that cannot be satisfied.
+
+        :param element: Queue element waiting for resources.
+        :type element: :class:`.QueueElement`
+
+        The victims are notified, and their resources become
+        available when the requesters cancel them.
+        """
+        victims = self.pool.preemption_victims(element.request,
+                                               self.preempting)
+        for victim_id in victims:
+            victim = self.granted.get(victim_id)
+            if victim is None:          # not granted by this scheduler?
+                continue
+            try:
+                victim.request.preempt(reason=Request.PREEMPTED)
+            except TransitionError:     # request no longer active?
+                continue
+            logger.info('Request preempted: ' + str(victim_id)
+                        + ' for ' + str(element.request.uuid))
+            self.preempting.add(victim_id)
+            self.notification_set.add(victim.requester_id)
+
+    def queue(self, request, requester_id):
+        """ Add *request* to ready queue, making it wait.
+
+        :param request: resource request to be queued.
+        :type request: :class:`.ActiveRequest`
+        :param requester_id: Unique requester identifier.
+        :type requester_id: :class:`uuid.UUID`
+        """
+        try:
+            request.wait(reason=Request.BUSY)
+        except TransitionError:         # request no longer active?
+            return
+        elem = QueueElement(request, requester_id)
+        if self.wait_timeout > 0.0:
+            elem.deadline = self.clock() + self.wait_timeout
+        try:
+            self.policy.admit(elem)
+        except InvalidRequestError as ex:
+            self.reject_request(elem, ex)
+            return
+        self.ready_queue.add(elem)
+        if elem.deadline is not None:
+            self.timers.add(request.uuid, elem.deadline)
+            self.schedule_wakeup()
+        self.metrics.queued(request.uuid)
+        self.log_change(journal.QUEUE, request.msg, requester_id,
+                        elem.sequence)
+        logger.info('Request queued: ' + str(request.uuid))
+        self.notification_set.add(requester_id)
+
+    def reclaim(self, request, requester_id):
+        """ Reclaim a *request* restored from the journal.
+
+        :param request: Request resent by its requester after a restart.
+        :type request: :class:`.ActiveRequest`
+        :param requester_id: Unique requester identifier.
+        :type requester_id: :class:`uuid.UUID`
+
+        The restored queue element is rebound to the active *request*,
+        then returns to its previous queue, keeping its original
+        sequence number, or to the granted requests.
+        """
+        elem, state = self.restored.pop(request.uuid)
+        allocations = elem.request.allocations
+        elem.request = request
+        elem.requester_id = requester_id
+        if state == 'granted':
+            if not request.allocations:
+                request.allocations = allocations
+            self.granted[request.uuid] = elem
+        elif state == 'blocked':
+            self.blocked_queue.add(elem)
+            self.blocked_index.add(request, self.pool)
+        else:
+            self.ready_queue.add(elem)
+        logger.info('Request reclaimed: ' + str(request.uuid))
+
+    def reject_request(self, element, exception):
+        """ Reject an invalid queue *element*.
+
+        :param element: Queue element to reject.
+        :type element: :class:`.QueueElement`
+        :param exception: Associated exception object.
+        """
+        logger.warning(str(exception))
+        if hasattr(Request, "INVALID"):  # new reason code defined?
+            element.request.cancel(Request.INVALID)
+        else:
+            element.request.cancel(Request.UNAVAILABLE)
+        self.metrics.rejected(element.request.uuid)
+        self.log_change(journal.CANCEL, element.request.uuid)
+        self.notification_set.add(element.requester_id)
+
+    def reservation(self, element):
+        """ Reserve resources for a queue *element* that cannot be
+        satisfied yet.
+
+        :param element: Queue element waiting for resources.
+        :type element: :class:`.QueueElement`
+        :returns: :class:`set` of names of the available resources
+            any of its requested items could use.
+        """
+        reserved = set()
+        for res in element.request.msg.resources:
+            for match_set in self.pool.match_list(
+                    [res], {CurrentStatus.AVAILABLE}):
+                reserved |= match_set
+        return reserved
+
+    @traced('reschedule')
+    def reschedule(self, event):
+        """ Rescheduling pass.
+
+        :param event: :class:`rospy.TimerEvent` for the fallback
+            timer, or ``None``.
+
+        Moves requests that cannot be satisfied with
+        currently-available resources to the blocked queue, as
+        decided by the policy's :meth:`.SchedulingPolicy.block` hook.
+        The whole ready queue is classified in one pass, using the
+        resource pool's cached feasibility results, which only change
+        when the pool membership does.
+
+        Acquires the Big Scheduler Lock, but holds it only while
+        copying the ready queue and the pool :meth:`membership
+        <.ResourcePool.membership>`, and while committing the
+        results.  Feasibility is analyzed in between, so request
+        callbacks need not wait for it.  If the pool membership
+        changed meanwhile, the analysis is repeated under the lock.
+        Requests queued during the analysis are classified by the
+        next pass.  Callers already holding the lock gain nothing
+        from that, and use :meth:`reschedule_locked` instead.
+        """
+        start = clock()
+        with self.sch.lock:
+            self.expire()
+            members = self.pool.membership()
+            waiting = [(elem, elem.request.msg.resources)
+                       for elem in self.ready_queue]
+
+        # analyze the membership copy, without holding the lock
+        block = self.policy.block
+        unsatisfiable = [elem for elem, resources in waiting
+                         if block(elem,
+                                  members.feasible(resources,
+                                                   elem.signature))]
+
+        with self.sch.lock:
+            if members.generation == self.pool.generation:
+                self.pool.merge_feasible(members)
+            else:                       # membership changed, try again
+                unsatisfiable = self.unsatisfiable()
+            self.block_requests(unsatisfiable)
+            self.metrics.observe('reschedule', clock() - start)
+
+    @traced('reschedule')
+    def reschedule_locked(self):
+        """ Rescheduling pass, analyzing feasibility on the live pool.
+
+        Does the same as :meth:`reschedule`, for callers that already
+        hold the Big Scheduler Lock.
+
+        :pre: The Big Scheduler Lock is held.
+        """
+        start = clock()
+        self.expire()
+        self.block_requests(self.unsatisfiable())
+        self.metrics.observe('reschedule', clock() - start)
+
+    def restore(self):
+        """ Restore scheduler state from the journal.
+
+        Saved allocations are restored in the resource pool
+        immediately, so they will not be granted to anyone else.
+        Queued and granted requests wait in :attr:`restored` until
+        their requesters resend them.  A new checkpoint is written
+        right away, so the journal only records later changes.
+        """
+        state = journal.replay(*self.journal.load())
+        for msg, requester_id in state['granted']:
+            request = ActiveRequest(msg)
+            for res in msg.resources:
+                self.pool.restore_allocation(res, request.uuid, msg.priority)
+            request.allocations = msg.resources
+            self.restored[request.uuid] = (QueueElement(request,
+                                                        requester_id),
+                                           'granted')
+        max_sequence = -1
+        for msg, requester_id, sequence, blocked in state['queued']:
+            elem = QueueElement(ActiveRequest(msg), requester_id)
+            elem.sequence = sequence
+            max_sequence = max(max_sequence, sequence)
+            self.restored[elem.request.uuid] = (
+                elem, 'blocked' if blocked else 'ready')
+        # New requests must sort after all the restored ones.
+        next_sequence = next(QueueElement._sequence)
+        QueueElement._sequence = itertools.count(max(next_sequence,
+                                                     max_sequence + 1))
+        self.journal.checkpoint(self.journal_state())
+        logger.info('Restored ' + str(len(self.restored))
+                    + ' requests from journal: ' + self.journal.path)
+
+    def schedule_wakeup(self):
+        """ Arrange a :meth:`wakeup` when the next deadline could
+        expire, unless an earlier one is already arranged.
+
+        :pre: The Big Scheduler Lock is held.
+        """
+        when = self.timers.next_expiry()
+        if when is None:
+            return
+        if self.wakeup_time is not None and self.wakeup_time <= when:
+            return
+        self.wakeup_time = when
+        self.call_later(max(0.0, when - self.clock()),
+                        lambda: self.wakeup(when))
+
+    def shutdown_requester(self, requester_id):
+        """ Shut down this requester, recovering all resources assigned.
+
+        Its queued requests are canceled first, because requests may
+        only be closed once canceling.
+        """
+        for queue in [self.ready_queue, self.blocked_queue]:
+            for elem in list(queue):
+                if elem.requester_id == requester_id:
+                    elem.request.cancel()
+                    self.free(elem.request, requester_id)
+
+    @traced('track_clients')
+    def track_clients(self, msg):
+        """ Concert clients message callback.
+
+        Updates the resource pool based on client changes published by
+        the concert conductor.
+
+        Uses the Big Scheduler Lock to serialize changes with
+        operations done within the scheduler callback thread, unless
+        the pool is :attr:`thread_safe <.ResourcePool.thread_safe>`,
+        like a :class:`.ShardedResourcePool`, which locks each shard
+        separately.  Updates then only wait for allocations in the
+        shards they change, though allocations themselves are still
+        serialized by the Big Scheduler Lock.  Rescheduling after
+        membership changes always holds it.
+
+        When resources appear or go missing, reschedules immediately,
+        which also publishes the change.  Blocked requests that newly
+        appearing resources could satisfy become ready again.
+        """
+        if self.recorder is not None:
+            self.recorder.clients(msg)
+        generation = self.pool.generation
+        if self.pool.thread_safe:
+            appeared = self.pool.update(msg.clients)
+        else:
+            with self.sch.lock:
+                appeared = self.pool.update(msg.clients)
+        if self.pool.generation != generation:  # membership changed?
+            with self.sch.lock:
+                self.unblock(appeared)
+                self.reschedule_locked()
+
+    def unblock(self, uris):
+        """ Move blocked requests back to the ready queue, if some
+        resources that just appeared make them feasible again.
+
+        :param uris: Names of the resources added or restored.
+
+        Only blocked requests waiting for something one of those
+        resources could provide are re-evaluated.
+
+        :pre: The Big Scheduler Lock is held.
+        """
+        waking = set()
+        for uri in uris:
+            pool_res = self.pool.get(uri)
+            if pool_res is not None:
+                waking |= self.blocked_index.candidates(pool_res)
+        for request_id in waking:
+            elem = self.blocked_queue.remove(request_id)
+            if self.policy.block(
+                    elem, self.pool.feasible(elem.request.msg.resources,
+                                             elem.signature)):
+                # still waiting, maybe for other resources now
+                self.blocked_queue.add(elem)
+                self.blocked_index.add(elem.request, self.pool)
+                continue
+            logger.info('Request unblocked: ' + str(request_id))
+            self.blocked_index.remove(request_id)
+            elem.request.wait(reason=Request.BUSY)
+            self.ready_queue.add(elem)
+            self.log_change(journal.READY, request_id)
+            self.notification_set.add(elem.requester_id)
+
+    def unsatisfiable(self):
+        """ :returns: list of the ready queue elements the policy
+            blocks, because the current pool members could never
+            satisfy them.
+
+        :pre: The Big Scheduler Lock is held.
+        """
+        block = self.policy.block
+        return [elem for elem in self.ready_queue
+                if block(elem,
+                         self.pool.feasible(elem.request.msg.resources,
+                                            elem.signature))]
+
+    def wakeup(self, when):
+        """ Expire requests whose deadlines passed while the
+        scheduler was otherwise idle.
+
+        :param when: Time this wakeup was arranged for, by
+            :meth:`schedule_wakeup`.
+
+        Acquires the Big Scheduler Lock.  Arranges the next wakeup,
+        if any deadlines remain.
+        """
+        with self.sch.lock:
+            if self.wakeup_time == when:
+                self.wakeup_time = None
+            self.expire()
+            self.notify_requesters()
+            self.schedule_wakeup()
+
+
+class LocalScheduler(object):
+    """ In-process stand-in for :class:`rocon_scheduler_requests.Scheduler`.
+
+    :param callback: Scheduler callback function, called with each
+        batch of requests, holding the :attr:`lock`.
+    :param feedback: Function called with the requester identifier
+        for each notification, or ``None``.
+    :param lock: Big Scheduler Lock, or ``None`` to make a new
+        :class:`threading.RLock`.
+
+    Delivers requests to a :class:`.SchedulerCore` without ROS,
+    for tests and simulations.
+    """
+    def __init__(self, callback, feedback=None, lock=None):
+        """ Constructor. """
+        self.callback = callback
+        """ Scheduler callback function. """
+        self.feedback = feedback
+        """ Feedback function, or ``None``. """
+        if lock is None:
+            lock = threading.RLock()
+        self.lock = lock
+        """ Big Scheduler Lock. """
+        self.requesters = {}
+        """ Dictionary of active requests, by UUID, for each known
+        requester identifier. """
+
+    def notify(self, requester_id):
+        """ Notify requester of status updates.
+
+        :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+        :raises: :exc:`KeyError` if unknown requester identifier.
+        """
+        if requester_id not in self.requesters:
+            raise KeyError(requester_id)
+        if self.feedback is not None:
+            self.feedback(requester_id)
+
+    def remove(self, requester_id):
+        """ Forget a requester, as if it had stopped sending messages.
+
+        :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+        """
+        self.requesters.pop(requester_id, None)
+
+    def submit(self, requester_id, requests):
+        """ Deliver requests, as a requester message would.
+
+        :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+        :param requests: List of :class:`.ActiveRequest` objects, new
+            or with changed status.
+
+        Calls the scheduler callback with just these *requests*,
+        holding the :attr:`lock`.
+        """
+        active = self.requesters.setdefault(requester_id, {})
+        rset = RequestBatch(requester_id)
+        for request in requests:
+            rset[request.uuid] = request
+            active[request.uuid] = request
+        with self.lock:
+            self.callback(rset)
+        for request in requests:
+            if request.msg.status == Request.CLOSED:
+                del active[request.uuid]
+
+
+class RequestBatch(dict):
+    """ Dictionary of :class:`.ActiveRequest` objects, by UUID, from
+    one requester.
+
+    :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+    """
+    def __init__(self, requester_id):
+        """ Constructor. """
+        super(RequestBatch, self).__init__()
+        self.requester_id = requester_id
+        """ Unique requester identifier. """
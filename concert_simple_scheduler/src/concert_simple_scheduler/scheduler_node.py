@@ -37,225 +37,256 @@ Simple scheduler node.
 
 This module implements the scheduler interface for the `Robotics in
 Concert`_ (ROCON) project.  It tracks resources and allocates them to
-ROCON services.
+ROCON services, using the policy in :class:`.SchedulerCore`.
 
 .. include:: weblinks.rst
 
 """
+import threading
+import uuid
 import rospy
-from rocon_scheduler_requests import Scheduler, TransitionError
+from rocon_scheduler_requests import Scheduler
 from concert_msgs.msg import ConcertClients
-from scheduler_msgs.msg import KnownResources
-from scheduler_msgs.msg import Request
-
+from diagnostic_msgs.msg import DiagnosticArray
+from std_srvs.srv import Empty, EmptyResponse
+
+from .capture import Recorder
+from .lock_monitor import MonitoredLock
+from .match_stats import MatchStats
+from .notifier import Notifier
+from .policy import make_policy
+from .pool_publisher import PoolPublisher
 from .resource_pool import ResourcePool
-from .resource_pool import CurrentStatus
-from .resource_pool import InvalidRequestError
-from .priority_queue import PriorityQueue, QueueElement
+from .scheduler_core import SchedulerCore
+from .sharded_pool import ShardedResourcePool
+from .tracing import SamplingProfiler, make_sink, set_sink
+from . import journal
 
 
-class SimpleSchedulerNode(object):
+class SimpleSchedulerNode(SchedulerCore):
     """ Simple scheduler node.
 
     :param node_name: (str) Default name of scheduler node.
-    :param period: (:class:`rospy.Duration`) Rescheduling time quantum.
+    :param period: (:class:`rospy.Duration`) Default interval between
+        fallback rescheduling passes, unless the ``~reschedule_period``
+        parameter is set.
 
-    Derived versions of this class can implement different scheduling
-    policies.
+    Connects a :class:`.SchedulerCore` to ROS topics, parameters,
+    services and timers.
     """
     def __init__(self, node_name='simple_scheduler',
-                 period=rospy.Duration(1.0)):
+                 period=rospy.Duration(10.0)):
         """ Constructor. """
         rospy.init_node(node_name)
-        self.pool = ResourcePool()
-        self.pub_pool = rospy.Publisher('resource_pool', KnownResources,
-                                        queue_size=1, latch=True)
-        self.pub_pool.publish(self.pool.known_resources())
+        engine = rospy.get_param('~pool_engine', 'object')
+        if rospy.get_param('~pool_shards', False):
+            pool = ShardedResourcePool(engine=engine)
+        else:
+            pool = ResourcePool(engine=engine)
+        if rospy.get_param('~match_stats', False):
+            pool.stats = MatchStats()
+        fair_share = None
+        if rospy.get_param('~fair_share', False):
+            fair_share = dict(
+                (uuid.UUID(requester), float(weight)) for requester, weight
+                in rospy.get_param('~fair_share_weights', {}).items())
+        super(SimpleSchedulerNode, self).__init__(
+            pool, preemption=rospy.get_param('~preemption', False),
+            batch_window=rospy.get_param('~batch_window', 0.0),
+            dispatch_mode=rospy.get_param('~dispatch_mode', 'strict'),
+            policy=make_policy(rospy.get_param('~policy', 'priority')),
+            fair_share=fair_share,
+            wait_timeout=rospy.get_param('~wait_timeout', 0.0))
+        self.period = rospy.Duration(
+            rospy.get_param('~reschedule_period', period.to_sec()))
+        """ Duration between fallback rescheduling passes. """
+        self.notifier = Notifier(self.send_feedback)
+        """ :class:`.Notifier` thread delivering requester feedback. """
+        rospy.on_shutdown(self.notifier.shutdown)
+        self.profiler = None
+        """ Active :class:`.SamplingProfiler`, or ``None``. """
+        journal_path = rospy.get_param('~journal_path', '')
+        if journal_path:
+            self.journal = journal.Journal(
+                journal_path, rospy.get_param('~journal_checkpoint', 1000))
+            self.restore()
+            self.reclaim_timer = rospy.Timer(
+                rospy.Duration(rospy.get_param('~journal_reclaim_timeout',
+                                               30.0)),
+                self.drop_restored, oneshot=True)
+        record_path = rospy.get_param('~record_path', '')
+        if record_path:
+            self.recorder = Recorder(record_path)
+        if rospy.get_param('~trace_sink', ''):
+            self.start_tracing(None)
+        rospy.on_shutdown(self.shutdown)
+        rospy.Service('~start_profiling', Empty, self.start_profiling)
+        rospy.Service('~start_tracing', Empty, self.start_tracing)
+        rospy.Service('~stop_profiling', Empty, self.stop_profiling)
+        rospy.Service('~stop_tracing', Empty, self.stop_tracing)
+        lock = threading.RLock()        # the Big Scheduler Lock
+        self.lock_monitor = None
+        """ :class:`.MonitoredLock` wrapping the Big Scheduler Lock,
+        or ``None``. """
+        if rospy.get_param('~lock_monitor', False):
+            lock = self.lock_monitor = MonitoredLock(
+                lock, rospy.get_param('~lock_hold_warning', 0.1))
+        self.pool_publisher = PoolPublisher(
+            self.pool, lock, rospy.get_param('~pool_publish_interval', 0.5))
+        """ :class:`.PoolPublisher` for the ``resource_pool`` topic. """
         self.sub_client = rospy.Subscriber('concert_client_changes',
                                            ConcertClients, self.track_clients,
                                            queue_size=1, tcp_nodelay=True)
-        self.ready_queue = PriorityQueue()
-        """ Queue of waiting requests. """
-        self.blocked_queue = PriorityQueue()
-        """ Queue of blocked requests. """
-        self.period = period
-        """ Duration between periodic rescheduling. """
-        self.notification_set = set()
-        """ Set of requester identifiers to notify. """
         self.timer = rospy.Timer(self.period, self.reschedule)
+        metrics_period = rospy.get_param('~metrics_period', 10.0)
+        if metrics_period > 0.0:
+            self.metrics_pub = rospy.Publisher('scheduler_metrics',
+                                               DiagnosticArray, queue_size=1)
+            self.metrics_timer = rospy.Timer(rospy.Duration(metrics_period),
+                                             self.publish_metrics)
 
         try:
             topic_name = rospy.get_param('~topic_name')
-            self.sch = Scheduler(self.callback, topic=topic_name)
+            self.sch = Scheduler(self.callback, topic=topic_name,
+                                 lock=lock)
         except KeyError:
-            self.sch = Scheduler(self.callback)  # use the default
+            self.sch = Scheduler(self.callback, lock=lock)  # default topic
 
         rospy.spin()
 
-    def callback(self, rset):
-        """ Scheduler request callback.
+    def metrics_sample(self):
+        """ Take a sample of the scheduler metrics.
 
-        Called in the scheduler callback thread holding the Big
-        Scheduler Lock.
+        :returns: :class:`dict` of metric values, by name, see
+            :meth:`.SchedulerMetrics.sample`, including
+            :meth:`.MonitoredLock.summary` values if the lock is
+            monitored.
 
-        See: :class:`.rocon_scheduler_requests.Scheduler` documentation.
+        Acquires the Big Scheduler Lock.
         """
-        rospy.logdebug('scheduler callback:')
-        for rq in rset.values():
-            rospy.logdebug('  ' + str(rq))
-            if rq.msg.status == Request.NEW:
-                self.queue(rq, rset.requester_id)
-            elif rq.msg.status == Request.CANCELING:
-                self.free(rq, rset.requester_id)
-        self.dispatch()                 # try to allocate ready requests
-
-    def dispatch(self):
-        """ Grant any available resources to ready requests.
-
-        Notifies all affected requesters.
-        """
-        while len(self.ready_queue) > 0:
-            # Try to allocate top element in the ready queue.
-            elem = self.ready_queue.pop()
-            resources = []
-            try:
-                resources = self.pool.allocate(elem.request)
-            except InvalidRequestError as ex:
-                self.reject_request(elem, ex)
-                continue                # skip to next queue element
+        with self.sch.lock:
+            values = super(SimpleSchedulerNode, self).metrics_sample()
+            if self.lock_monitor is not None:
+                values.update(self.lock_monitor.summary())
+            return values
 
-            if not resources:           # top request cannot be satisfied?
-                # Return it to head of queue.
-                self.ready_queue.add(elem)
-                break                   # stop looking
+    def notify_requesters(self):
+        """ Notify affected requesters.
 
-            try:
-                elem.request.grant(resources)
-                rospy.loginfo(
-                    'Request granted: ' + str(elem.request.uuid))
-            except TransitionError:     # request no longer active?
-                # Return allocated resources to the pool.
-                self.pool.release_resources(resources)
-            self.notification_set.add(elem.requester_id)
+        :pre: self.notification_set contains requesters to notify.
+        :post: self.notification_set is empty.
 
-        # notify all affected requesters
-        self.notify_requesters()
+        The feedback is sent later by the notifier thread, so
+        publishing does not extend the caller's critical section.
+        """
+        self.notifier.notify(self.notification_set)
+        self.notification_set.clear()
 
-        # update resource_pool topic, if anything changed
-        if self.pool.changed:
-            self.pub_pool.publish(self.pool.known_resources())
+    def pool_updated(self):
+        """ Update the ``resource_pool`` topic, if anything changed. """
+        self.pool_publisher.update()
 
-    def free(self, request, requester_id):
-        """ Free all resources allocated for this *request*.
+    def publish_metrics(self, event):
+        """ Publish a metrics sample on the ``scheduler_metrics`` topic.
 
-        :param request: (:class:`.ActiveRequest`)
-        :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+        :param event: :class:`rospy.TimerEvent` for the metrics timer.
+
+        The message is published after releasing the lock.
         """
-        self.pool.release_request(request)
-        rospy.loginfo('Request canceled: ' + str(request.uuid))
-        request.close()
-        # remove request from any queues
-        request_id = request.uuid
-        for queue in [self.ready_queue, self.blocked_queue]:
-            if request_id in queue:
-                queue.remove(request_id)
-                break                   # should not be in any other queue
-        self.notification_set.add(requester_id)
+        values = self.metrics_sample()
+        self.metrics_pub.publish(
+            self.metrics.to_msg(values, stamp=rospy.Time.now()))
 
-    def notify_requesters(self):
-        """ Notify affected requesters.
+    def send_feedback(self, requester_id):
+        """ Send feedback to one requester.
 
-        :pre: self.notification_set contains requesters to notify.
-        :post: self.notification_set is empty.
+        :param requester_id: (:class:`uuid.UUID`) Unique requester identifier.
+
+        Called in the notifier thread.  The Big Scheduler Lock is held
+        while :meth:`rocon_scheduler_requests.Scheduler.notify`
+        publishes the feedback, but only for one requester at a time,
+        so request callbacks wait for at most one message, instead of
+        one for every requester affected.  If the requester has gone
+        away, its requests are shut down instead.
         """
-        for requester_id in self.notification_set:
+        with self.sch.lock:
             try:
                 self.sch.notify(requester_id)
             except KeyError:            # requester now missing?
                 # shut down this requester
                 self.shutdown_requester(requester_id)
-        self.notification_set.clear()
-
-    def queue(self, request, requester_id):
-        """ Add *request* to ready queue, making it wait.
-
-        :param request: resource request to be queued.
-        :type request: :class:`.ActiveRequest`
-        :param requester_id: Unique requester identifier.
-        :type requester_id: :class:`uuid.UUID`
-        """
-        try:
-            request.wait(reason=Request.BUSY)
-        except TransitionError:         # request no longer active?
-            return
-        self.ready_queue.add(QueueElement(request, requester_id))
-        rospy.loginfo('Request queued: ' + str(request.uuid))
-        self.notification_set.add(requester_id)
-
-    def reject_request(self, element, exception):
-        """ Reject an invalid queue *element*.
-
-        :param element: Queue element to reject.
-        :type element: :class:`.QueueElement`
-        :param exception: Associated exception object.
+                self.notification_set.discard(requester_id)
+                self.dispatch()         # others may be granted now
+
+    def shutdown(self):
+        """ Node shutdown hook, writing any profile, trace or
+        capture, and logging the lock call sites held longest. """
+        self.stop_profiling(None)
+        self.stop_tracing(None)
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.lock_monitor is not None:
+            rospy.loginfo('Scheduler lock holders:\n'
+                          + self.lock_monitor.report())
+
+    def start_profiling(self, req):
+        """ Start a sampling profiler session.
+
+        :param req: ``std_srvs/Empty`` service request.
+
+        Does nothing if one is already running.
         """
-        rospy.logwarn(str(exception))
-        if hasattr(Request, "INVALID"):  # new reason code defined?
-            element.request.cancel(Request.INVALID)
-        else:
-            element.request.cancel(Request.UNAVAILABLE)
-        self.notification_set.add(element.requester_id)
+        if self.profiler is None:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+            rospy.loginfo('Profiling started')
+        return EmptyResponse()
 
-    def reschedule(self, event):
-        """ Periodic rescheduling thread.
+    def start_tracing(self, req):
+        """ Start tracing scheduler calls.
 
-        Moves requests that cannot be satisfied with
-        currently-available resources to the blocked queue.
+        :param req: ``std_srvs/Empty`` service request, or ``None``.
 
-        Uses the Big Scheduler Lock to serialize changes with
-        operations done within the scheduler callback thread.
+        Installs a new sink of the type named by the ``~trace_sink``
+        parameter, closing any previous one.
         """
-        with self.sch.lock:
-            while len(self.ready_queue) > 0:
-                # see if head of ready queue can be scheduled
-                elem = self.ready_queue.pop()
-
-                # see if all available or allocated resources would suffice
-                criteria = {CurrentStatus.AVAILABLE,
-                            CurrentStatus.ALLOCATED}
-                if self.pool.match_list(elem.request.msg.resources, criteria):
-                    # request not blocked
-                    self.ready_queue.add(elem)
-                    break               # done rescheduling
-
-                # move elem to blocked_queue
-                rospy.loginfo('Request blocked: '
-                              + str(elem.request.uuid))
-                elem.request.wait(reason=Request.UNAVAILABLE)
-                self.blocked_queue.add(elem)
-                self.notification_set.add(elem.requester_id)
-
-            # try to allocate any remaining ready requests
-            self.dispatch()
-
-    def shutdown_requester(self, requester_id):
-        """ Shut down this requester, recovering all resources assigned. """
-        for queue in [self.ready_queue, self.blocked_queue]:
-            for rq in queue:
-                if rq.requester_id == requester_id:
-                    self.free(rq, requester_id)
-
-    def track_clients(self, msg):
-        """ Concert clients message callback.
-
-        Updates the resource pool based on client changes published by
-        the concert conductor.
-
-        Uses the Big Scheduler Lock to serialize changes with
-        operations done within the scheduler callback thread.
+        sink = make_sink(rospy.get_param('~trace_sink', '') or 'chrome',
+                         rospy.get_param('~trace_path',
+                                         'scheduler_trace.json'))
+        previous = set_sink(sink)
+        if previous is not None:
+            previous.close()
+        rospy.loginfo('Tracing started: ' + type(sink).__name__)
+        return EmptyResponse()
+
+    def stop_profiling(self, req):
+        """ Stop the sampling profiler, if running, and write its
+        results to the file named by the ``~profile_path`` parameter.
+
+        :param req: ``std_srvs/Empty`` service request, or ``None``.
         """
-        with self.sch.lock:
-            self.pool.update(msg.clients)
+        profiler = self.profiler
+        if profiler is not None:
+            self.profiler = None
+            profiler.stop()
+            path = rospy.get_param('~profile_path',
+                                   'scheduler_profile.txt')
+            profiler.write(path)
+            rospy.loginfo('Profile written: ' + path)
+        return EmptyResponse()
+
+    def stop_tracing(self, req):
+        """ Stop tracing, closing the sink.
+
+        :param req: ``std_srvs/Empty`` service request, or ``None``.
+
+        A ``chrome`` sink writes its trace file when closed.
+        """
+        previous = set_sink(None)
+        if previous is not None:
+            previous.close()
+            rospy.loginfo('Tracing stopped')
+        return EmptyResponse()
 
 
 def main():
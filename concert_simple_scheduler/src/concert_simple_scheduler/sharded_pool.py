@@ -0,0 +1,483 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: sharded_pool
+
+This module provides a resource pool for the `Robotics in Concert`_
+(ROCON) scheduler that is partitioned into shards by the top-level
+namespace of each resource name, like ``rocon:/turtlebot`` or
+``rocon:/drone``.  Each shard has its own lock, so operations
+confined to one shard do not wait for operations on the others.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import threading
+
+from .resource_pool import CurrentStatus, KnownResources
+from .resource_pool import InvalidRequestError, PoolResource, ResourcePool
+from .resource_pool import request_signature, rocon_name
+
+ROCON_PREFIX = 'rocon:/'
+""" Prefix of every canonical ROCON resource name. """
+
+_METACHARS = set('.^$*+?{}[]\\|()')
+_QUANTIFIERS = set('*+?{')
+
+
+def rocon_namespace(uri):
+    """ Get the top-level namespace of a ROCON resource name.
+
+    :param uri: ROCON Uniform Resource Identifier.
+    :returns: (str) Namespace, like ``'turtlebot'`` for
+        ``'rocon:/turtlebot/roberto'``.
+    """
+    return rocon_name(uri)[len(ROCON_PREFIX):].split('/', 1)[0]
+
+
+def literal_prefix(pattern):
+    """ Get the literal prefix of a ROCON name pattern.
+
+    :param pattern: Canonical ROCON name, maybe a regular expression.
+    :returns: (str) Prefix that every name matching *pattern* must
+        start with, possibly empty.
+    """
+    if '|' in pattern:                  # alternatives anywhere?
+        return ''                       # do not try to analyze them
+    for i, char in enumerate(pattern):
+        if char in _METACHARS:
+            if char in _QUANTIFIERS:    # previous char is optional
+                i -= 1
+            return pattern[:i]
+    return pattern
+
+
+class ShardedResourcePool(object):
+    """
+    This class manages a pool of :class:`.PoolResource` objects known
+    to the scheduler, partitioned into shards by namespace.
+
+    :param msg: An optional ``scheduler_msgs/KnownResources`` or
+        ``scheduler_msgs/Request`` message or a list of
+        ``CurrentStatus`` or ``Resource`` messages, like the
+        ``resources`` component of one of those messages.
+    :param engine: (str) Storage engine for each shard, see
+        :class:`.ResourcePool`.
+
+    It provides the same interface as :class:`.ResourcePool`, but all
+    methods are thread-safe.  Each shard is a separate
+    :class:`.ResourcePool` with its own :class:`threading.RLock`.
+    Requests whose resource names all fall within one namespace only
+    lock that shard.  Requests that may span namespaces, like
+    ``rocon:/.*/roberto``, lock every shard they could match, always
+    in sorted namespace order to prevent deadlocks.
+
+    The :class:`.SchedulerCore` still allocates and releases resources
+    holding its Big Scheduler Lock, so those are not concurrent with
+    each other.  Only concert client updates avoid that lock, and
+    then just wait for the shards they change.
+
+    """
+    def __init__(self, msg=None, engine=None):
+        """ Constructor. """
+        self.engine = engine
+        """ Storage engine for each shard. """
+        self.thread_safe = True
+        """ Always true: the pool methods do their own locking. """
+        self.shards = {}
+        """ Dictionary of :class:`.ResourcePool` shards, indexed by
+        namespace. """
+        self.locks = {}
+        """ Dictionary of shard locks, indexed by namespace. """
+        self._registry_lock = threading.Lock()
+        self._feasible = {}
+        self._feasible_generation = 0
+        self._stats = None
+        if msg is not None:
+            if hasattr(msg, 'resources'):
+                msg = msg.resources
+            for res in msg:
+                pool_res = PoolResource(res)
+                self._shard(rocon_namespace(pool_res.uri))._insert(pool_res)
+
+    def __contains__(self, uri):
+        shard = self.shards.get(rocon_namespace(uri))
+        return shard is not None and uri in shard
+
+    def __getitem__(self, uri):
+        shard = self.shards.get(rocon_namespace(uri))
+        if shard is None:
+            raise KeyError(uri)
+        return shard[uri]
+
+    def __len__(self):
+        return sum(len(shard) for shard in list(self.shards.values()))
+
+    def __str__(self):
+        s = 'pool contents:'
+        for key in sorted(self.shards):
+            for resource in self.shards[key].pool.values():
+                s += '\n  ' + str(resource)
+        return s
+
+    @property
+    def changed(self):
+        """ True, if any shard has changed since the previous
+        known_resources() call. """
+        return any(shard.changed for shard in list(self.shards.values()))
+
+    @property
+    def generation(self):
+        """ Membership generation, which changes whenever resources
+        are added to any shard or go missing. """
+        return sum(shard.generation for shard in list(self.shards.values()))
+
+    @property
+    def stats(self):
+        """ :class:`.MatchStats` counters shared by all shards, or
+        ``None`` (the default) to disable them. """
+        return self._stats
+
+    @stats.setter
+    def stats(self, value):
+        with self._registry_lock:
+            self._stats = value
+            for shard in self.shards.values():
+                shard.stats = value
+
+    def _shard(self, key):
+        """ :returns: :class:`.ResourcePool` shard for namespace *key*,
+        creating it if necessary. """
+        shard = self.shards.get(key)
+        if shard is None:
+            with self._registry_lock:
+                shard = self.shards.get(key)
+                if shard is None:       # still not there?
+                    self.locks[key] = threading.RLock()
+                    shard = ResourcePool(engine=self.engine)
+                    shard.stats = self._stats
+                    self.shards[key] = shard
+        return shard
+
+    def _lock_shards(self, keys):
+        """ Acquire the locks for all shards in *keys*, in sorted order.
+
+        :returns: sorted list of the namespaces locked.
+        """
+        keys = sorted(keys)
+        for key in keys:
+            self.locks[key].acquire()
+        return keys
+
+    def _unlock_shards(self, keys):
+        """ Release the locks for all shards in *keys*. """
+        for key in reversed(keys):
+            self.locks[key].release()
+
+    def shard_keys(self, resources):
+        """ Determine which shards some requested *resources* could use.
+
+        :param resources: List of ``scheduler_msgs/Resource`` messages,
+            which may include regular expression syntax.
+        :returns: :class:`set` of shard namespaces.
+        """
+        keys = set()
+        all_keys = list(self.shards.keys())
+        for res in resources:
+            prefix = literal_prefix(rocon_name(res.uri))
+            for key in all_keys:
+                namespace = ROCON_PREFIX + key + '/'
+                if (namespace.startswith(prefix)
+                        or prefix.startswith(namespace)):
+                    keys.add(key)
+        return keys
+
+    def _merged(self, keys):
+        """ :returns: temporary :class:`.ResourcePool` sharing the
+        resources of all shards in *keys*, copy-on-write, so changing
+        it never affects the shards.
+
+        :pre: the corresponding shard locks are held.
+        """
+        merged = ResourcePool()
+        merged.stats = self._stats
+        for key in keys:
+            shard = self.shards[key]
+            merged.pool.update(shard.pool)
+            for owner, names in shard.owned.items():
+                merged.owned.setdefault(owner, set()).update(names)
+            for priority, names in shard.by_priority.items():
+                merged.by_priority.setdefault(priority, set()).update(names)
+        merged._shared = True
+        return merged
+
+    def allocate(self, request, exclude=None, select=None):
+        """ Try to allocate all resources for a *request*.
+
+        :param request: Scheduler request object, some resources may
+            include regular expression syntax.
+        :type request: :class:`.ActiveRequest`
+        :param exclude: Optional :class:`set` of resource names that
+            must not be allocated.
+        :param select: Optional preference function, see
+            :meth:`.ResourcePool.allocate`.
+
+        :returns: List of ``scheduler_msgs/Resource`` messages
+            allocated, in requested order with platform info fully
+            resolved; or ``[]`` if not everything is available.
+
+        :raises: :exc:`.InvalidRequestError` if the request is not valid.
+        """
+        if len(request.msg.resources) == 0:
+            raise InvalidRequestError('No resources requested.')
+        keys = self._lock_shards(self.shard_keys(request.msg.resources))
+        try:
+            if len(keys) == 0:          # no matching shards?
+                return []
+            elif len(keys) == 1:        # confined to one shard?
+                return self.shards[keys[0]].allocate(request, exclude,
+                                                     select)
+            alloc = self._merged(keys).allocate(request, exclude, select)
+            for res in alloc:           # each shard commits its part
+                shard = self.shards[rocon_namespace(res.uri)]
+                shard._writable(res.uri).allocate(request)
+                shard._index_owner(res.uri, request.uuid,
+                                   request.msg.priority)
+                shard.changed = True
+            return alloc
+        finally:
+            self._unlock_shards(keys)
+
+    def feasible(self, resources, signature=None):
+        """ Could some requested *resources* ever be satisfied by the
+        current pool members?
+
+        See :meth:`.ResourcePool.feasible`.
+        """
+        generation = self.generation
+        if self._feasible_generation != generation:
+            self._feasible = {}         # membership changed
+            self._feasible_generation = generation
+        if signature is None:
+            signature = request_signature(resources)
+        result = self._feasible.get(signature)
+        if result is None:
+            result = bool(self.match_list(resources,
+                                          {CurrentStatus.AVAILABLE,
+                                           CurrentStatus.ALLOCATED}))
+            self._feasible[signature] = result
+            if self._stats is not None:
+                self._stats.cache_misses += 1
+        elif self._stats is not None:
+            self._stats.cache_hits += 1
+        return result
+
+    def get(self, resource_name, default=None):
+        """ Get named pool resource, if known.
+
+        :param resource_name: Name of desired resource.
+        :type resource_name: str
+        :param default: value to return if no such resource.
+        :returns: named :class:`.PoolResource` if successful, else *default*.
+        """
+        shard = self.shards.get(rocon_namespace(resource_name))
+        if shard is None:
+            return default
+        return shard.get(resource_name, default)
+
+    def known_resources(self):
+        """ Convert resource pool to ``scheduler_msgs/KnownResources``. """
+        msg = KnownResources()
+        keys = self._lock_shards(self.shards.keys())
+        try:
+            for key in keys:
+                msg.resources.extend(
+                    self.shards[key].known_resources().resources)
+        finally:
+            self._unlock_shards(keys)
+        return msg
+
+    def match_list(self, resources, criteria):
+        """
+        Make a list containing sets of the available resources
+        matching each item in *resources*.
+
+        :param resources: List of Resource messages to match.
+        :param criteria: :class:`set` of resource status values allowed.
+
+        :returns: List of :class:`set` containing names of matching
+            resources, empty if any item cannot be satisfied, or there
+            are not enough resources, or the original *resources* list
+            was empty.
+        """
+        keys = self._lock_shards(self.shard_keys(resources))
+        try:
+            if len(keys) == 1:
+                return self.shards[keys[0]].match_list(resources, criteria)
+            return self._merged(keys).match_list(resources, criteria)
+        finally:
+            self._unlock_shards(keys)
+
+    def membership(self):
+        """ Copy the pool membership, so :meth:`feasible` can be
+        analyzed without holding any locks.
+
+        :returns: New :class:`.ShardedResourcePool` containing the
+            membership of each shard, see
+            :meth:`.ResourcePool.membership`.
+        """
+        members = ShardedResourcePool(engine=self.engine)
+        members._stats = self._stats
+        members._feasible = dict(self._feasible)
+        members._feasible_generation = self._feasible_generation
+        for key in list(self.shards.keys()):
+            with self.locks[key]:
+                members.shards[key] = self.shards[key].membership()
+            members.locks[key] = threading.RLock()
+        return members
+
+    def merge_feasible(self, snap):
+        """ Keep :meth:`feasible` results computed on a snapshot.
+
+        See :meth:`.ResourcePool.merge_feasible`.
+        """
+        generation = self.generation
+        if (snap.generation == generation
+                and snap._feasible_generation == generation):
+            if self._feasible_generation != generation:
+                self._feasible = {}     # membership changed
+                self._feasible_generation = generation
+            self._feasible.update(snap._feasible)
+
+    def preemption_victims(self, request, preempting=()):
+        """ Find the cheapest set of lower-priority requests to
+        preempt, so this *request* can be satisfied.
+
+        See :meth:`.ResourcePool.preemption_victims`.
+        """
+        keys = self._lock_shards(self.shard_keys(request.msg.resources))
+        try:
+            if len(keys) == 1:
+                return self.shards[keys[0]].preemption_victims(
+                    request, preempting)
+            return self._merged(keys).preemption_victims(request, preempting)
+        finally:
+            self._unlock_shards(keys)
+
+    def release_request(self, request):
+        """ Release all the resources owned by this *request*.
+
+        :param request: Current owner of resources to release.
+        :type request: :class:`.ActiveRequest`
+
+        Only appropriate when this *request* is being closed.
+        """
+        rq_id = request.uuid
+        for res in request.allocations:
+            key = rocon_namespace(res.uri)
+            with self.locks[key]:
+                self.shards[key]._release(res.uri, rq_id)
+
+    def release_resources(self, resources):
+        """ Release a list of *resources*.
+
+        :param resources: List of ``scheduler_msgs/Resource`` messages.
+        """
+        for res in resources:
+            key = rocon_namespace(res.uri)
+            with self.locks[key]:
+                self.shards[key]._release(res.uri)
+
+    def restore_allocation(self, resource, owner, priority):
+        """ Restore a previously-saved resource allocation.
+
+        See :meth:`.ResourcePool.restore_allocation`.
+        """
+        key = rocon_namespace(resource.uri)
+        shard = self._shard(key)
+        with self.locks[key]:
+            return shard.restore_allocation(resource, owner, priority)
+
+    def snapshot(self):
+        """ Make a copy-on-write snapshot of this pool.
+
+        :returns: New :class:`.ShardedResourcePool` containing a
+            snapshot of each shard, see :meth:`.ResourcePool.snapshot`.
+        """
+        snap = ShardedResourcePool(engine=self.engine)
+        snap._stats = self._stats
+        snap._feasible = dict(self._feasible)
+        snap._feasible_generation = self._feasible_generation
+        keys = self._lock_shards(list(self.shards.keys()))
+        try:
+            for key in keys:
+                snap.shards[key] = self.shards[key].snapshot()
+                snap.locks[key] = threading.RLock()
+        finally:
+            self._unlock_shards(keys)
+        return snap
+
+    def status_counts(self):
+        """ :returns: :class:`dict` of the number of pool resources
+            in each ``CurrentStatus`` value. """
+        counts = dict.fromkeys([CurrentStatus.AVAILABLE,
+                                CurrentStatus.ALLOCATED,
+                                CurrentStatus.MISSING], 0)
+        for key in list(self.shards.keys()):
+            with self.locks[key]:
+                shard_counts = self.shards[key].status_counts()
+            for status, count in shard_counts.items():
+                counts[status] += count
+        return counts
+
+    def update(self, client_list):
+        """ Update resource pool from a new concert clients list.
+
+        :param client_list: current list of ``ConcertClient`` messages.
+        :returns: List of the names of resources added or restored.
+
+        Each shard is locked only while its own clients are updated.
+        """
+        appeared = []
+        by_shard = {}
+        for client in client_list:
+            key = rocon_namespace(client.platform_info.uri)
+            by_shard.setdefault(key, []).append(client)
+            self._shard(key)
+        for key in list(self.shards.keys()):
+            with self.locks[key]:
+                appeared.extend(self.shards[key].update(by_shard.get(key,
+                                                                     [])))
+        return appeared
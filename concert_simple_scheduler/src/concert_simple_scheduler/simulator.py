@@ -0,0 +1,419 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: simulator
+
+This module provides a discrete-event simulator for the `Robotics in
+Concert`_ (ROCON) scheduler policy.
+
+A :class:`.Simulator` drives a :class:`.SchedulerCore` through a
+:class:`.LocalScheduler` with synthetic request arrivals,
+cancellations and client churn, on a virtual clock.  No ROS master
+is needed, so throughput and latency can be measured offline over
+millions of events.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import heapq
+import itertools
+import json
+import random
+import uuid
+
+import unique_id
+from genpy import Duration, Time
+from concert_msgs.msg import ConcertClient, ConcertClients
+from rocon_app_manager_msgs.msg import App
+from rocon_scheduler_requests.transitions import ActiveRequest
+from rocon_std_msgs.msg import PlatformInfo
+from scheduler_msgs.msg import Request, Resource
+
+from .match_stats import clock
+from .metrics import BOUNDS, Histogram
+from .policy import POLICIES, make_policy
+from .scheduler_core import LocalScheduler, SchedulerCore
+
+ARRIVE = 0
+""" Event: a new request arrives. """
+RELEASE = 1
+""" Event: a granted request is canceled by its requester. """
+ABANDON = 2
+""" Event: a waiting request is canceled by its requester. """
+CHURN = 3
+""" Event: a client goes missing or comes back. """
+RESCHEDULE = 4
+""" Event: fallback rescheduling timer. """
+CALL = 5
+""" Event: a function the scheduler core asked to call later. """
+
+LATENCY_BOUNDS = BOUNDS + (120.0, 300.0, 600.0, 1800.0, 3600.0)
+""" Bucket upper bounds for virtual request latencies, in seconds. """
+
+
+class Simulator(object):
+    """ Discrete-event scheduler simulator.
+
+    :param core: :class:`.SchedulerCore` to drive, or ``None`` for a
+        new one with an empty :class:`.ResourcePool`.
+    :param clients: (int) Number of concert clients.
+    :param namespaces: Sequence of top-level namespaces the clients
+        are spread across, like ``'turtlebot'``.
+    :param rapp: (str) Rapp advertised by every client and requested
+        by every request.
+    :param requesters: (int) Number of requesters.
+    :param arrival_rate: (float) Mean request arrivals per second.
+    :param hold_time: (float) Mean seconds each request holds its
+        resources once granted.
+    :param patience: (float) Mean seconds a request waits before its
+        requester gives up and cancels it, or zero to wait forever.
+    :param max_resources: (int) Maximum resources per request.  Each
+        request wants from one to this many, uniformly distributed.
+    :param priorities: (int) Number of request priority levels.
+    :param churn_rate: (float) Mean client arrivals and departures
+        per second.
+    :param reschedule_period: (float) Seconds between fallback
+        rescheduling passes, or zero for none.
+    :param seed: Random number generator seed.
+
+    Times are virtual seconds, except the ``wall_time`` and the
+    ``core_`` metrics in the :meth:`results`.  Inter-arrival, holding
+    and patience times are exponentially distributed.  Each request
+    states its true holding time as its ``hold_time``, and the time
+    its requester will give up as its ``availability``, for policies
+    that use them.  The *core* gets the virtual clock and event
+    queue too, so its wait deadlines and batch windows run in virtual
+    time.
+    """
+    def __init__(self, core=None, clients=100,
+                 namespaces=('turtlebot', 'drone'), rapp='rocon_apps/teleop',
+                 requesters=10, arrival_rate=10.0, hold_time=5.0,
+                 patience=0.0, max_resources=1, priorities=1,
+                 churn_rate=0.0, reschedule_period=10.0, seed=0):
+        """ Constructor. """
+        if core is None:
+            core = SchedulerCore()
+        self.core = core
+        """ :class:`.SchedulerCore` being simulated. """
+        self.sch = LocalScheduler(core.callback, self.feedback)
+        """ :class:`.LocalScheduler` delivering the requests. """
+        core.sch = self.sch
+        core.clock = self.clock
+        core.call_later = self.call_later
+        self.random = random.Random(seed)
+        """ Random number generator. """
+        self.namespaces = list(namespaces)
+        self.rapp = rapp
+        self.arrival_rate = arrival_rate
+        self.hold_time = hold_time
+        self.patience = patience
+        self.max_resources = max_resources
+        self.priorities = priorities
+        self.churn_rate = churn_rate
+        self.reschedule_period = reschedule_period
+        self.requester_ids = [self.make_uuid() for i in range(requesters)]
+        """ Identifiers of all simulated requesters. """
+        self.clients = [
+            ConcertClient(name='c' + str(i),
+                          platform_info=PlatformInfo(uri='rocon:/' + ns
+                                                     + '/c' + str(i)),
+                          apps=[App(name=rapp)])
+            for i, ns in zip(range(clients),
+                             itertools.cycle(self.namespaces))]
+        """ List of all simulated ``ConcertClient`` messages. """
+        self.present = [True] * clients
+        """ True for each client currently present. """
+        self.now = 0.0
+        """ Current virtual time, in seconds. """
+        self.counters = dict.fromkeys(['events', 'arrivals', 'grants',
+                                       'releases', 'abandons', 'dropped',
+                                       'preemptions', 'churn',
+                                       'reschedules'], 0)
+        """ Number of simulated events of each kind. """
+        self.latency = Histogram(LATENCY_BOUNDS)
+        """ :class:`.Histogram` of virtual seconds from arrival to
+        grant. """
+        self.wall_time = 0.0
+        """ Wall clock seconds spent running the simulation. """
+        self.waiting = {}               # arrival info by request UUID
+        self.holding = {}               # requester by request UUID
+        self.preempted = set()          # UUIDs already being released
+        self._by_requester = dict((rid, set())
+                                  for rid in self.requester_ids)
+        self._events = []
+        self._sequence = itertools.count()
+        core.track_clients(ConcertClients(clients=self.clients))
+        self.schedule(self.interval(self.arrival_rate), ARRIVE)
+        if self.churn_rate > 0.0:
+            self.schedule(self.interval(self.churn_rate), CHURN)
+        if self.reschedule_period > 0.0:
+            self.schedule(self.reschedule_period, RESCHEDULE)
+
+    def abandon(self, request_id):
+        """ Cancel a request still waiting, as its requester would. """
+        waiting = self.waiting.pop(request_id, None)
+        if waiting is None:             # already granted?
+            return
+        request, requester_id, arrival, hold = waiting
+        self._by_requester[requester_id].discard(request_id)
+        self.counters['abandons'] += 1
+        request.cancel()
+        self.sch.submit(requester_id, [request])
+
+    def arrive(self):
+        """ Submit a new request from a random requester. """
+        self.schedule(self.interval(self.arrival_rate), ARRIVE)
+        ns = self.random.choice(self.namespaces)
+        n_wanted = self.random.randint(1, self.max_resources)
+        hold = self.interval(1.0 / self.hold_time)
+        msg = Request(id=unique_id.toMsg(self.make_uuid()),
+                      priority=self.random.randrange(self.priorities),
+                      resources=[Resource(rapp=self.rapp, uri='rocon:/' + ns)
+                                 for i in range(n_wanted)],
+                      hold_time=Duration.from_sec(hold))
+        request = ActiveRequest(msg)
+        requester_id = self.random.choice(self.requester_ids)
+        self.waiting[request.uuid] = (request, requester_id, self.now, hold)
+        self._by_requester[requester_id].add(request.uuid)
+        self.counters['arrivals'] += 1
+        if self.patience > 0.0:
+            wait = self.interval(1.0 / self.patience)
+            msg.availability = Time.from_sec(self.now + wait)
+            self.schedule(wait, ABANDON, request.uuid)
+        self.sch.submit(requester_id, [request])
+
+    def churn(self):
+        """ Make a random client go missing or come back. """
+        self.schedule(self.interval(self.churn_rate), CHURN)
+        i = self.random.randrange(len(self.clients))
+        self.present[i] = not self.present[i]
+        self.counters['churn'] += 1
+        self.core.track_clients(ConcertClients(
+            clients=[client for client, present
+                     in zip(self.clients, self.present) if present]))
+
+    def call_later(self, delay, function):
+        """ Call a *function* after *delay* virtual seconds, for the
+        core's batch windows. """
+        self.schedule(delay, CALL, function)
+
+    def clock(self):
+        """ :returns: current virtual time, for the core's wait
+            deadlines. """
+        return self.now
+
+    def feedback(self, requester_id):
+        """ Requester feedback callback from the :class:`.LocalScheduler`.
+
+        :param requester_id: Identifier of the requester notified.
+
+        Notes any of its requests that were just granted, or canceled
+        by the scheduler, and releases any being preempted.
+        """
+        core = self.core
+        granted = core.granted
+        for request_id in list(self._by_requester[requester_id]):
+            if (request_id not in granted
+                    and request_id not in core.ready_queue
+                    and request_id not in core.blocked_queue):
+                self.waiting.pop(request_id)  # canceled by the scheduler
+                self._by_requester[requester_id].discard(request_id)
+                self.counters['dropped'] += 1
+            elif request_id in granted:
+                request, requester_id, arrival, hold = self.waiting.pop(
+                    request_id)
+                self._by_requester[requester_id].discard(request_id)
+                self.latency.add(self.now - arrival)
+                self.counters['grants'] += 1
+                self.holding[request_id] = requester_id
+                self.schedule(hold, RELEASE, request_id)
+        if self.core.preempting:
+            for request_id in self.core.preempting - self.preempted:
+                if request_id in self.holding:
+                    self.preempted.add(request_id)
+                    self.counters['preemptions'] += 1
+                    self.schedule(0.0, RELEASE, request_id)
+
+    def interval(self, rate):
+        """ :returns: random exponential interval for a mean *rate*. """
+        return self.random.expovariate(rate)
+
+    def make_uuid(self):
+        """ :returns: new :class:`uuid.UUID`, reproducible from the
+            simulation seed. """
+        return uuid.UUID(int=self.random.getrandbits(128), version=4)
+
+    def release(self, request_id):
+        """ Cancel a granted request, as its requester would. """
+        requester_id = self.holding.pop(request_id, None)
+        if requester_id is None:        # already released?
+            return
+        self.preempted.discard(request_id)
+        elem = self.core.granted.get(request_id)
+        if elem is None:                # freed by the scheduler?
+            return
+        self.counters['releases'] += 1
+        elem.request.cancel()
+        self.sch.submit(requester_id, [elem.request])
+
+    def results(self):
+        """ :returns: :class:`dict` of simulation results, by name.
+
+        Event counts and rates, virtual grant throughput and latency
+        summaries, plus the scheduler core's own wall-clock metrics,
+        prefixed with ``core_``.
+        """
+        values = dict(self.counters)
+        values['virtual_time'] = self.now
+        values['wall_time'] = self.wall_time
+        values['events_per_second'] = 0.0
+        if self.wall_time > 0.0:
+            values['events_per_second'] = (self.counters['events']
+                                           / self.wall_time)
+        values['grants_per_virtual_second'] = 0.0
+        if self.now > 0.0:
+            values['grants_per_virtual_second'] = (self.counters['grants']
+                                                   / self.now)
+        values['waiting'] = len(self.waiting)
+        values['holding'] = len(self.holding)
+        for key, value in self.latency.as_dict().items():
+            values['latency_' + key] = value
+        for key, value in self.core.metrics_sample().items():
+            values['core_' + key] = value
+        return values
+
+    def reschedule(self):
+        """ Run a fallback rescheduling pass. """
+        self.schedule(self.reschedule_period, RESCHEDULE)
+        self.counters['reschedules'] += 1
+        self.core.reschedule(None)
+
+    def run(self, duration=None, max_events=None):
+        """ Run the simulation.
+
+        :param duration: (float) Virtual seconds to simulate, or
+            ``None`` for no limit.
+        :param max_events: (int) Maximum number of events to process,
+            or ``None`` for no limit.
+        :returns: :class:`dict` of :meth:`results`.
+
+        At least one limit should be given.  The simulation may be
+        continued by calling this again.
+        """
+        handlers = {ARRIVE: lambda arg: self.arrive(),
+                    RELEASE: self.release,
+                    ABANDON: self.abandon,
+                    CHURN: lambda arg: self.churn(),
+                    RESCHEDULE: lambda arg: self.reschedule(),
+                    CALL: lambda function: function()}
+        end_time = None
+        if duration is not None:
+            end_time = self.now + duration
+        events = 0
+        start = clock()
+        while self._events and (max_events is None or events < max_events):
+            if end_time is not None and self._events[0][0] > end_time:
+                self.now = end_time
+                break
+            self.now, seq, kind, arg = heapq.heappop(self._events)
+            handlers[kind](arg)
+            events += 1
+        self.wall_time += clock() - start
+        self.counters['events'] += events
+        return self.results()
+
+    def schedule(self, delay, kind, arg=None):
+        """ Schedule an event.
+
+        :param delay: (float) Virtual seconds from now.
+        :param kind: Event kind, like :const:`.ARRIVE`.
+        :param arg: Event argument, usually a request UUID.
+        """
+        heapq.heappush(self._events,
+                       (self.now + delay, next(self._sequence), kind, arg))
+
+
+def main(argv=None):
+    """ Simulator command line entry point.
+
+    Runs one simulation and prints its :meth:`Simulator.results` as
+    JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description='Simulate the ROCON scheduler, without ROS.')
+    parser.add_argument('--events', type=int, default=100000,
+                        help='number of events to simulate')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='virtual seconds to simulate')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--requesters', type=int, default=10)
+    parser.add_argument('--arrival-rate', type=float, default=10.0)
+    parser.add_argument('--batch-window', type=float, default=0.0,
+                        help='seconds to gather requests before dispatch')
+    parser.add_argument('--hold-time', type=float, default=5.0)
+    parser.add_argument('--patience', type=float, default=0.0)
+    parser.add_argument('--max-resources', type=int, default=1)
+    parser.add_argument('--priorities', type=int, default=1)
+    parser.add_argument('--churn-rate', type=float, default=0.0)
+    parser.add_argument('--reschedule-period', type=float, default=10.0)
+    parser.add_argument('--dispatch-mode', default='strict',
+                        choices=['strict', 'backfill'])
+    parser.add_argument('--fair-share', action='store_true',
+                        help='share resources fairly among requesters')
+    parser.add_argument('--preemption', action='store_true')
+    parser.add_argument('--policy', default='priority',
+                        choices=sorted(POLICIES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--wait-timeout', type=float, default=0.0,
+                        help='seconds before waiting requests expire')
+    args = parser.parse_args(argv)
+    core = SchedulerCore(preemption=args.preemption,
+                         dispatch_mode=args.dispatch_mode,
+                         policy=make_policy(args.policy),
+                         fair_share={} if args.fair_share else None,
+                         wait_timeout=args.wait_timeout,
+                         batch_window=args.batch_window)
+    sim = Simulator(core, clients=args.clients,
+                    requesters=args.requesters,
+                    arrival_rate=args.arrival_rate,
+                    hold_time=args.hold_time, patience=args.patience,
+                    max_resources=args.max_resources,
+                    priorities=args.priorities,
+                    churn_rate=args.churn_rate,
+                    reschedule_period=args.reschedule_period,
+                    seed=args.seed)
+    results = sim.run(duration=args.duration, max_events=args.events)
+    print(json.dumps(results, indent=2, sort_keys=True))
@@ -0,0 +1,231 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+.. module:: timer_wheel
+
+This module provides a hierarchical timer wheel, used to expire
+`Robotics in Concert`_ (ROCON) scheduler requests that have waited
+too long.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import math
+
+
+class TimerWheel(object):
+    """ Hierarchical timer wheel of deadlines.
+
+    :param resolution: (float) Seconds per tick.  Deadlines expire
+        up to one tick late, but never early.
+    :param slots: (int) Slots per level.
+    :param levels: (int) Number of levels.
+    :param start: (float) Current time, in seconds.
+
+    Each key has at most one deadline.  Level zero has one slot per
+    tick.  Each higher level has one slot per turn of the level
+    below, and its entries cascade down to lower levels as their
+    turn comes up.  Deadlines beyond the last level wait in an
+    overflow list, reconsidered each time the last level turns.
+
+    Adding a key is O(1).  Removing a key just forgets its deadline,
+    which is also O(1); the stale entry is dropped when its slot is
+    reached.  Advancing the time costs O(1) for each tick passed,
+    plus O(1) for each entry cascaded or expired, never a scan of
+    all the deadlines.
+    """
+    def __init__(self, resolution=1.0, slots=64, levels=4, start=0.0):
+        """ Constructor. """
+        if not resolution > 0.0:
+            raise ValueError('timer wheel resolution must be positive: '
+                             + str(resolution))
+        self.resolution = float(resolution)
+        """ Seconds per tick. """
+        self.slots = slots
+        """ Slots per level. """
+        self.tick = int(math.floor(start / self.resolution))
+        """ Current tick number. """
+        self._deadlines = {}            # deadline ticks, by key
+        self._wheels = [[[] for i in range(slots)]
+                        for level in range(levels)]
+        self._overflow = []             # (tick, key) beyond the last level
+        self._due = []                  # (tick, key) already due
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def add(self, key, deadline):
+        """ Set the deadline for a *key*, replacing any earlier one.
+
+        :param key: Hashable identifier, like a request UUID.
+        :param deadline: (float) Time in seconds when *key* expires.
+        """
+        tick = int(math.ceil(deadline / self.resolution))
+        self._deadlines[key] = tick
+        self._insert(tick, key)
+
+    def advance(self, now):
+        """ Advance the wheel to the current time.
+
+        :param now: (float) Current time, in seconds.
+        :returns: :class:`list` of keys whose deadlines have passed,
+            which are removed from the wheel.
+        """
+        target = int(math.floor(now / self.resolution))
+        expired = self._collect(self._due)
+        self._due = []
+        if not self._deadlines:         # nothing to wait for?
+            if target > self.tick:      # drop stale entries, and jump
+                self.tick = target
+                for wheel in self._wheels:
+                    for slot in wheel:
+                        del slot[:]
+                self._overflow = []
+            return expired
+        if target - self.tick > self.slots ** len(self._wheels):
+            return expired + self._rebuild(target)
+        while self.tick < target:
+            self.tick += 1
+            self._cascade()
+            slot = self._wheels[0][self.tick % self.slots]
+            expired += self._collect(slot)
+            del slot[:]
+            expired += self._collect(self._due)
+            self._due = []
+        return expired
+
+    def _cascade(self):
+        """ Move the entries of any higher-level slots whose turn has
+        come to lower levels, starting with the highest.
+        """
+        levels = len(self._wheels)
+        if self.tick % self.slots ** levels == 0:
+            overflow, self._overflow = self._overflow, []
+            self._reinsert(overflow)
+        for level in range(levels - 1, 0, -1):
+            span = self.slots ** level
+            if self.tick % span == 0:
+                slot = self._wheels[level][(self.tick // span) % self.slots]
+                entries = list(slot)
+                del slot[:]
+                self._reinsert(entries)
+
+    def _collect(self, entries):
+        """ :returns: keys of still-current *entries*, which are
+            removed from the wheel.
+        """
+        expired = []
+        for tick, key in entries:
+            if self._deadlines.get(key) == tick:
+                del self._deadlines[key]
+                expired.append(key)
+        return expired
+
+    def _insert(self, tick, key):
+        """ Place an entry in the slot for its deadline *tick*. """
+        delta = tick - self.tick
+        if delta <= 0:
+            self._due.append((tick, key))
+            return
+        span = 1
+        for wheel in self._wheels:
+            if delta < span * self.slots:
+                wheel[(tick // span) % self.slots].append((tick, key))
+                return
+            span *= self.slots
+        self._overflow.append((tick, key))
+
+    def _rebuild(self, target):
+        """ Jump directly to *target* tick, re-inserting all deadlines.
+
+        Used when advancing tick by tick would cost more than that.
+
+        :returns: :class:`list` of keys expired.
+        """
+        self.tick = target
+        self._wheels = [[[] for i in range(self.slots)]
+                        for level in range(len(self._wheels))]
+        self._overflow = []
+        entries = [(tick, key) for key, tick in self._deadlines.items()]
+        self._reinsert(entries)
+        expired = self._collect(self._due)
+        self._due = []
+        return expired
+
+    def next_expiry(self):
+        """ :returns: (float) time in seconds when the next deadline
+            could expire, or ``None`` if there are none.
+
+        The answer is never later than the earliest deadline, but may
+        be earlier, when that deadline is still in a higher level, or
+        was removed.  Only the slot lists are checked, at most one
+        turn of each level, not the entries.
+        """
+        if not self._deadlines:
+            return None
+        if self._due:
+            return self.tick * self.resolution
+        slots = self.slots
+        earliest = None
+        span = 1
+        for wheel in self._wheels:
+            base = self.tick // span
+            for offset in range(1, slots + 1):
+                tick = (base + offset) * span
+                if earliest is not None and tick >= earliest:
+                    break
+                if wheel[(base + offset) % slots]:
+                    earliest = tick
+                    break
+            span *= slots
+        if self._overflow:
+            tick = (self.tick // span + 1) * span
+            if earliest is None or tick < earliest:
+                earliest = tick
+        return earliest * self.resolution
+
+    def remove(self, key):
+        """ Forget the deadline for a *key*, if any. """
+        self._deadlines.pop(key, None)
+
+    def _reinsert(self, entries):
+        """ Place still-current *entries* in their slots again. """
+        for tick, key in entries:
+            if self._deadlines.get(key) == tick:
+                self._insert(tick, key)
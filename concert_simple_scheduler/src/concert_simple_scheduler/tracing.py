@@ -0,0 +1,256 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (C) 2013-2014, Jack O'Quin
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of the author nor of other contributors may be
+#    used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+.. module:: tracing
+
+This module provides switchable tracing hooks and a sampling
+profiler for the `Robotics in Concert`_ (ROCON) scheduler.
+
+Methods decorated with :func:`traced` report how long each call
+takes to the active trace sink, if any.  While no sink is installed,
+each call only costs one extra function call and a global variable
+test.
+
+.. include:: weblinks.rst
+
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+
+from .match_stats import clock
+
+_sink = None                            # active trace sink, if any
+
+
+def get_sink():
+    """ :returns: the active trace sink, or ``None``. """
+    return _sink
+
+
+def set_sink(sink):
+    """ Install a trace sink.
+
+    :param sink: New sink, or ``None`` to disable tracing.
+    :returns: the previous sink, or ``None``.
+
+    The caller is responsible for closing the previous sink.
+    """
+    global _sink
+    previous = _sink
+    _sink = sink
+    return previous
+
+
+def traced(name):
+    """ Decorator reporting each call to the active trace sink.
+
+    :param name: (str) Event name for the decorated function.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sink = _sink
+            if sink is None:            # tracing disabled?
+                return func(*args, **kwargs)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sink.record(name, start, clock() - start)
+        return wrapper
+    return decorate
+
+
+class NullSink(object):
+    """ Trace sink discarding all events.
+
+    Useful for measuring the cost of the enabled hooks themselves.
+    """
+    def close(self):
+        """ Close this sink. """
+        pass
+
+    def record(self, name, start, duration):
+        """ Record one traced call.
+
+        :param name: (str) Event name.
+        :param start: (float) :func:`.match_stats.clock` time when
+            the call started, in seconds.
+        :param duration: (float) Duration of the call, in seconds.
+        """
+        pass
+
+
+class RingBufferSink(NullSink):
+    """ Trace sink keeping the most recent events in memory.
+
+    :param capacity: (int) Maximum number of events kept.
+
+    Each event is a (name, start, duration, thread ident) tuple.
+    """
+    def __init__(self, capacity=10000):
+        """ Constructor. """
+        self.buffer = collections.deque(maxlen=capacity)
+        """ Recorded events, oldest first. """
+
+    def events(self):
+        """ :returns: list of recorded events, oldest first. """
+        return list(self.buffer)
+
+    def record(self, name, start, duration):
+        """ Record one traced call, see :meth:`NullSink.record`. """
+        self.buffer.append((name, start, duration,
+                            threading.current_thread().ident))
+
+
+class ChromeTraceSink(RingBufferSink):
+    """ Trace sink writing a Chrome trace event file.
+
+    :param path: (str) Name of the JSON file to write.
+    :param capacity: (int) Maximum number of events kept.
+
+    Events are kept in memory until :meth:`close` writes them, in the
+    format loaded by ``chrome://tracing`` and similar trace viewers.
+    """
+    def __init__(self, path, capacity=1000000):
+        """ Constructor. """
+        super(ChromeTraceSink, self).__init__(capacity)
+        self.path = path
+        """ Name of the trace file. """
+
+    def close(self):
+        """ Write all recorded events to the trace file. """
+        pid = os.getpid()
+        trace = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                  'ts': start * 1e6, 'dur': duration * 1e6}
+                 for name, start, duration, tid in self.events()]
+        with open(self.path, 'w') as trace_file:
+            json.dump({'traceEvents': trace}, trace_file)
+
+
+def make_sink(kind, path=None):
+    """ Make a trace sink.
+
+    :param kind: (str) Sink type: ``null``, ``ring`` or ``chrome``.
+    :param path: (str) File name for a ``chrome`` sink.
+    :returns: the new sink.
+    :raises: :exc:`ValueError` for an unknown *kind*.
+    """
+    if kind == 'null':
+        return NullSink()
+    elif kind == 'ring':
+        return RingBufferSink()
+    elif kind == 'chrome':
+        return ChromeTraceSink(path or 'scheduler_trace.json')
+    raise ValueError('unknown trace sink: ' + str(kind))
+
+
+class SamplingProfiler(object):
+    """ Statistical profiler for every thread in this process.
+
+    :param interval: (float) Seconds between samples.
+
+    Unlike :mod:`cProfile`, which only profiles the thread enabling
+    it, this samples the stacks of all threads, so it can be started
+    and stopped from a service callback while the scheduler runs.
+    Samples are only taken when the profiler thread gets the Python
+    interpreter lock, so they favor places where other threads
+    release it.
+    """
+    def __init__(self, interval=0.001):
+        """ Constructor. """
+        self.interval = interval
+        """ Seconds between samples. """
+        self.samples = 0
+        """ Number of samples taken. """
+        self.stacks = collections.Counter()
+        """ Number of times each collapsed stack was seen. """
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        """ Profiler thread main loop. """
+        me = threading.current_thread().ident
+        while not self._stopped.wait(self.interval):
+            self.sample(skip=me)
+
+    def sample(self, skip=None):
+        """ Record the current stack of every thread.
+
+        :param skip: Ident of a thread not to sample.
+        """
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(os.path.basename(code.co_filename)
+                              + ':' + code.co_name)
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(frames))] += 1
+        self.samples += 1
+
+    def start(self):
+        """ Start sampling in a separate thread. """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='scheduler_profiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop sampling. """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self, path):
+        """ Write the samples in collapsed stack format.
+
+        :param path: (str) Name of the file to write.
+
+        Each line has the semicolon-separated frames of one stack,
+        outermost first, and the number of times it was seen, as read
+        by ``flamegraph.pl`` and similar tools.
+        """
+        with open(path, 'w') as out:
+            for stack, count in self.stacks.most_common():
+                out.write(stack + ' ' + str(count) + '\n')
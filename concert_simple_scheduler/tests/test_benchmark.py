@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+# module being tested:
+from concert_simple_scheduler.benchmark import *
+
+
+class TestBenchmark(unittest.TestCase):
+    """Unit tests for the scheduler microbenchmarks.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_case_name(self):
+        self.assertEqual(case_name('pool_update', 10), 'pool_update/n=10')
+        self.assertEqual(case_name('pool_allocate', 1000, 4),
+                         'pool_allocate/n=1000/w=4')
+
+    def test_measure(self):
+        calls = []
+        result = measure(lambda: calls.append(1), ops=2, min_time=0.001)
+        self.assertGreater(result['ops'], 0)
+        self.assertEqual(result['ops'] % 2, 0)
+        self.assertLessEqual(result['ops'], 2 * len(calls))
+        self.assertLessEqual(result['best'], result['mean'])
+
+    def test_measure_setup(self):
+        calls = []
+        setups = []
+        measure(lambda: calls.append(1), min_time=0.001,
+                setup=lambda: setups.append(1))
+        self.assertGreaterEqual(len(calls), 1)
+        self.assertEqual(len(calls), len(setups))
+
+    def test_run(self):
+        results = run(sizes=[4], widths=[1, 2, 8], min_time=0.001,
+                      label='test')
+        self.assertEqual(results['label'], 'test')
+        self.assertEqual(results['engine'], 'object')
+        self.assertEqual(sorted(results['cases'].keys()),
+                         ['dispatch_backfill/n=4',
+                          'pool_allocate/n=4/w=1',
+                          'pool_allocate/n=4/w=2',
+                          'pool_known_resources/n=4',
+                          'pool_match_list/n=4/w=1',
+                          'pool_match_list/n=4/w=2',
+                          'pool_update/n=4',
+                          'queue_add/n=4',
+                          'queue_pop/n=4',
+                          'queue_remove/n=4',
+                          'queue_reprioritize/n=4'])
+
+    def test_compare(self):
+        old = {'cases': {'a': {'best': 1.0}, 'b': {'best': 2.0},
+                         'c': {'best': 1.0}}}
+        new = {'cases': {'a': {'best': 1.05}, 'b': {'best': 3.0},
+                         'd': {'best': 1.0}}}
+        self.assertEqual(compare(old, new),
+                         [('a', 1.05, False), ('b', 1.5, True)])
+        self.assertEqual(compare(old, new, threshold=0.6),
+                         [('a', 1.05, False), ('b', 1.5, False)])
+
+    def test_main(self):
+        path = os.path.join(self.dir, 'results.json')
+        argv = ['--sizes', '2', '--widths', '1', '--min-time', '0.001']
+        self.assertEqual(main(argv + ['--output', path]), 0)
+        with open(path) as f:
+            results = json.load(f)
+        self.assertIn('pool_allocate/n=2/w=1', results['cases'])
+        self.assertEqual(main(argv + ['--compare', path, '--threshold',
+                                      '1000']), 0)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_benchmark',
+                    TestBenchmark)
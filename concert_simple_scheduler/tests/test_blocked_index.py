@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import uuid
+import unittest
+
+# ROS dependencies
+import unique_id
+from scheduler_msgs.msg import Request, Resource
+from scheduler_msgs.msg import CurrentStatus, KnownResources
+from rocon_scheduler_requests.transitions import ActiveRequest
+
+# modules being tested:
+from concert_simple_scheduler.blocked_index import *
+from concert_simple_scheduler.resource_pool import PoolResource, ResourcePool
+
+# some definitions for testing
+RQ1_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+RQ2_UUID = uuid.UUID('01234567-89ab-cdef-fedc-ba9876543210')
+
+EXAMPLE_RAPP = 'tests/example_rapp'
+TELEOP_RAPP = 'rocon_apps/teleop'
+MARVIN_NAME = 'rocon:/turtlebot/marvin'
+ROBERTO_NAME = 'rocon:/turtlebot/roberto'
+BUZZ_NAME = 'rocon:/drone/buzz'
+MARVIN = CurrentStatus(uri=MARVIN_NAME, rapps=[TELEOP_RAPP])
+ROBERTO = CurrentStatus(uri=ROBERTO_NAME, rapps=[TELEOP_RAPP, EXAMPLE_RAPP])
+BUZZ = CurrentStatus(uri=BUZZ_NAME, rapps=[TELEOP_RAPP])
+
+
+def request(rq_id, *resources):
+    """ :returns: ActiveRequest for (rapp, uri) pairs. """
+    return ActiveRequest(Request(
+        id=unique_id.toMsg(rq_id),
+        resources=[Resource(rapp=rapp, uri=uri) for rapp, uri in resources]))
+
+
+class TestBlockedIndex(unittest.TestCase):
+    """Unit tests for the blocked request index.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_pattern_namespace(self):
+        self.assertEqual(pattern_namespace(MARVIN_NAME), 'turtlebot')
+        self.assertEqual(pattern_namespace('rocon:/turtlebot/.*'),
+                         'turtlebot')
+        self.assertIsNone(pattern_namespace('rocon:/turtlebot'))
+        self.assertIsNone(pattern_namespace('rocon:/.*/roberto'))
+        self.assertIsNone(pattern_namespace('rocon:/(drone|turtlebot)/x'))
+
+    def test_missing_items_only(self):
+        pool = ResourcePool(KnownResources(resources=[MARVIN]))
+        index = BlockedIndex()
+        index.add(request(RQ1_UUID, (TELEOP_RAPP, MARVIN_NAME),
+                          (TELEOP_RAPP, ROBERTO_NAME)), pool)
+        self.assertIn(RQ1_UUID, index)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.candidates(PoolResource(ROBERTO)),
+                         set([RQ1_UUID]))
+        self.assertEqual(index.candidates(PoolResource(MARVIN)), set())
+        self.assertEqual(index.candidates(PoolResource(BUZZ)), set())
+
+    def test_not_enough_resources(self):
+        pool = ResourcePool(KnownResources(resources=[MARVIN]))
+        index = BlockedIndex()
+        index.add(request(RQ1_UUID, (TELEOP_RAPP, 'rocon:/turtlebot/.*'),
+                          (TELEOP_RAPP, 'rocon:/turtlebot/.*')), pool)
+        self.assertEqual(index.candidates(PoolResource(ROBERTO)),
+                         set([RQ1_UUID]))
+        self.assertEqual(index.candidates(PoolResource(MARVIN)),
+                         set([RQ1_UUID]))
+        self.assertEqual(index.candidates(PoolResource(BUZZ)), set())
+
+    def test_wildcard_namespace(self):
+        pool = ResourcePool()
+        index = BlockedIndex()
+        index.add(request(RQ1_UUID, (TELEOP_RAPP, 'rocon:/.*/buzz')), pool)
+        index.add(request(RQ2_UUID, (EXAMPLE_RAPP, 'rocon:/turtlebot')),
+                  pool)
+        self.assertEqual(index.candidates(PoolResource(BUZZ)),
+                         set([RQ1_UUID]))
+        self.assertEqual(index.candidates(PoolResource(ROBERTO)),
+                         set([RQ2_UUID]))
+        self.assertEqual(index.candidates(PoolResource(MARVIN)), set())
+
+    def test_remove(self):
+        pool = ResourcePool()
+        index = BlockedIndex()
+        index.add(request(RQ1_UUID, (TELEOP_RAPP, MARVIN_NAME)), pool)
+        index.add(request(RQ2_UUID, (TELEOP_RAPP, 'rocon:/turtlebot/.*')),
+                  pool)
+        self.assertEqual(index.candidates(PoolResource(MARVIN)),
+                         set([RQ1_UUID, RQ2_UUID]))
+        index.remove(RQ1_UUID)
+        index.remove(RQ1_UUID)          # not there any more
+        self.assertNotIn(RQ1_UUID, index)
+        self.assertEqual(index.candidates(PoolResource(MARVIN)),
+                         set([RQ2_UUID]))
+        index.remove(RQ2_UUID)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index._buckets, {})
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_blocked_index',
+                    TestBlockedIndex)
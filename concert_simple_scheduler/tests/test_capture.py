@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+# module being tested:
+from concert_simple_scheduler.capture import *
+from concert_simple_scheduler.simulator import Simulator
+
+
+class TestCapture(unittest.TestCase):
+    """Unit tests for scheduler traffic capture and replay.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'capture.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, events=300):
+        """ Record a short simulation, returning its results. """
+        core = SchedulerCore()
+        core.recorder = Recorder(self.path)
+        sim = Simulator(core, clients=4, requesters=3, arrival_rate=3.0,
+                        hold_time=2.0, patience=3.0, max_resources=2,
+                        churn_rate=0.2, seed=7)
+        results = sim.run(max_events=events)
+        core.recorder.close()
+        return results
+
+    def test_empty(self):
+        Recorder(self.path).close()
+        start_time, records = load(self.path)
+        self.assertGreater(start_time, 0.0)
+        self.assertEqual(records, [])
+        results = Replayer().run(records)
+        self.assertEqual(results['records'], 0)
+        self.assertEqual(results['decisions'], [])
+
+    def test_not_capture(self):
+        with gzip.open(self.path, 'wb') as f:
+            f.write(b'not a capture\n')
+        self.assertRaises(ValueError, load, self.path)
+        with gzip.open(self.path, 'wb') as f:
+            f.write(b'["rocon_scheduler_capture", 1, 0.0]\n')
+        self.assertRaises(ValueError, load, self.path)  # old version
+        with open(self.path, 'wb') as f:
+            f.write(b'not compressed')
+        self.assertRaises(ValueError, load, self.path)
+
+    def test_plain_data(self):
+        self.record(events=20)
+        with gzip.open(self.path, 'rb') as f:
+            lines = f.read().decode('utf-8').splitlines()
+        self.assertEqual(json.loads(lines[0])[:2], [HEADER, VERSION])
+        start_time, records = load(self.path)
+        self.assertEqual(len(lines), len(records) + 1)
+        for line, record in zip(lines[1:], records):
+            data = json.loads(line)
+            if record[0] == REQUESTS:
+                self.assertEqual(data[2], record[2].hex)
+                self.assertEqual(data[3], [request_data(msg)
+                                           for msg in record[3]])
+            else:
+                self.assertEqual(data[2], [client_data(msg)
+                                           for msg in record[2]])
+
+    def test_record(self):
+        self.record()
+        start_time, records = load(self.path)
+        kinds = set(record[0] for record in records)
+        self.assertEqual(kinds, set([REQUESTS, CLIENTS]))
+        times = [record[1] for record in records]
+        self.assertEqual(times, sorted(times))
+
+    def test_replay(self):
+        original = self.record()
+        start_time, records = load(self.path)
+        first = Replayer().run(records)
+        self.assertEqual(first['records'], len(records))
+        self.assertEqual(first['grants'], original['grants'])
+        self.assertEqual(first['core_granted'], original['grants'])
+        self.assertEqual(first['core_canceled'], original['core_canceled'])
+        second = Replayer().run(records)
+        self.assertEqual([(d['request'], d['resources'])
+                          for d in first['decisions']],
+                         [(d['request'], d['resources'])
+                          for d in second['decisions']])
+
+    def test_replay_speed(self):
+        self.record(events=20)
+        start_time, records = load(self.path)
+        elapsed = records[-1][1]
+        results = Replayer(speed=10.0 * elapsed).run(records)
+        self.assertGreaterEqual(results['wall_time'], 0.1)
+        self.assertEqual(results['requests_count']
+                         + results['clients_count'], len(records))
+
+    def test_truncated(self):
+        self.record(events=50)
+        start_time, records = load(self.path)
+        with gzip.open(self.path, 'rb') as f:
+            data = f.read()
+        with gzip.open(self.path, 'wb') as f:
+            f.write(data[:-10])
+        start_time, partial = load(self.path)
+        self.assertEqual(partial, records[:-1])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_capture',
+                    TestCapture)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import copy
+import uuid
+import unittest
+
+# ROS dependencies
+import unique_id
+from rocon_app_manager_msgs.msg import App
+from rocon_std_msgs.msg import PlatformInfo
+from concert_msgs.msg import ConcertClient
+from scheduler_msgs.msg import Request, Resource
+from scheduler_msgs.msg import CurrentStatus, KnownResources
+from rocon_scheduler_requests.transitions import ActiveRequest
+
+# modules being tested:
+from concert_simple_scheduler.resource_pool import *
+from concert_simple_scheduler.columnar_pool import *
+from concert_simple_scheduler import columnar_pool
+from concert_simple_scheduler.match_stats import MatchStats
+
+# some definitions for testing
+RQ_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+DIFF_UUID = unique_id.fromURL('package://concert_simple_scheduler/diff_uuid')
+
+EXAMPLE_RAPP = 'tests/example_rapp'
+TELEOP_RAPP = 'rocon_apps/teleop'
+TEST_RAPPS = [TELEOP_RAPP, EXAMPLE_RAPP]
+
+ANY_NAME = 'rocon:/turtlebot'
+MARVIN_NAME = 'rocon:/turtlebot/marvin'
+ROBERTO_NAME = 'rocon:/turtlebot/roberto'
+MARVIN = CurrentStatus(uri=MARVIN_NAME, rapps=TEST_RAPPS)
+ROBERTO = CurrentStatus(uri=ROBERTO_NAME, rapps=TEST_RAPPS)
+DOUBLETON_POOL = KnownResources(resources=[MARVIN, ROBERTO])
+
+ANY_RESOURCE = Resource(rapp=TELEOP_RAPP, uri=ANY_NAME)
+ANY_REQUEST = ActiveRequest(Request(
+    id=unique_id.toMsg(RQ_UUID),
+    resources=[ANY_RESOURCE]))
+ROBERTO_RESOURCE = Resource(rapp=TELEOP_RAPP, uri=ROBERTO_NAME)
+ROBERTO_REQUEST = ActiveRequest(Request(
+    id=unique_id.toMsg(RQ_UUID),
+    resources=[ROBERTO_RESOURCE]))
+
+
+@unittest.skipIf(columnar_pool.numpy is None, 'NumPy not available')
+class TestColumnarResourcePool(unittest.TestCase):
+    """Unit tests for columnar resource pool class.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_engine_selection(self):
+        pool = ResourcePool(DOUBLETON_POOL, engine='columnar')
+        self.assertIsInstance(pool, ColumnarResourcePool)
+        self.assertEqual(len(pool), 2)
+        self.assertNotIsInstance(ResourcePool(DOUBLETON_POOL),
+                                 ColumnarResourcePool)
+        self.assertRaises(ValueError, ResourcePool, engine='bogus')
+
+    def test_engine_mismatch(self):
+        class ObjectPool(ResourcePool):
+            pass
+        self.assertRaises(ValueError, ObjectPool, engine='columnar')
+        self.assertRaises(ValueError, ColumnarResourcePool, engine='object')
+        self.assertIsInstance(ObjectPool(engine='object'), ObjectPool)
+        self.assertIsInstance(ColumnarResourcePool(engine='columnar'),
+                              ColumnarResourcePool)
+
+    def test_allocate_and_release(self):
+        pool = ColumnarResourcePool(DOUBLETON_POOL)
+        rq = copy.deepcopy(ROBERTO_REQUEST)
+        alloc = pool.allocate(rq)
+        self.assertTrue(alloc)
+        self.assertEqual(alloc[0], ROBERTO_RESOURCE)
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(pool[ROBERTO_NAME].owner, RQ_UUID)
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertIsNone(pool[MARVIN_NAME].owner)
+        self.assertEqual(pool.status[pool[ROBERTO_NAME].row],
+                         CurrentStatus.ALLOCATED)
+
+        # already allocated, so this request must wait
+        self.assertFalse(pool.allocate(copy.deepcopy(ROBERTO_REQUEST)))
+
+        rq.grant(alloc)
+        pool.release_request(rq)
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertIsNone(pool[ROBERTO_NAME].owner)
+        self.assertEqual(pool.owner_index[pool[ROBERTO_NAME].row], -1)
+
+    def test_match_subset(self):
+        pool = ColumnarResourcePool(DOUBLETON_POOL)
+        subset = pool._match_subset(ANY_RESOURCE, {CurrentStatus.AVAILABLE})
+        self.assertEqual(subset, set([MARVIN_NAME, ROBERTO_NAME]))
+        subset = pool._match_subset(ROBERTO_RESOURCE,
+                                    {CurrentStatus.AVAILABLE})
+        self.assertEqual(subset, set([ROBERTO_NAME]))
+        subset = pool._match_subset(
+            Resource(rapp='unknown/rapp', uri=ANY_NAME),
+            {CurrentStatus.AVAILABLE})
+        self.assertEqual(subset, set())
+        pool[MARVIN_NAME].status = CurrentStatus.MISSING
+        subset = pool._match_subset(ANY_RESOURCE, {CurrentStatus.AVAILABLE})
+        self.assertEqual(subset, set([ROBERTO_NAME]))
+
+    def test_match_stats(self):
+        pool = ColumnarResourcePool(DOUBLETON_POOL)
+        pool.stats = MatchStats()
+        self.assertTrue(pool.allocate(copy.deepcopy(ROBERTO_REQUEST)))
+        self.assertEqual(pool.stats.resources_scanned, 2)
+        self.assertEqual(pool.stats.regex_evaluations, 2)
+        self.assertEqual(pool.stats.cache_misses, 1)
+        pool.match_list([ROBERTO_RESOURCE], {CurrentStatus.ALLOCATED})
+        self.assertEqual(pool.stats.regex_evaluations, 2)
+        self.assertEqual(pool.stats.cache_hits, 1)
+        self.assertEqual(pool.stats.matches, 2)
+
+    def test_owner_slots_reused(self):
+        pool = ColumnarResourcePool(DOUBLETON_POOL)
+        rq1 = copy.deepcopy(ANY_REQUEST)
+        alloc1 = pool.allocate(rq1)
+        rq1.grant(alloc1)
+        pool.release_request(rq1)
+        rq2 = ActiveRequest(Request(id=unique_id.toMsg(DIFF_UUID),
+                                    resources=[ANY_RESOURCE]))
+        self.assertTrue(pool.allocate(rq2))
+        self.assertEqual(len(pool._owners), 1)
+
+    def test_same_as_object_engine(self):
+        pool = ColumnarResourcePool(DOUBLETON_POOL)
+        self.assertEqual(pool[ROBERTO_NAME], PoolResource(ROBERTO))
+        self.assertEqual(str(pool[ROBERTO_NAME]), str(PoolResource(ROBERTO)))
+        self.assertEqual(pool.known_resources(), DOUBLETON_POOL)
+        self.assertFalse(pool.changed)
+
+    def test_snapshot(self):
+        pool = ColumnarResourcePool(DOUBLETON_POOL)
+        snap = pool.snapshot()
+        self.assertIsInstance(snap, ColumnarResourcePool)
+        self.assertIs(snap.status, pool.status)  # arrays shared
+        rq = copy.deepcopy(ROBERTO_REQUEST)
+        self.assertTrue(snap.allocate(rq))
+        self.assertIsNot(snap.status, pool.status)
+        self.assertEqual(snap[ROBERTO_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(snap[ROBERTO_NAME].owner, RQ_UUID)
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertIsNone(pool[ROBERTO_NAME].owner)
+        self.assertTrue(pool.allocate(copy.deepcopy(ROBERTO_REQUEST)))
+        pool.update([])
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.MISSING)
+        self.assertEqual(snap[MARVIN_NAME].status, CurrentStatus.AVAILABLE)
+
+    def test_status_counts(self):
+        pool = ResourcePool(DOUBLETON_POOL, engine='columnar')
+        self.assertEqual(pool.status_counts(),
+                         {CurrentStatus.AVAILABLE: 2,
+                          CurrentStatus.ALLOCATED: 0,
+                          CurrentStatus.MISSING: 0})
+        self.assertTrue(pool.allocate(copy.deepcopy(ROBERTO_REQUEST)))
+        self.assertEqual(pool.status_counts(),
+                         {CurrentStatus.AVAILABLE: 1,
+                          CurrentStatus.ALLOCATED: 1,
+                          CurrentStatus.MISSING: 0})
+        pool.update([])
+        self.assertEqual(pool.status_counts(),
+                         {CurrentStatus.AVAILABLE: 0,
+                          CurrentStatus.ALLOCATED: 0,
+                          CurrentStatus.MISSING: 2})
+
+    def test_update(self):
+        pool = ColumnarResourcePool()
+        for i in range(40):             # enough to grow the arrays
+            pool.update([ConcertClient(
+                name='dude' + str(j),
+                platform_info=PlatformInfo(
+                    uri='rocon:/turtlebot/dude' + str(j)),
+                apps=[App(name=TELEOP_RAPP)]) for j in range(i + 1)])
+        self.assertEqual(len(pool), 40)
+        matches = pool.match_list([ANY_RESOURCE], {CurrentStatus.AVAILABLE})
+        self.assertEqual(len(matches[0]), 40)
+        pool.update([])
+        self.assertEqual(pool['rocon:/turtlebot/dude0'].status,
+                         CurrentStatus.MISSING)
+        self.assertFalse(pool.match_list([ANY_RESOURCE],
+                                         {CurrentStatus.AVAILABLE}))
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_columnar_pool',
+                    TestColumnarResourcePool)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+import unittest
+
+# ROS dependencies
+import unique_id
+from scheduler_msgs.msg import Request, Resource
+
+# module being tested:
+from concert_simple_scheduler.journal import *
+
+# some definitions for testing
+RQ1_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+RQ2_UUID = uuid.UUID('01234567-89ab-cdef-fedc-ba9876543210')
+REQUESTER = uuid.UUID('fedcba98-7654-3210-0123-456789abcdef')
+TELEOP_RAPP = 'rocon_apps/teleop'
+MARVIN_NAME = 'rocon:/turtlebot/marvin'
+
+
+def request_msg(rq_id):
+    """ :returns: teleop Request message for *rq_id*. """
+    return Request(id=unique_id.toMsg(rq_id), priority=10,
+                   resources=[Resource(rapp=TELEOP_RAPP, uri=MARVIN_NAME)])
+
+
+class TestJournal(unittest.TestCase):
+    """Unit tests for the scheduler journal.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'scheduler.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_empty(self):
+        jnl = Journal(self.path)
+        self.assertEqual(jnl.load(), (None, []))
+        self.assertEqual(replay(*jnl.load()), empty_state())
+
+    def test_append_load(self):
+        jnl = Journal(self.path)
+        jnl.append(QUEUE, request_msg(RQ1_UUID), REQUESTER, 0)
+        jnl.append(QUEUE, request_msg(RQ2_UUID), REQUESTER, 1)
+        jnl.append(BLOCK, RQ2_UUID)
+        jnl.close()
+        state, records = Journal(self.path).load()
+        self.assertIsNone(state)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[2], (BLOCK, RQ2_UUID))
+        state = replay(state, records)
+        self.assertEqual(state['granted'], [])
+        self.assertEqual([(unique_id.fromMsg(msg.id), rqr, seq, blocked)
+                          for msg, rqr, seq, blocked in state['queued']],
+                         [(RQ1_UUID, REQUESTER, 0, False),
+                          (RQ2_UUID, REQUESTER, 1, True)])
+        jnl.append(READY, RQ2_UUID)
+        state = replay(*jnl.load())
+        self.assertEqual([blocked for msg, rqr, seq, blocked
+                          in state['queued']], [False, False])
+
+    def test_grant_cancel(self):
+        jnl = Journal(self.path)
+        jnl.append(QUEUE, request_msg(RQ1_UUID), REQUESTER, 0)
+        jnl.append(QUEUE, request_msg(RQ2_UUID), REQUESTER, 1)
+        jnl.append(GRANT, request_msg(RQ1_UUID), REQUESTER)
+        jnl.append(CANCEL, RQ2_UUID)
+        state = replay(*jnl.load())
+        self.assertEqual(state['queued'], [])
+        self.assertEqual(len(state['granted']), 1)
+        msg, rqr = state['granted'][0]
+        self.assertEqual(unique_id.fromMsg(msg.id), RQ1_UUID)
+        self.assertEqual(msg.resources[0].uri, MARVIN_NAME)
+        jnl.append(CANCEL, RQ1_UUID)
+        self.assertEqual(replay(*jnl.load()), empty_state())
+
+    def test_checkpoint(self):
+        jnl = Journal(self.path, checkpoint_interval=2)
+        jnl.append(QUEUE, request_msg(RQ1_UUID), REQUESTER, 0)
+        self.assertFalse(jnl.needs_checkpoint())
+        jnl.append(GRANT, request_msg(RQ1_UUID), REQUESTER)
+        self.assertTrue(jnl.needs_checkpoint())
+        jnl.checkpoint(replay(*jnl.load()))
+        self.assertFalse(jnl.needs_checkpoint())
+        self.assertEqual(os.path.getsize(self.path), 0)
+        jnl.append(QUEUE, request_msg(RQ2_UUID), REQUESTER, 1)
+        jnl.close()
+        state, records = Journal(self.path).load()
+        self.assertEqual(len(state['granted']), 1)
+        self.assertEqual(len(records), 1)
+        state = replay(state, records)
+        self.assertEqual(len(state['granted']), 1)
+        self.assertEqual(len(state['queued']), 1)
+
+    def test_plain_data(self):
+        jnl = Journal(self.path)
+        jnl.append(QUEUE, request_msg(RQ1_UUID), REQUESTER, 0)
+        jnl.append(CANCEL, RQ1_UUID)
+        jnl.close()
+        with open(self.path, 'rb') as f:
+            lines = [json.loads(line.decode('utf-8')) for line in f]
+        self.assertEqual(lines[0][0], QUEUE)
+        self.assertEqual(lines[0][1]['id'], RQ1_UUID.hex)
+        self.assertEqual(lines[0][1]['resources'],
+                         [[MARVIN_NAME, TELEOP_RAPP]])
+        self.assertEqual(lines[0][2:], [REQUESTER.hex, 0])
+        self.assertEqual(lines[1], [CANCEL, RQ1_UUID.hex])
+
+        jnl.checkpoint(replay(*jnl.load()))
+        with open(jnl.checkpoint_path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        self.assertEqual(data['version'], VERSION)
+
+    def test_unreadable_checkpoint(self):
+        jnl = Journal(self.path)
+        jnl.append(QUEUE, request_msg(RQ1_UUID), REQUESTER, 0)
+        jnl.close()
+        with open(jnl.checkpoint_path, 'wb') as f:  # an older format
+            pickle.dump(empty_state(), f, 2)
+        self.assertEqual(Journal(self.path).load(), (None, []))
+
+    def test_unreadable_record(self):
+        jnl = Journal(self.path)
+        jnl.append(QUEUE, request_msg(RQ1_UUID), REQUESTER, 0)
+        jnl.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'\x80\x02garbage\n')
+        jnl.append(QUEUE, request_msg(RQ2_UUID), REQUESTER, 1)
+        jnl.close()
+        state, records = Journal(self.path).load()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(unique_id.fromMsg(records[0][1].id), RQ1_UUID)
+
+    def test_truncated_record(self):
+        jnl = Journal(self.path)
+        jnl.append(QUEUE, request_msg(RQ1_UUID), REQUESTER, 0)
+        jnl.append(QUEUE, request_msg(RQ2_UUID), REQUESTER, 1)
+        jnl.close()
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        state = replay(*Journal(self.path).load())
+        self.assertEqual(len(state['queued']), 1)
+        self.assertEqual(unique_id.fromMsg(state['queued'][0][0].id),
+                         RQ1_UUID)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_journal',
+                    TestJournal)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+import unittest
+
+# module being tested:
+from concert_simple_scheduler.lock_monitor import *
+
+
+class TestMonitoredLock(unittest.TestCase):
+    """Unit tests for monitored lock class.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_constructor(self):
+        lock = MonitoredLock()
+        self.assertEqual(lock.threshold, 0.1)
+        self.assertEqual(lock.sites, {})
+        self.assertEqual(lock.report(), '')
+        summary = lock.summary()
+        self.assertEqual(summary['lock_long_holds'], 0)
+        self.assertEqual(summary['lock_hold_count'], 0)
+        self.assertEqual(summary['lock_wait_max'], 0.0)
+
+    def test_reentrant(self):
+        lock = MonitoredLock(threshold=0.0)
+        with lock:
+            with lock:
+                self.assertTrue(lock.acquire())
+                lock.release()
+        self.assertEqual(lock.hold.count, 1)  # outermost only
+        self.assertEqual(lock.wait.count, 1)
+        self.assertEqual(len(lock.sites), 1)
+        site = list(lock.sites.keys())[0]
+        self.assertIn('test_lock_monitor.py:', site)
+        self.assertIn('test_reentrant', site)
+
+    def test_sites(self):
+        lock = MonitoredLock(threshold=0.0)
+        for i in range(3):
+            with lock:
+                pass
+        self.assertTrue(lock.acquire())
+        lock.release()
+        self.assertEqual(len(lock.sites), 2)
+        self.assertEqual(sorted(hold.count for wait, hold
+                                in lock.sites.values()), [1, 3])
+        self.assertEqual(len(lock.report(limit=1).splitlines()), 1)
+        self.assertEqual(lock.long_holds, 0)
+
+    def test_contention(self):
+        lock = MonitoredLock(threshold=0.02)
+        held = threading.Event()
+
+        def hog():
+            with lock:
+                held.set()
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=hog)
+        thread.start()
+        held.wait()
+        self.assertFalse(lock.acquire(False))  # busy
+        with lock:
+            pass
+        thread.join()
+        self.assertEqual(lock.hold.count, 2)
+        self.assertTrue(lock.wait.max > 0.01)
+        self.assertTrue(lock.hold.max > 0.02)
+        self.assertEqual(lock.long_holds, 1)
+        self.assertTrue(lock.report().startswith('test_lock_monitor.py:'))
+        self.assertIn(' hog: 1 holds', lock.report())
+
+    def test_wrapped_lock(self):
+        inner = threading.RLock()
+        lock = MonitoredLock(inner)
+        self.assertIs(lock.lock, inner)
+        with lock:
+            self.assertTrue(inner.acquire(False))  # owned by this thread
+            inner.release()
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_lock_monitor',
+                    TestMonitoredLock)
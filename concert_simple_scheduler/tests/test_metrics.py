@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import uuid
+import unittest
+
+# ROS dependencies
+from scheduler_msgs.msg import CurrentStatus
+
+# module being tested:
+from concert_simple_scheduler import metrics
+from concert_simple_scheduler.metrics import *
+
+# some definitions for testing
+RQ1_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+RQ2_UUID = uuid.UUID('01234567-89ab-cdef-fedc-ba9876543210')
+RESOURCES = {CurrentStatus.AVAILABLE: 3,
+             CurrentStatus.ALLOCATED: 2,
+             CurrentStatus.MISSING: 1}
+
+
+class TestHistogram(unittest.TestCase):
+    """Unit tests for duration histogram class.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_empty(self):
+        hist = Histogram()
+        self.assertEqual(hist.count, 0)
+        self.assertEqual(hist.mean(), 0.0)
+        self.assertEqual(hist.percentile(50.0), 0.0)
+        self.assertEqual(len(hist.buckets), len(BOUNDS) + 1)
+
+    def test_add(self):
+        hist = Histogram(bounds=[0.1, 1.0])
+        for value in [0.05, 0.1, 0.5, 0.7, 5.0]:
+            hist.add(value)
+        self.assertEqual(hist.buckets, [2, 2, 1])
+        self.assertEqual(hist.count, 5)
+        self.assertAlmostEqual(hist.mean(), 6.35 / 5)
+        self.assertEqual(hist.max, 5.0)
+        self.assertEqual(hist.percentile(40.0), 0.1)
+        self.assertEqual(hist.percentile(80.0), 1.0)
+        self.assertEqual(hist.percentile(99.0), 5.0)  # overflow
+        summary = hist.as_dict()
+        self.assertEqual(summary['count'], 5)
+        self.assertEqual(summary['p50'], 1.0)
+        hist.reset()
+        self.assertEqual(hist.count, 0)
+        self.assertEqual(hist.buckets, [0, 0, 0])
+
+    def test_percentile_below_bound(self):
+        hist = Histogram(bounds=[1.0])
+        hist.add(0.25)
+        self.assertEqual(hist.percentile(50.0), 0.25)
+
+
+class TestSchedulerMetrics(unittest.TestCase):
+    """Unit tests for scheduler metrics class.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.now = 100.0
+        self.saved_clock = metrics.clock
+        metrics.clock = lambda: self.now
+
+    def tearDown(self):
+        metrics.clock = self.saved_clock
+
+    def test_events(self):
+        m = SchedulerMetrics()
+        m.queued(RQ1_UUID)
+        m.queued(RQ2_UUID)
+        self.now += 0.5
+        m.granted(RQ1_UUID)
+        m.granted(RQ1_UUID)             # already granted, no latency
+        m.canceled(RQ2_UUID)
+        m.rejected(RQ2_UUID)
+        m.expired(RQ2_UUID)
+        self.assertEqual(m.counters,
+                         {'granted': 2, 'rejected': 1, 'canceled': 1,
+                          'expired': 1})
+        self.assertEqual(m.histograms['latency'].count, 1)
+        self.assertEqual(m.histograms['latency'].max, 0.5)
+        self.assertEqual(m._queued, {})
+
+    def test_sample(self):
+        m = SchedulerMetrics()
+        m.observe('dispatch', 0.25)
+        m.granted(RQ1_UUID)
+        self.now += 2.0
+        values = m.sample(4, 1, RESOURCES)
+        self.assertEqual(values['ready_queue'], 4)
+        self.assertEqual(values['blocked_queue'], 1)
+        self.assertEqual(values['available'], 3)
+        self.assertEqual(values['allocated'], 2)
+        self.assertEqual(values['missing'], 1)
+        self.assertEqual(values['granted'], 1)
+        self.assertEqual(values['granted_rate'], 0.5)
+        self.assertEqual(values['dispatch_count'], 1)
+        self.assertEqual(values['dispatch_max'], 0.25)
+        self.assertEqual(values['callback_count'], 0)
+
+        # rates are measured since the previous sample
+        self.now += 1.0
+        values = m.sample(0, 0, {})
+        self.assertEqual(values['granted'], 1)
+        self.assertEqual(values['granted_rate'], 0.0)
+        self.assertEqual(values['available'], 0)
+
+    def test_to_msg(self):
+        m = SchedulerMetrics(name='test_scheduler')
+        msg = m.to_msg(m.sample(2, 0, RESOURCES))
+        self.assertEqual(len(msg.status), 1)
+        status = msg.status[0]
+        self.assertEqual(status.name, 'test_scheduler')
+        values = dict((kv.key, kv.value) for kv in status.values)
+        self.assertEqual(values['ready_queue'], '2')
+        self.assertIn('latency_p99', values)
+        keys = [kv.key for kv in status.values]
+        self.assertEqual(keys, sorted(keys))
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_histogram',
+                    TestHistogram)
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_scheduler_metrics',
+                    TestSchedulerMetrics)
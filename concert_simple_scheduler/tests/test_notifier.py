@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+import uuid
+import unittest
+
+# modules being tested:
+from concert_simple_scheduler.notifier import *
+
+# some definitions for testing
+RQR1_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+RQR2_UUID = uuid.UUID('01234567-89ab-cdef-fedc-ba9876543210')
+
+
+class TestNotifier(unittest.TestCase):
+    """Unit tests for requester notification thread.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.sent = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.notifier = Notifier(self.send)
+
+    def tearDown(self):
+        self.gate.set()
+        self.notifier.shutdown()
+
+    def send(self, requester_id):
+        self.gate.wait()
+        if requester_id is None:
+            raise ValueError('no requester')
+        self.sent.append(requester_id)
+
+    def test_empty(self):
+        self.assertEqual(len(self.notifier), 0)
+        self.assertTrue(self.notifier.flush(1.0))
+        self.assertEqual(self.notifier.sent, 0)
+
+    def test_notify(self):
+        self.notifier.notify([RQR1_UUID, RQR2_UUID])
+        self.assertTrue(self.notifier.flush(1.0))
+        self.assertEqual(sorted(self.sent), sorted([RQR1_UUID, RQR2_UUID]))
+        self.assertEqual(self.notifier.sent, 2)
+
+    def test_duplicates(self):
+        self.gate.clear()               # hold the notifier thread
+        self.notifier.notify([RQR1_UUID])
+        while len(self.notifier) > 0:   # wait for thread to start sending
+            time.sleep(0.001)
+        self.notifier.notify([RQR1_UUID, RQR2_UUID])
+        self.notifier.notify([RQR1_UUID])
+        self.assertEqual(len(self.notifier), 2)
+        self.assertFalse(self.notifier.flush(0.01))
+        self.gate.set()
+        self.assertTrue(self.notifier.flush(1.0))
+        self.assertEqual(self.sent[0], RQR1_UUID)
+        self.assertEqual(sorted(self.sent[1:]),
+                         sorted([RQR1_UUID, RQR2_UUID]))
+
+    def test_notify_does_not_wait(self):
+        self.gate.clear()               # hold the notifier thread
+        self.notifier.notify([RQR1_UUID])
+        self.notifier.notify([RQR2_UUID])  # returns without sending
+        self.assertEqual(self.sent, [])
+        self.gate.set()
+        self.assertTrue(self.notifier.flush(1.0))
+        self.assertEqual(sorted(self.sent), sorted([RQR1_UUID, RQR2_UUID]))
+
+    def test_send_failure(self):
+        self.notifier.notify([None])
+        self.assertTrue(self.notifier.flush(1.0))
+        self.assertEqual(self.notifier.sent, 0)
+        self.notifier.notify([RQR1_UUID])  # thread still running
+        self.assertTrue(self.notifier.flush(1.0))
+        self.assertEqual(self.sent, [RQR1_UUID])
+
+    def test_shutdown(self):
+        self.notifier.shutdown()
+        self.notifier.notify([RQR1_UUID])
+        self.assertEqual(self.sent, [])
+        self.notifier.shutdown()        # safe to repeat
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_notifier',
+                    TestNotifier)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import uuid
+import unittest
+
+# ROS dependencies
+import unique_id
+from concert_msgs.msg import ConcertClient, ConcertClients
+from rocon_app_manager_msgs.msg import App
+from rocon_std_msgs.msg import PlatformInfo
+from scheduler_msgs.msg import Request, Resource
+from rocon_scheduler_requests.transitions import ActiveRequest
+
+# modules being tested:
+from concert_simple_scheduler.policy import *
+from concert_simple_scheduler.priority_queue import QueueElement
+from concert_simple_scheduler.resource_pool import InvalidRequestError
+from concert_simple_scheduler.scheduler_core import (LocalScheduler,
+                                                     SchedulerCore)
+
+# some definitions for testing
+RQR_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+TELEOP_RAPP = 'rocon_apps/teleop'
+DUDE1_NAME = 'rocon:/turtlebot/dude1'
+DUDE2_NAME = 'rocon:/turtlebot/dude2'
+
+
+def client(name):
+    return ConcertClient(name=name,
+                         platform_info=PlatformInfo(uri=name),
+                         apps=[App(name=TELEOP_RAPP)])
+
+
+def request(priority=0, width=1, availability=0.0, hold_time=0.0):
+    return ActiveRequest(Request(
+        id=unique_id.toMsg(unique_id.fromRandom()),
+        priority=priority, availability=availability, hold_time=hold_time,
+        resources=[Resource(rapp=TELEOP_RAPP, uri='rocon:/turtlebot')
+                   for i in range(width)]))
+
+
+def element(*args, **kwargs):
+    return QueueElement(request(*args, **kwargs), RQR_UUID)
+
+
+class FakeDuration(object):
+    def __init__(self, secs):
+        self.secs = secs
+
+    def to_sec(self):
+        return self.secs
+
+
+class TestPolicies(unittest.TestCase):
+    """Unit tests for scheduling policy sort keys.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_default(self):
+        policy = SchedulingPolicy()
+        self.assertLess(policy.order(element(priority=5)),
+                        policy.order(element(priority=1)))
+        self.assertIsNone(policy.admit(element()))
+        self.assertTrue(policy.block(element(), False))
+        self.assertFalse(policy.block(element(), True))
+        names = set([DUDE1_NAME, DUDE2_NAME])
+        self.assertEqual(policy.select(request(), names), names)
+
+    def test_edf(self):
+        policy = EarliestDeadlinePolicy()
+        self.assertLess(policy.order(element(availability=10.0)),
+                        policy.order(element(availability=20.0)))
+        self.assertLess(policy.order(element(availability=20.0)),
+                        policy.order(element()))
+        self.assertLess(policy.order(element(priority=1)),
+                        policy.order(element(availability=10.0)))
+
+    def test_make_policy(self):
+        self.assertIsInstance(make_policy('priority'), SchedulingPolicy)
+        self.assertIsInstance(make_policy('edf'), EarliestDeadlinePolicy)
+        self.assertIsInstance(make_policy('shortest'),
+                              ShortestRequestPolicy)
+        self.assertRaises(ValueError, make_policy, 'random')
+
+    def test_seconds(self):
+        self.assertEqual(seconds(2), 2.0)
+        self.assertEqual(seconds(FakeDuration(1.5)), 1.5)
+
+    def test_shortest(self):
+        policy = ShortestRequestPolicy()
+        self.assertLess(policy.order(element(hold_time=1.0)),
+                        policy.order(element(hold_time=5.0)))
+        self.assertLess(policy.order(element(hold_time=5.0)),
+                        policy.order(element()))
+        self.assertLess(policy.order(element(hold_time=5.0)),
+                        policy.order(element(hold_time=5.0, width=2)))
+        self.assertLess(policy.order(element(priority=1, hold_time=9.0)),
+                        policy.order(element(hold_time=1.0)))
+
+
+class AdmitOne(SchedulingPolicy):
+    """ Test policy rejecting requests for more than one resource,
+    and preferring higher-numbered resources. """
+
+    def admit(self, element):
+        if len(element.request.msg.resources) > 1:
+            raise InvalidRequestError('too wide')
+
+    def select(self, request, names):
+        return sorted(names, reverse=True)
+
+
+class NeverBlock(SchedulingPolicy):
+    """ Test policy that never blocks requests. """
+
+    def block(self, element, feasible):
+        return False
+
+
+class TestPolicyHooks(unittest.TestCase):
+    """Unit tests for scheduler core policy hooks.
+
+    These tests do not require a running ROS core.
+    """
+
+    def make_core(self, policy, clients=[DUDE1_NAME]):
+        core = SchedulerCore(policy=policy)
+        core.sch = LocalScheduler(core.callback)
+        core.track_clients(ConcertClients(
+            clients=[client(name) for name in clients]))
+        return core
+
+    def test_admit_and_select(self):
+        core = self.make_core(AdmitOne(), [DUDE1_NAME, DUDE2_NAME])
+        wide = request(width=2)
+        narrow = request()
+        core.sch.submit(RQR_UUID, [wide, narrow])
+        self.assertEqual(wide.msg.status, Request.CANCELING)
+        self.assertNotIn(wide.uuid, core.ready_queue)
+        self.assertNotIn(wide.uuid, core.granted)
+        self.assertEqual(core.metrics_sample()['rejected'], 1)
+        granted = core.granted[narrow.uuid].request
+        self.assertEqual(granted.msg.resources[0].uri, DUDE2_NAME)
+
+    def test_block(self):
+        core = self.make_core(SchedulingPolicy(), [])
+        rq = request()
+        core.sch.submit(RQR_UUID, [rq])
+        core.reschedule(None)
+        self.assertIn(rq.uuid, core.blocked_queue)
+
+        core = self.make_core(NeverBlock(), [])
+        rq = request()
+        core.sch.submit(RQR_UUID, [rq])
+        core.reschedule(None)
+        self.assertIn(rq.uuid, core.ready_queue)
+
+    def test_shortest_order(self):
+        core = self.make_core(ShortestRequestPolicy())
+        first = request()               # holds the only resource
+        core.sch.submit(RQR_UUID, [first])
+        long = request(hold_time=60.0)
+        short = request(hold_time=5.0)
+        core.sch.submit(RQR_UUID, [long, short])
+        self.assertEqual(core.ready_queue.peek().request.uuid, short.uuid)
+        granted = core.granted[first.uuid].request
+        granted.cancel()
+        core.sch.submit(RQR_UUID, [granted])
+        self.assertIn(short.uuid, core.granted)
+        self.assertIn(long.uuid, core.ready_queue)
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_policy',
+                    TestPolicies)
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_policy_hooks',
+                    TestPolicyHooks)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import io
+import os
+import shutil
+import tempfile
+import uuid
+import unittest
+
+# ROS dependencies
+import unique_id
+from scheduler_msgs.msg import CurrentStatus, KnownResources
+from scheduler_msgs.msg import Request, Resource
+from rocon_scheduler_requests.transitions import ActiveRequest
+
+# modules being tested:
+from concert_simple_scheduler.pool_file import *
+from concert_simple_scheduler import pool_file
+from concert_simple_scheduler.resource_pool import ResourcePool
+from concert_simple_scheduler.sharded_pool import ShardedResourcePool
+
+# some definitions for testing
+RQ_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+
+EXAMPLE_RAPP = 'tests/example_rapp'
+TELEOP_RAPP = 'rocon_apps/teleop'
+TEST_RAPPS = [TELEOP_RAPP, EXAMPLE_RAPP]
+
+BUZZ_NAME = 'rocon:/drone/buzz'
+MARVIN_NAME = 'rocon:/turtlebot/marvin'
+ROBERTO_NAME = 'rocon:/turtlebot/roberto'
+BUZZ = CurrentStatus(uri=BUZZ_NAME, rapps=[TELEOP_RAPP])
+MARVIN = CurrentStatus(uri=MARVIN_NAME, rapps=TEST_RAPPS)
+ROBERTO = CurrentStatus(uri=ROBERTO_NAME, rapps=TEST_RAPPS)
+FLEET = KnownResources(resources=[BUZZ, MARVIN, ROBERTO])
+
+
+def known(pool):
+    """ :returns: list of CurrentStatus messages for *pool*, sorted. """
+    return sorted(pool.known_resources().resources, key=lambda r: r.uri)
+
+
+class TestPoolFile(unittest.TestCase):
+    """Unit tests for the binary resource pool file format.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'pool.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def allocated_pool(self, engine=None):
+        pool = ResourcePool(FLEET, engine=engine)
+        pool.restore_allocation(Resource(rapp=TELEOP_RAPP, uri=MARVIN_NAME),
+                                RQ_UUID, 10)
+        return pool
+
+    def write(self, pool):
+        with open(self.path, 'wb') as f:
+            dump(pool, f)
+
+    def check_loaded(self, loaded, pool):
+        self.assertEqual(len(loaded), len(pool))
+        self.assertEqual(known(loaded), known(pool))
+        self.assertEqual(loaded[MARVIN_NAME].owner, RQ_UUID)
+        self.assertEqual(loaded[MARVIN_NAME].priority, 10)
+        self.assertEqual(loaded[MARVIN_NAME].rapps, set(TEST_RAPPS))
+        self.assertEqual(loaded.owned, {RQ_UUID: set([MARVIN_NAME])})
+        self.assertEqual(loaded.by_priority, {10: set([MARVIN_NAME])})
+        self.assertEqual(loaded.match_list([Resource(rapp=TELEOP_RAPP,
+                                                     uri=MARVIN_NAME)],
+                                           set([CurrentStatus.AVAILABLE])),
+                         [])
+
+    def test_empty_pool(self):
+        self.write(ResourcePool())
+        pool_file = PoolFile(self.path)
+        self.assertEqual(len(pool_file), 0)
+        self.assertEqual(list(pool_file), [])
+        pool_file.close()
+        self.assertEqual(len(load(self.path)), 0)
+
+    def test_invalid_file(self):
+        open(self.path, 'wb').close()
+        self.assertRaises(PoolFileError, PoolFile, self.path)
+        with open(self.path, 'wb') as f:
+            f.write(b'not a resource pool file, just some text')
+        self.assertRaises(PoolFileError, PoolFile, self.path)
+
+    def test_pool_file_records(self):
+        self.write(self.allocated_pool())
+        pool_file = PoolFile(self.path)
+        self.assertEqual(len(pool_file), 3)
+        self.assertEqual(pool_file.uris,
+                         [BUZZ_NAME, MARVIN_NAME, ROBERTO_NAME])
+        self.assertEqual(sorted(pool_file.rapps), sorted(TEST_RAPPS))
+        marvin = pool_file[1]
+        self.assertEqual(marvin.uri, MARVIN_NAME)
+        self.assertEqual(marvin.status, CurrentStatus.ALLOCATED)
+        self.assertEqual(marvin.owner, RQ_UUID)
+        self.assertEqual(marvin.rapps, set(TEST_RAPPS))
+        self.assertEqual(pool_file[-1].uri, ROBERTO_NAME)
+        self.assertIsNone(pool_file[-1].owner)
+        self.assertRaises(IndexError, pool_file.__getitem__, 3)
+        self.assertEqual([res.uri for res in pool_file],
+                         [BUZZ_NAME, MARVIN_NAME, ROBERTO_NAME])
+        pool_file.close()
+
+    def test_round_trip(self):
+        pool = self.allocated_pool()
+        self.write(pool)
+        self.check_loaded(load(self.path), pool)
+
+    def test_sharded_pool(self):
+        pool = ShardedResourcePool(FLEET)
+        pool.restore_allocation(Resource(rapp=TELEOP_RAPP, uri=MARVIN_NAME),
+                                RQ_UUID, 10)
+        self.write(pool)
+        self.check_loaded(load(self.path), pool)
+
+    def test_stream(self):
+        stream = io.BytesIO()
+        dump(self.allocated_pool(), stream)
+        data = stream.getvalue()
+        self.assertTrue(data.startswith(MAGIC))
+        self.assertTrue(data.endswith(MAGIC))
+        with open(self.path, 'wb') as f:
+            f.write(data[:-1])          # truncated
+        self.assertRaises(PoolFileError, load, self.path)
+
+    @unittest.skipIf(pool_file.numpy is None, 'NumPy not available')
+    def test_columnar_round_trip(self):
+        pool = self.allocated_pool(engine='columnar')
+        self.write(pool)
+        self.check_loaded(load(self.path, engine='columnar'), pool)
+        self.check_loaded(load(self.path), pool)
+        self.write(self.allocated_pool())
+        loaded = load(self.path, engine='columnar')
+        self.check_loaded(loaded, pool)
+        self.assertTrue(loaded.allocate(
+            ActiveRequest(Request(id=unique_id.toMsg(uuid.uuid4()),
+                                  resources=[Resource(rapp=EXAMPLE_RAPP,
+                                                      uri=ROBERTO_NAME)]))))
+        loaded.release_resources([Resource(rapp=TELEOP_RAPP,
+                                           uri=MARVIN_NAME)])
+        self.assertEqual(loaded.owned.keys(), loaded._owner_slots.keys())
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_pool_file',
+                    TestPoolFile)
@@ -19,6 +19,8 @@ from concert_simple_scheduler.priority_queue import *
 
 # some resources for testing
 RQR_ID = uuid.uuid4()
+RQR_A = uuid.UUID('00000000-0000-0000-0000-00000000000a')
+RQR_B = uuid.UUID('00000000-0000-0000-0000-00000000000b')
 RQ1_UUID = uuid.uuid4()
 RQ2_UUID = uuid.uuid4()
 EXAMPLE_RAPP = 'tests/example_rapp'
@@ -38,6 +40,12 @@ ROBERTO_REQUEST = ActiveRequest(Request(
     resources=[ROBERTO_RESOURCE]))
 
 
+def request(priority=0, width=1):
+    return ActiveRequest(Request(id=unique_id.toMsg(uuid.uuid4()),
+                                 priority=priority,
+                                 resources=[MARVIN_RESOURCE] * width))
+
+
 ###############################
 # queue element tests
 ###############################
@@ -186,6 +194,29 @@ class TestPriorityQueue(unittest.TestCase):
         self.assertNotIn(RQ1_UUID, pq0)
         self.assertNotIn(RQ2_UUID, pq0)
 
+    def test_iteration(self):
+        pq = PriorityQueue()
+        self.assertEqual(list(pq), [])
+        marvin = QueueElement(MARVIN_REQUEST, RQR_ID)
+        roberto = QueueElement(ROBERTO_REQUEST, RQR_ID)
+        pq.add(marvin)
+        pq.add(roberto)
+        self.assertEqual(sorted(pq), [marvin, roberto])
+        pq.remove(RQ1_UUID)
+        self.assertEqual(list(pq), [roberto])
+
+    def test_key_function(self):
+        pq = PriorityQueue(key=lambda elem: elem.request.msg.priority)
+        pq.add(QueueElement(MARVIN_REQUEST, RQR_ID))
+        pq.add(QueueElement(ROBERTO_REQUEST, RQR_ID))
+        self.assertEqual(pq.peek().request.uuid, RQ1_UUID)
+        pq.add(QueueElement(MARVIN_REQUEST, RQR_ID), priority=10)
+        self.assertEqual(pq.peek().sort_key, 0)
+        self.assertEqual(pq.pop().request.uuid, RQ2_UUID)
+        qe = pq.pop()
+        self.assertEqual(qe.request.uuid, RQ1_UUID)
+        self.assertEqual(qe.sort_key, 10)
+
     def test_one_request_constructor(self):
         elem = QueueElement(ROBERTO_REQUEST, RQR_ID)
         pq = PriorityQueue([elem])
@@ -197,6 +228,18 @@ class TestPriorityQueue(unittest.TestCase):
         self.assertEqual(len(pq), 0)
         self.assertMultiLineEqual(str(rq1.request), str(ROBERTO_REQUEST))
 
+    def test_peek_after_remove(self):
+        pq = PriorityQueue()
+        elems = [QueueElement(request(), RQR_ID) for i in range(8)]
+        for elem in elems:
+            pq.add(elem)
+        pq.remove(elems[0])
+        self.assertEqual(pq.peek(), elems[1])
+        pq.remove(elems[1])
+        pq.remove(elems[2])
+        self.assertEqual(pq.peek(), elems[3])
+        self.assertEqual(pq.pop(), elems[3])
+
     def test_pop_one_request(self):
         pq = PriorityQueue()
         pq.add(QueueElement(MARVIN_REQUEST, RQR_ID))
@@ -224,11 +267,28 @@ class TestPriorityQueue(unittest.TestCase):
         roberto = QueueElement(ROBERTO_REQUEST, RQR_ID)
         pq.add(roberto)
         self.assertEqual(len(pq), 2)
-        pq.remove(RQ1_UUID)
+        self.assertEqual(pq.remove(RQ1_UUID), marvin)
         self.assertEqual(pq.peek(), roberto)
         self.assertEqual(len(pq), 1)
         self.assertMultiLineEqual(str(pq.pop().request), str(ROBERTO_REQUEST))
 
+    def test_requeue(self):
+        pq = PriorityQueue()
+        elems = [QueueElement(request(), RQR_ID) for i in range(3)]
+        for elem in elems:
+            pq.add(elem)
+        first = pq.pop()
+        second = pq.pop()
+        pq.requeue(second)
+        pq.requeue(first)
+        self.assertEqual(len(pq), 3)
+        self.assertEqual(list(pq.signatures()), [first.signature])
+        self.assertIn(first, pq)
+        self.assertIs(pq.pop(), first)  # not copied
+        self.assertIs(pq.pop(), second)
+        pq.remove(pq.peek())
+        self.assertEqual(list(pq.signatures()), [])
+
     def test_two_request_constructor(self):
         pq = PriorityQueue([
                 QueueElement(MARVIN_REQUEST, RQR_ID),
@@ -245,6 +305,138 @@ class TestPriorityQueue(unittest.TestCase):
         self.assertEqual(len(pq), 0)
         self.assertMultiLineEqual(str(rq2.request), str(ROBERTO_REQUEST))
 
+
+class TestFairShareQueue(unittest.TestCase):
+    """Unit tests for weighted fair share request queue class.
+
+    These tests do not require a running ROS core.
+    """
+    def fill(self, fq, requester_id, n, priority=0, width=1):
+        elems = [QueueElement(request(priority, width), requester_id)
+                 for i in range(n)]
+        for elem in elems:
+            fq.add(elem)
+        return elems
+
+    def pop_requesters(self, fq, n):
+        return [fq.pop().requester_id for i in range(n)]
+
+    def test_bad_weight(self):
+        self.assertRaises(ValueError, FairShareQueue, weights={RQR_ID: 0})
+
+    def test_empty(self):
+        fq = FairShareQueue()
+        self.assertEqual(len(fq), 0)
+        self.assertEqual(list(fq), [])
+        self.assertRaises(IndexError, fq.pop)
+        self.assertRaises(IndexError, fq.peek)
+        self.assertNotIn(RQ1_UUID, fq)
+
+    def test_idle_requester(self):
+        fq = FairShareQueue()
+        self.fill(fq, RQR_A, 10)
+        self.assertEqual(self.pop_requesters(fq, 6), [RQR_A] * 6)
+        self.fill(fq, RQR_B, 3)         # no credit for being idle
+        self.assertEqual(self.pop_requesters(fq, 6),
+                         [RQR_B, RQR_A, RQR_B, RQR_A, RQR_B, RQR_A])
+
+    def test_interleave(self):
+        fq = FairShareQueue()
+        self.fill(fq, RQR_A, 6)
+        self.fill(fq, RQR_B, 2)
+        self.assertEqual(len(fq), 8)
+        self.assertEqual(self.pop_requesters(fq, 8),
+                         [RQR_A, RQR_B, RQR_A, RQR_B] + [RQR_A] * 4)
+
+    def test_forget_idle(self):
+        fq = FairShareQueue()
+        self.fill(fq, RQR_A, 1)
+        self.fill(fq, RQR_B, 3)
+        self.assertEqual(self.pop_requesters(fq, 2), [RQR_A, RQR_B])
+        self.assertIn(RQR_A, fq._finish)  # still ahead of virtual time
+        self.assertEqual(self.pop_requesters(fq, 1), [RQR_B])
+        self.assertNotIn(RQR_A, fq._finish)
+        self.assertIn(RQR_B, fq._finish)
+        b = self.fill(fq, RQR_B, 1)
+        fq.remove(b[0])                 # idle, but still ahead
+        self.assertIn(RQR_B, fq._finish)
+        self.assertEqual(self.pop_requesters(fq, 1), [RQR_B])
+        self.fill(fq, RQR_A, 2)
+        self.assertEqual(self.pop_requesters(fq, 2), [RQR_A, RQR_A])
+        self.assertEqual(list(fq._finish), [RQR_A])
+
+    def test_key_function(self):
+        # the key orders each requester's own requests, and the heads
+        fq = FairShareQueue(key=lambda elem: -len(elem.request.msg.resources))
+        a = [QueueElement(request(0, width), RQR_A) for width in (1, 2)]
+        b = [QueueElement(request(0, width), RQR_B) for width in (1, 2)]
+        for elem in a + b:
+            fq.add(elem)
+        self.assertEqual([fq.pop() for i in range(4)],
+                         [a[1], b[1], a[0], b[0]])
+
+    def test_priority(self):
+        fq = FairShareQueue()
+        self.fill(fq, RQR_A, 4)
+        urgent = self.fill(fq, RQR_B, 2, priority=3)
+        self.assertEqual(fq.peek(), urgent[0])
+        self.assertEqual([fq.pop(), fq.pop()], urgent)
+        self.assertEqual(self.pop_requesters(fq, 4), [RQR_A] * 4)
+
+    def test_readd_refunds(self):
+        fq = FairShareQueue()
+        self.fill(fq, RQR_A, 3)
+        elem = fq.pop()
+        start = elem.virtual_start
+        fq.add(elem)                    # deferred, as by dispatch()
+        self.fill(fq, RQR_B, 1)
+        self.assertEqual(fq.pop(), elem)
+        self.assertEqual(elem.virtual_start, start)
+        self.assertEqual(self.pop_requesters(fq, 2), [RQR_B, RQR_A])
+
+    def test_remove(self):
+        fq = FairShareQueue()
+        a = self.fill(fq, RQR_A, 2)
+        b = self.fill(fq, RQR_B, 2)
+        self.assertIn(a[0], fq)
+        self.assertEqual(sorted(fq), sorted(a + b))
+        self.assertEqual(fq.remove(a[0].request.uuid), a[0])
+        self.assertNotIn(a[0], fq)
+        self.assertRaises(KeyError, fq.remove, a[0])
+        self.assertEqual(len(fq), 3)
+        self.assertEqual(fq.pop(), a[1])
+        fq.remove(b[1])
+        self.assertEqual(fq.pop(), b[0])
+        self.assertEqual(len(fq), 0)
+
+    def test_requeue_refunds(self):
+        fq = FairShareQueue()
+        self.fill(fq, RQR_A, 3)
+        elem = fq.pop()
+        start = elem.virtual_start
+        fq.requeue(elem)                # deferred, as by dispatch()
+        self.assertIn(elem, fq)
+        self.fill(fq, RQR_B, 1)
+        self.assertIs(fq.pop(), elem)
+        self.assertEqual(elem.virtual_start, start)
+        self.assertEqual(self.pop_requesters(fq, 2), [RQR_B, RQR_A])
+
+    def test_weights(self):
+        fq = FairShareQueue(weights={RQR_A: 2.0})
+        self.fill(fq, RQR_A, 8)
+        self.fill(fq, RQR_B, 8)
+        served = self.pop_requesters(fq, 9)
+        self.assertEqual(served.count(RQR_A), 6)
+        self.assertEqual(served.count(RQR_B), 3)
+
+    def test_width(self):
+        fq = FairShareQueue()
+        self.fill(fq, RQR_A, 4, width=3)
+        self.fill(fq, RQR_B, 4, width=1)
+        served = self.pop_requesters(fq, 4)
+        self.assertEqual(served.count(RQR_A), 1)
+        self.assertEqual(served.count(RQR_B), 3)
+
 if __name__ == '__main__':
     import rosunit
     rosunit.unitrun('concert_simple_scheduler',
@@ -253,3 +445,6 @@ if __name__ == '__main__':
     rosunit.unitrun('concert_simple_scheduler',
                     'test_priority_queue',
                     TestPriorityQueue)
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_fair_share_queue',
+                    TestFairShareQueue)
@@ -19,6 +19,7 @@ from rocon_scheduler_requests.transitions import ActiveRequest
 
 # module being tested:
 from concert_simple_scheduler.resource_pool import *
+from concert_simple_scheduler.match_stats import MatchStats
 
 # some definitions for testing
 RQ_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
@@ -164,6 +165,73 @@ class TestResourcePool(unittest.TestCase):
         self.assertEqual(alloc[1],
                          Resource(rapp=EXAMPLE_RAPP, uri=MARVIN_NAME))
 
+    def test_allocate_with_exclusions(self):
+        pool = ResourcePool(DOUBLETON_POOL)
+        rq = copy.deepcopy(ANY_REQUEST)
+        self.assertEqual(pool.allocate(rq, set([MARVIN_NAME, ROBERTO_NAME])),
+                         [])
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.AVAILABLE)
+        alloc = pool.allocate(rq, set([MARVIN_NAME]))
+        self.assertEqual([res.uri for res in alloc], [ROBERTO_NAME])
+
+        # excluded resources do not make a request invalid
+        pool = ResourcePool(KnownResources(resources=[
+                    CurrentStatus(uri=MARVIN_NAME,
+                                  rapps={TELEOP_RAPP, EXAMPLE_RAPP}),
+                    CurrentStatus(uri=ROBERTO_NAME,
+                                  rapps={TELEOP_RAPP})]))
+        rq = ActiveRequest(Request(
+                id=unique_id.toMsg(RQ_UUID),
+                resources=[Resource(rapp=TELEOP_RAPP, uri=ANY_NAME),
+                           Resource(rapp=EXAMPLE_RAPP, uri=MARVIN_NAME)]))
+        self.assertEqual(pool.allocate(rq, set([ROBERTO_NAME])), [])
+        self.assertEqual(len(pool.allocate(rq, set())), 2)
+
+        # but they do not hide one that is invalid anyway
+        pool = ResourcePool(KnownResources(resources=[
+                    MARVIN, ROBERTO,
+                    CurrentStatus(uri=ANY_NAME + '/third',
+                                  rapps=TEST_RAPPS)]))
+        rq = ActiveRequest(Request(
+                id=unique_id.toMsg(RQ_UUID),
+                resources=[MARVIN_RESOURCE, MARVIN_RESOURCE,
+                           ANY_RESOURCE]))
+        self.assertRaises(InvalidRequestError, pool.allocate, rq, set())
+        self.assertRaises(InvalidRequestError, pool.allocate, rq,
+                          set([ROBERTO_NAME]))
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.AVAILABLE)
+
+    def test_candidates(self):
+        pool = ResourcePool(SINGLETON_POOL)
+        snap = pool.snapshot()
+        self.assertEqual(pool.match_list([ANY_RESOURCE],
+                                         {CurrentStatus.AVAILABLE}),
+                         [set([ROBERTO_NAME])])
+        self.assertEqual(len(pool._candidates), 1)
+
+        # shared by requests of the same shape, filtered by status
+        self.assertTrue(pool.allocate(copy.deepcopy(ANY_REQUEST)))
+        self.assertEqual(pool.match_list([ANY_RESOURCE],
+                                         {CurrentStatus.AVAILABLE}), [])
+        self.assertEqual(len(pool._candidates), 1)
+
+        # new members are candidates, but not in older snapshots
+        pool.update([
+                ConcertClient(
+                    name='roberto',
+                    platform_info=PlatformInfo(uri=ROBERTO_NAME),
+                    apps=[App(name=TELEOP_RAPP)]),
+                ConcertClient(
+                    name='marvin',
+                    platform_info=PlatformInfo(uri=MARVIN_NAME),
+                    apps=[App(name=TELEOP_RAPP)])])
+        self.assertEqual(pool.match_list([ANY_RESOURCE],
+                                         {CurrentStatus.AVAILABLE}),
+                         [set([MARVIN_NAME])])
+        self.assertEqual(snap.match_list([ANY_RESOURCE],
+                                         {CurrentStatus.AVAILABLE}),
+                         [set([ROBERTO_NAME])])
+
     def test_empty_constructor(self):
         pool = ResourcePool()
         self.assertIsNotNone(pool)
@@ -171,6 +239,7 @@ class TestResourcePool(unittest.TestCase):
         self.assertNotIn(MARVIN_NAME, pool)
         self.assertMultiLineEqual(str(pool), 'pool contents:')
         self.assertTrue(pool.changed)
+        self.assertFalse(pool.thread_safe)
         self.assertEqual(pool.known_resources(), KnownResources())
         self.assertFalse(pool.changed)
 
@@ -208,6 +277,83 @@ class TestResourcePool(unittest.TestCase):
         self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.ALLOCATED)
         self.assertEqual(pool[ROBERTO_NAME].owner, RQ_UUID)
 
+    def test_feasible(self):
+        pool = ResourcePool(SINGLETON_POOL)
+        self.assertEqual(pool.generation, 0)
+        self.assertTrue(pool.feasible([ANY_RESOURCE]))
+        self.assertFalse(pool.feasible([ANY_RESOURCE, ANY_RESOURCE]))
+        self.assertFalse(pool.feasible([NOT_TURTLEBOT_RESOURCE]))
+
+        # allocation does not change feasibility
+        self.assertTrue(pool.allocate(copy.deepcopy(ANY_REQUEST)))
+        self.assertEqual(pool.generation, 0)
+        self.assertTrue(pool.feasible([ANY_RESOURCE]))
+
+        # membership changes do
+        appeared = pool.update([
+                ConcertClient(
+                    name='marvin',
+                    platform_info=PlatformInfo(uri=MARVIN_NAME),
+                    apps=[App(name=TELEOP_RAPP)])])
+        self.assertEqual(appeared, [MARVIN_NAME])
+        self.assertEqual(pool.generation, 2)  # one added, one missing
+        self.assertTrue(pool.feasible([ANY_RESOURCE]))
+        self.assertFalse(pool.feasible([ROBERTO_RESOURCE]))
+        self.assertFalse(pool.feasible([ANY_RESOURCE, ANY_RESOURCE]))
+        appeared = pool.update([
+                ConcertClient(
+                    name='marvin',
+                    platform_info=PlatformInfo(uri=MARVIN_NAME),
+                    apps=[App(name=TELEOP_RAPP)])])
+        self.assertEqual(appeared, [])
+        self.assertEqual(pool.generation, 2)  # nothing new
+
+    def test_feasible_merge(self):
+        pool = ResourcePool(SINGLETON_POOL)
+        snap = pool.snapshot()
+        self.assertTrue(snap.feasible([ANY_RESOURCE]))
+        self.assertEqual(pool._feasible, {})
+        pool.merge_feasible(snap)
+        self.assertEqual(len(pool._feasible), 1)
+
+        # results are discarded after membership changes
+        snap = pool.snapshot()
+        self.assertFalse(snap.feasible([NOT_TURTLEBOT_RESOURCE]))
+        pool.update([])
+        pool.merge_feasible(snap)
+        self.assertNotIn(request_signature([NOT_TURTLEBOT_RESOURCE]),
+                         pool._feasible)
+        self.assertFalse(pool.feasible([ANY_RESOURCE]))
+
+    def test_membership(self):
+        pool = ResourcePool(DOUBLETON_POOL)
+        alloc = pool.allocate(copy.deepcopy(ROBERTO_REQUEST))
+        self.assertTrue(alloc)
+        pool.update([ConcertClient(
+                name='roberto',
+                platform_info=PlatformInfo(uri=ROBERTO_NAME),
+                apps=[App(name=TELEOP_RAPP)])])
+        members = pool.membership()
+        self.assertEqual(members.generation, pool.generation)
+        self.assertEqual(members[MARVIN_NAME].status, CurrentStatus.MISSING)
+        self.assertEqual(members[ROBERTO_NAME].status,
+                         CurrentStatus.AVAILABLE)
+        self.assertIsNone(members[ROBERTO_NAME].owner)
+        self.assertEqual(members[ROBERTO_NAME].rapps, set(TEST_RAPPS))
+        self.assertIsNot(members[ROBERTO_NAME], pool[ROBERTO_NAME])
+        self.assertFalse(pool._shared)
+
+        # reused until the membership changes
+        self.assertTrue(members.feasible([ANY_RESOURCE]))
+        self.assertFalse(members.feasible([MARVIN_RESOURCE]))
+        pool.merge_feasible(members)
+        self.assertEqual(len(pool._feasible), 2)
+        pool.release_resources(alloc)  # allocations do not matter
+        self.assertIs(pool.membership(), members)
+        pool.update([])
+        self.assertIsNot(pool.membership(), members)
+        self.assertFalse(pool.membership().feasible([ANY_RESOURCE]))
+
     def test_get_method(self):
         pool = ResourcePool(DOUBLETON_POOL)
         self.assertEqual(pool.get(ROBERTO_NAME), PoolResource(ROBERTO))
@@ -247,6 +393,46 @@ class TestResourcePool(unittest.TestCase):
         alloc = pool.allocate(rq)
         self.assertFalse(alloc)
 
+    def test_match_stats(self):
+        pool = ResourcePool(DOUBLETON_POOL)
+        self.assertIsNone(pool.stats)
+        pool.allocate(copy.deepcopy(ROBERTO_REQUEST))  # not counted
+        pool.stats = MatchStats()
+        self.assertEqual(pool.stats.allocations, 0)
+
+        rq = ActiveRequest(Request(id=unique_id.toMsg(DIFF_UUID),
+                                   resources=[ANY_RESOURCE]))
+        self.assertTrue(pool.allocate(rq))
+        stats = pool.stats.as_dict()
+        self.assertEqual(stats['allocations'], 1)
+        self.assertEqual(stats['allocations_granted'], 1)
+        self.assertEqual(stats['matches'], 1)
+        self.assertEqual(stats['resources_scanned'], 2)
+        self.assertEqual(stats['regex_evaluations'], 2)  # then cached
+        self.assertEqual(stats['permutations'], 1)
+        self.assertGreaterEqual(stats['allocate_time'],
+                                stats['max_allocate_time'])
+        self.assertGreaterEqual(stats['allocate_time'], stats['match_time'])
+
+        self.assertFalse(pool.allocate(copy.deepcopy(ANY_REQUEST)))
+        self.assertEqual(pool.stats.allocations, 2)
+        self.assertEqual(pool.stats.allocations_granted, 1)
+        self.assertEqual(pool.stats.permutations, 1)
+
+        self.assertEqual(pool.stats.regex_evaluations, 2)
+        self.assertEqual(pool.stats.cache_hits, 1)
+
+        self.assertTrue(pool.feasible([ANY_RESOURCE]))
+        self.assertTrue(pool.feasible([ANY_RESOURCE]))
+        self.assertEqual(pool.stats.cache_misses, 2)  # candidates, feasible
+        self.assertEqual(pool.stats.cache_hits, 3)
+        self.assertIn('allocations: 2', str(pool.stats))
+
+        pool.stats.reset()
+        self.assertEqual(pool.stats.allocations, 0)
+        self.assertEqual(pool.stats.allocate_time, 0.0)
+        self.assertEqual(set(pool.stats.as_dict().values()), set([0]))
+
     def test_matching_allocation_one_resource(self):
         pool = ResourcePool(SINGLETON_POOL)
         self.assertEqual(len(pool), 1)
@@ -344,6 +530,52 @@ class TestResourcePool(unittest.TestCase):
         self.assertEqual(pool.known_resources(), SINGLETON_POOL)
         self.assertFalse(pool.changed)
 
+    def test_preemption_victims(self):
+        pool = ResourcePool(KnownResources(resources=[
+                    CurrentStatus(uri=DUDE1_NAME, rapps={TELEOP_RAPP}),
+                    CurrentStatus(uri=DUDE2_NAME, rapps={TELEOP_RAPP}),
+                    CurrentStatus(uri=DUDE3_NAME, rapps={TELEOP_RAPP})]))
+        low1 = ActiveRequest(Request(id=unique_id.toMsg(TEST_UUID),
+                                     resources=[copy.deepcopy(ANY_RESOURCE),
+                                                copy.deepcopy(ANY_RESOURCE)],
+                                     priority=1))
+        low2 = ActiveRequest(Request(id=unique_id.toMsg(DIFF_UUID),
+                                     resources=[ANY_RESOURCE], priority=2))
+        self.assertTrue(pool.allocate(low1))
+        self.assertTrue(pool.allocate(low2))
+        self.assertEqual(len(pool.owned[TEST_UUID]), 2)
+        self.assertEqual(len(pool.by_priority[2]), 1)
+
+        # lowest priority is preempted first
+        high = ActiveRequest(Request(id=unique_id.toMsg(RQ_UUID),
+                                     resources=[ANY_RESOURCE], priority=5))
+        self.assertEqual(pool.preemption_victims(high), [TEST_UUID])
+        self.assertEqual(pool.preemption_victims(high, [DIFF_UUID]), [])
+
+        # equal priority may not preempt
+        high.msg.priority = 1
+        self.assertEqual(pool.preemption_victims(high), [])
+
+        # all three are needed, so both must go
+        high = ActiveRequest(Request(id=unique_id.toMsg(RQ_UUID),
+                                     resources=[copy.deepcopy(ANY_RESOURCE)
+                                                for i in range(3)],
+                                     priority=5))
+        self.assertEqual(sorted(pool.preemption_victims(high)),
+                         sorted([TEST_UUID, DIFF_UUID]))
+
+        # a specific resource only needs its owner preempted
+        held = list(pool.owned[DIFF_UUID])[0]
+        high = ActiveRequest(Request(
+            id=unique_id.toMsg(RQ_UUID),
+            resources=[Resource(rapp=TELEOP_RAPP, uri=held)], priority=5))
+        self.assertEqual(pool.preemption_victims(high), [DIFF_UUID])
+
+        low2.grant([Resource(rapp=TELEOP_RAPP, uri=held)])
+        pool.release_request(low2)
+        self.assertNotIn(DIFF_UUID, pool.owned)
+        self.assertNotIn(2, pool.by_priority)
+
     def test_release_one_resource(self):
         pool = ResourcePool(DOUBLETON_POOL)
         self.assertEqual(len(pool), 2)
@@ -385,6 +617,82 @@ class TestResourcePool(unittest.TestCase):
         self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.AVAILABLE)
         self.assertEqual(pool[ROBERTO_NAME].owner, None)
 
+    def test_restore_allocation(self):
+        pool = ResourcePool(SINGLETON_POOL)
+        self.assertTrue(pool.restore_allocation(ROBERTO_RESOURCE,
+                                                RQ_UUID, 10))
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(pool[ROBERTO_NAME].owner, RQ_UUID)
+        self.assertEqual(pool.by_priority[10], set([ROBERTO_NAME]))
+        self.assertTrue(pool.restore_allocation(ROBERTO_RESOURCE,
+                                                RQ_UUID, 10))
+        self.assertFalse(pool.restore_allocation(ROBERTO_RESOURCE,
+                                                 DIFF_UUID, 10))
+
+        # unknown resources stay missing until the conductor reports them
+        self.assertTrue(pool.restore_allocation(MARVIN_RESOURCE,
+                                                RQ_UUID, 10))
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.MISSING)
+        self.assertFalse(pool.feasible([MARVIN_RESOURCE]))
+        appeared = pool.update([
+                ConcertClient(
+                    name='marvin',
+                    platform_info=PlatformInfo(uri=MARVIN_NAME),
+                    apps=[App(name=TELEOP_RAPP)])])
+        self.assertEqual(appeared, [MARVIN_NAME])  # restored
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(pool[MARVIN_NAME].owner, RQ_UUID)
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.MISSING)
+        self.assertTrue(pool.feasible([MARVIN_RESOURCE]))
+        pool.release_resources([MARVIN_RESOURCE])
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.AVAILABLE)
+
+    def test_snapshot(self):
+        pool = ResourcePool(DOUBLETON_POOL)
+        rq = copy.deepcopy(ROBERTO_REQUEST)
+        alloc = pool.allocate(rq)
+        rq.grant(alloc)
+        snap = pool.snapshot()
+        self.assertEqual(len(snap), 2)
+        self.assertIs(snap[MARVIN_NAME], pool[MARVIN_NAME])  # shared
+
+        # allocate in the snapshot, the live pool does not change
+        self.assertTrue(snap.allocate(copy.deepcopy(ANY_REQUEST)))
+        self.assertEqual(snap[MARVIN_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertIsNot(snap[MARVIN_NAME], pool[MARVIN_NAME])
+        self.assertIs(snap[ROBERTO_NAME], pool[ROBERTO_NAME])
+        self.assertNotIn(MARVIN_NAME, pool.by_priority.get(0, set()))
+
+        # release in the live pool, the snapshot does not change
+        pool.release_request(rq)
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertEqual(snap[ROBERTO_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(snap[ROBERTO_NAME].owner, RQ_UUID)
+
+        # membership changes are not shared either
+        snap.update([])
+        self.assertEqual(snap[ROBERTO_NAME].status, CurrentStatus.MISSING)
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertNotEqual(snap.generation, pool.generation)
+
+    def test_status_counts(self):
+        pool = ResourcePool(DOUBLETON_POOL)
+        self.assertEqual(pool.status_counts(),
+                         {CurrentStatus.AVAILABLE: 2,
+                          CurrentStatus.ALLOCATED: 0,
+                          CurrentStatus.MISSING: 0})
+        self.assertTrue(pool.allocate(copy.deepcopy(ROBERTO_REQUEST)))
+        self.assertEqual(pool.status_counts(),
+                         {CurrentStatus.AVAILABLE: 1,
+                          CurrentStatus.ALLOCATED: 1,
+                          CurrentStatus.MISSING: 0})
+        pool.update([])
+        self.assertEqual(pool.status_counts(),
+                         {CurrentStatus.AVAILABLE: 0,
+                          CurrentStatus.ALLOCATED: 0,
+                          CurrentStatus.MISSING: 2})
+
     def test_two_resource_constructor(self):
         pool = ResourcePool(DOUBLETON_POOL)
         self.assertEqual(len(pool), 2)
@@ -528,6 +836,15 @@ class TestPoolResource(unittest.TestCase):
         res4.release()
         self.assertEqual(res4.status, CurrentStatus.MISSING)
 
+    def test_request_signature(self):
+        self.assertEqual(request_signature([ROBERTO_RESOURCE, ANY_RESOURCE]),
+                         request_signature([ANY_RESOURCE, ROBERTO_RESOURCE]))
+        self.assertEqual(request_signature([ANY_RESOURCE]),
+                         ((ANY_NAME, TELEOP_RAPP),))
+        self.assertNotEqual(request_signature([ANY_RESOURCE]),
+                            request_signature([ROBERTO_RESOURCE]))
+        self.assertEqual(request_signature([]), ())
+
     def test_rocon_name(self):
         self.assertEqual(rocon_name(TEST_RESOURCE_NAME), TEST_RESOURCE_NAME)
         self.assertEqual(rocon_name(TEST_ANOTHER_NAME), TEST_ANOTHER_NAME)
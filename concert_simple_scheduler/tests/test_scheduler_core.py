@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import copy
+import os
+import shutil
+import tempfile
+import uuid
+import unittest
+
+# ROS dependencies
+import unique_id
+from concert_msgs.msg import ConcertClient, ConcertClients
+from rocon_app_manager_msgs.msg import App
+from rocon_std_msgs.msg import PlatformInfo
+from scheduler_msgs.msg import CurrentStatus, Request, Resource
+from rocon_scheduler_requests.transitions import ActiveRequest
+
+# module being tested:
+from concert_simple_scheduler.scheduler_core import *
+from concert_simple_scheduler.journal import Journal
+
+# some definitions for testing
+RQR_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+RQR2_UUID = uuid.UUID('01234567-89ab-cdef-fedc-ba9876543210')
+TELEOP_RAPP = 'rocon_apps/teleop'
+DUDE1_NAME = 'rocon:/turtlebot/dude1'
+DUDE2_NAME = 'rocon:/turtlebot/dude2'
+DRONE_NAME = 'rocon:/drone/bee1'
+
+
+def client(name):
+    return ConcertClient(name=name,
+                         platform_info=PlatformInfo(uri=name),
+                         apps=[App(name=TELEOP_RAPP)])
+
+
+def request(priority=0):
+    return ActiveRequest(Request(
+        id=unique_id.toMsg(unique_id.fromRandom()),
+        priority=priority,
+        resources=[Resource(rapp=TELEOP_RAPP, uri='rocon:/turtlebot')]))
+
+
+class TestSchedulerCore(unittest.TestCase):
+    """Unit tests for the transport-independent scheduler policy.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.notified = []
+        self.core = SchedulerCore()
+        self.sch = LocalScheduler(self.core.callback, self.notified.append)
+        self.core.sch = self.sch
+
+    def granted_then_restarted(self):
+        """ Grant a request with a journal, then restart the core.
+
+        :returns: granted copy of the request message.
+        """
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'scheduler.journal')
+        self.core.journal = Journal(path)
+        self.core.track_clients(ConcertClients(clients=[client(DUDE1_NAME)]))
+        rq = request()
+        self.sch.submit(RQR_UUID, [rq])
+        msg = copy.deepcopy(self.core.granted[rq.uuid].request.msg)
+        self.core.journal.close()
+
+        self.core = SchedulerCore()
+        self.sch = LocalScheduler(self.core.callback, self.notified.append)
+        self.core.sch = self.sch
+        self.core.journal = Journal(path)
+        self.core.restore()
+        self.core.track_clients(ConcertClients(clients=[client(DUDE1_NAME)]))
+        self.assertIn(rq.uuid, self.core.restored)
+        self.assertEqual(self.core.pool[DUDE1_NAME].owner, rq.uuid)
+        return msg
+
+    def test_backfill(self):
+        self.core = SchedulerCore(dispatch_mode='backfill')
+        self.sch = LocalScheduler(self.core.callback, self.notified.append)
+        self.core.sch = self.sch
+        self.core.track_clients(ConcertClients(
+            clients=[client(DUDE1_NAME), client(DRONE_NAME)]))
+        busy = [request(priority=1) for i in range(3)]
+        self.sch.submit(RQR_UUID, busy)
+        self.assertIn(busy[0].uuid, self.core.granted)
+
+        # a lower-priority request for the drone goes around them
+        rq = ActiveRequest(Request(
+            id=unique_id.toMsg(unique_id.fromRandom()),
+            resources=[Resource(rapp=TELEOP_RAPP, uri='rocon:/drone')]))
+        self.sch.submit(RQR2_UUID, [rq])
+        self.assertIn(rq.uuid, self.core.granted)
+        self.assertIn(busy[1].uuid, self.core.ready_queue)
+        self.assertIn(busy[2].uuid, self.core.ready_queue)
+        self.assertEqual(len(list(self.core.ready_queue.signatures())), 1)
+
+    def test_batch_window(self):
+        later = []
+        self.core = SchedulerCore(batch_window=0.005)
+        self.core.call_later = lambda *args: later.append(args)
+        self.sch = LocalScheduler(self.core.callback, self.notified.append)
+        self.core.sch = self.sch
+        self.core.track_clients(ConcertClients(
+            clients=[client(DUDE1_NAME), client(DUDE2_NAME)]))
+        rq1 = request()
+        rq2 = request()
+        self.sch.submit(RQR_UUID, [rq1])
+        self.sch.submit(RQR2_UUID, [rq2])
+        self.assertEqual(len(later), 1)  # one window for both
+        self.assertEqual(later[0][0], 0.005)
+        self.assertEqual(len(self.core.ready_queue), 2)
+        self.assertEqual(self.notified, [])
+
+        later.pop()[1]()                # window ends
+        self.assertIn(rq1.uuid, self.core.granted)
+        self.assertIn(rq2.uuid, self.core.granted)
+        self.assertEqual(sorted(self.notified), sorted([RQR_UUID, RQR2_UUID]))
+        self.assertFalse(self.core.batch_pending)
+
+        # releases are batched too
+        granted = self.core.granted[rq1.uuid].request
+        granted.cancel()
+        self.sch.submit(RQR_UUID, [granted])
+        self.assertNotIn(rq1.uuid, self.core.granted)
+        self.assertEqual(len(later), 1)
+        later.pop()[1]()
+        self.assertFalse(self.core.batch_pending)
+
+    def test_cancel_after_restore(self):
+        msg = self.granted_then_restarted()
+        rq = ActiveRequest(msg)
+        rq.cancel()
+        self.sch.submit(RQR_UUID, [rq])
+        self.assertEqual(self.core.restored, {})
+        self.assertNotIn(rq.uuid, self.core.granted)
+        self.assertEqual(rq.msg.status, Request.CLOSED)
+        self.assertEqual(self.core.pool[DUDE1_NAME].status,
+                         CurrentStatus.AVAILABLE)
+
+    def test_empty(self):
+        self.assertEqual(len(self.core.ready_queue), 0)
+        self.assertEqual(len(self.core.blocked_queue), 0)
+        self.assertEqual(self.core.granted, {})
+        values = self.core.metrics_sample()
+        self.assertEqual(values['ready_queue'], 0)
+        self.assertEqual(values['granted'], 0)
+
+    def test_fair_share(self):
+        self.core = SchedulerCore(fair_share={})
+        self.sch = LocalScheduler(self.core.callback, self.notified.append)
+        self.core.sch = self.sch
+        busy = [request() for i in range(3)]
+        self.sch.submit(RQR_UUID, busy)
+        rq = request()
+        self.sch.submit(RQR2_UUID, [rq])
+        self.core.track_clients(ConcertClients(clients=[client(DUDE1_NAME)]))
+        self.assertIn(busy[0].uuid, self.core.granted)
+
+        # the other requester gets the next turn
+        granted = self.core.granted[busy[0].uuid].request
+        granted.cancel()
+        self.sch.submit(RQR_UUID, [granted])
+        self.assertIn(rq.uuid, self.core.granted)
+        self.assertEqual(len(self.core.ready_queue), 2)
+
+    def test_grant_and_free(self):
+        self.core.track_clients(ConcertClients(clients=[client(DUDE1_NAME)]))
+        rq = request()
+        self.sch.submit(RQR_UUID, [rq])
+        self.assertIn(rq.uuid, self.core.granted)
+        self.assertEqual(self.notified, [RQR_UUID])
+        granted = self.core.granted[rq.uuid].request
+        self.assertEqual(granted.msg.status, Request.GRANTED)
+        self.assertEqual(granted.msg.resources[0].uri, DUDE1_NAME)
+
+        granted.cancel()
+        self.sch.submit(RQR_UUID, [granted])
+        self.assertNotIn(rq.uuid, self.core.granted)
+        self.assertEqual(self.sch.requesters[RQR_UUID], {})
+        self.assertEqual(self.core.metrics_sample()['canceled'], 1)
+
+    def test_new_after_restore(self):
+        msg = self.granted_then_restarted()
+        msg.status = Request.NEW        # requester restarted too
+        rq = ActiveRequest(msg)
+        self.sch.submit(RQR_UUID, [rq])
+        self.assertEqual(self.core.restored, {})
+        granted = self.core.granted[rq.uuid].request
+        self.assertEqual(granted.msg.status, Request.GRANTED)
+        self.assertEqual(self.core.pool[DUDE1_NAME].owner, rq.uuid)
+
+        # dropping restored requests later leaves it alone
+        self.core.drop_restored(None)
+        self.assertIn(rq.uuid, self.core.granted)
+        self.assertEqual(self.core.pool[DUDE1_NAME].owner, rq.uuid)
+
+    def test_queue_until_available(self):
+        self.core.track_clients(ConcertClients(clients=[client(DUDE1_NAME)]))
+        rq1 = request()
+        rq2 = request()
+        self.sch.submit(RQR_UUID, [rq1])
+        self.sch.submit(RQR2_UUID, [rq2])
+        self.assertIn(rq1.uuid, self.core.granted)
+        self.assertNotIn(rq2.uuid, self.core.granted)
+        self.assertIn(rq2.uuid, self.core.ready_queue)
+
+        # a new client satisfies the waiting request
+        self.core.track_clients(ConcertClients(
+            clients=[client(DUDE1_NAME), client(DUDE2_NAME)]))
+        self.assertIn(rq2.uuid, self.core.granted)
+        self.assertEqual(len(self.core.ready_queue), 0)
+        self.assertEqual(
+            self.core.granted[rq2.uuid].request.msg.resources[0].uri,
+            DUDE2_NAME)
+
+    def test_unblock_reindexed(self):
+        # a request needing both a turtlebot and a drone
+        rq = ActiveRequest(Request(
+            id=unique_id.toMsg(unique_id.fromRandom()),
+            resources=[Resource(rapp=TELEOP_RAPP, uri='rocon:/turtlebot'),
+                       Resource(rapp=TELEOP_RAPP, uri='rocon:/drone')]))
+        self.core.track_clients(ConcertClients(clients=[client(DRONE_NAME)]))
+        self.sch.submit(RQR_UUID, [rq])
+        self.core.reschedule(None)
+        self.assertIn(rq.uuid, self.core.blocked_queue)
+
+        # the drone leaves as a turtlebot appears: still blocked
+        self.core.track_clients(ConcertClients(clients=[client(DUDE1_NAME)]))
+        self.assertIn(rq.uuid, self.core.blocked_queue)
+
+        # the drone returning must wake it
+        self.core.track_clients(ConcertClients(
+            clients=[client(DUDE1_NAME), client(DRONE_NAME)]))
+        self.assertNotIn(rq.uuid, self.core.blocked_queue)
+        self.assertIn(rq.uuid, self.core.granted)
+
+    def test_unknown_requester(self):
+        rq = request()
+        self.sch.submit(RQR_UUID, [rq])
+        self.assertIn(rq.uuid, self.core.ready_queue)
+        self.sch.remove(RQR_UUID)
+        self.core.notification_set.add(RQR_UUID)
+        self.core.notify_requesters()   # requester no longer known
+        self.assertNotIn(rq.uuid, self.core.ready_queue)
+        self.assertEqual(self.core.metrics_sample()['canceled'], 1)
+        self.assertEqual(self.core.notification_set, set())
+
+    def test_wait_timeout(self):
+        self.now = 0.0
+        later = []
+        self.core = SchedulerCore(wait_timeout=30.0)
+        self.core.clock = lambda: self.now
+        self.core.call_later = lambda *args: later.append(args)
+        self.sch = LocalScheduler(self.core.callback, self.notified.append)
+        self.core.sch = self.sch
+        self.core.track_clients(ConcertClients(clients=[client(DUDE1_NAME)]))
+        rq1 = request()
+        rq2 = request()
+        self.sch.submit(RQR_UUID, [rq1])
+        self.sch.submit(RQR2_UUID, [rq2])
+        self.assertIn(rq1.uuid, self.core.granted)
+        self.assertIn(rq2.uuid, self.core.ready_queue)
+        self.assertEqual(len(self.core.timers), 1)
+        self.assertEqual([delay for delay, func in later], [30.0])
+
+        self.now = 29.0
+        self.core.reschedule(None)
+        self.assertIn(rq2.uuid, self.core.ready_queue)
+
+        # the wakeup expires it, even with nothing else happening
+        self.now = 30.0
+        del self.notified[:]
+        later.pop()[1]()
+        self.assertNotIn(rq2.uuid, self.core.ready_queue)
+        self.assertEqual(self.notified, [RQR2_UUID])
+        self.assertIsNone(self.core.wakeup_time)
+        self.assertEqual(later, [])     # nothing left to wait for
+        self.assertEqual(self.core.metrics_sample()['expired'], 1)
+        self.assertEqual(self.core.timers.advance(100.0), [])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_scheduler_core',
+                    TestSchedulerCore)
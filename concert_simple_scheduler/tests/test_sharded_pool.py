@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import threading
+import uuid
+import unittest
+
+# ROS dependencies
+import unique_id
+from rocon_app_manager_msgs.msg import App
+from rocon_std_msgs.msg import PlatformInfo
+from concert_msgs.msg import ConcertClient
+from scheduler_msgs.msg import Request, Resource
+from scheduler_msgs.msg import CurrentStatus, KnownResources
+from rocon_scheduler_requests.transitions import ActiveRequest
+
+# module being tested:
+from concert_simple_scheduler.sharded_pool import *
+from concert_simple_scheduler import columnar_pool
+from concert_simple_scheduler.match_stats import MatchStats
+
+# some definitions for testing
+RQ_UUID = uuid.UUID('01234567-89ab-cdef-0123-456789abcdef')
+
+TELEOP_RAPP = 'rocon_apps/teleop'
+MARVIN_NAME = 'rocon:/turtlebot/marvin'
+ROBERTO_NAME = 'rocon:/turtlebot/roberto'
+BUZZ_NAME = 'rocon:/drone/buzz'
+MARVIN = CurrentStatus(uri=MARVIN_NAME, rapps=[TELEOP_RAPP])
+ROBERTO = CurrentStatus(uri=ROBERTO_NAME, rapps=[TELEOP_RAPP])
+BUZZ = CurrentStatus(uri=BUZZ_NAME, rapps=[TELEOP_RAPP])
+FLEET = KnownResources(resources=[MARVIN, ROBERTO, BUZZ])
+
+
+def request(*uris):
+    """ :returns: ActiveRequest for teleop on each of the *uris*. """
+    return ActiveRequest(Request(
+        id=unique_id.toMsg(RQ_UUID),
+        resources=[Resource(rapp=TELEOP_RAPP, uri=uri) for uri in uris]))
+
+
+class TestShardedResourcePool(unittest.TestCase):
+    """Unit tests for sharded resource pool class.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_constructor(self):
+        pool = ShardedResourcePool(FLEET)
+        self.assertEqual(len(pool), 3)
+        self.assertTrue(pool.thread_safe)
+        self.assertEqual(sorted(pool.shards.keys()), ['drone', 'turtlebot'])
+        self.assertIn(MARVIN_NAME, pool)
+        self.assertIn(BUZZ_NAME, pool)
+        self.assertNotIn('rocon:/pr2/farnsworth', pool)
+        self.assertEqual(pool[BUZZ_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertRaises(KeyError, pool.__getitem__, 'rocon:/pr2/x')
+        self.assertIsNone(pool.get('rocon:/pr2/x'))
+        self.assertTrue(pool.changed)
+        self.assertEqual(len(pool.known_resources().resources), 3)
+        self.assertFalse(pool.changed)
+
+    def test_literal_prefix(self):
+        self.assertEqual(literal_prefix('rocon:/turtlebot'),
+                         'rocon:/turtlebot')
+        self.assertEqual(literal_prefix('rocon:/turtlebot/.*'),
+                         'rocon:/turtlebot/')
+        self.assertEqual(literal_prefix('rocon:/turtlebots?/x'),
+                         'rocon:/turtlebot')
+        self.assertEqual(literal_prefix('rocon:/(segbot|turtlebot)'), '')
+        self.assertEqual(rocon_namespace(MARVIN_NAME), 'turtlebot')
+        self.assertEqual(rocon_namespace('turtlebot.marvin'), 'turtlebot')
+
+    def test_shard_keys(self):
+        pool = ShardedResourcePool(FLEET)
+        self.assertEqual(pool.shard_keys([Resource(uri='rocon:/turtlebot')]),
+                         set(['turtlebot']))
+        self.assertEqual(pool.shard_keys([Resource(uri='rocon:/drone/b.*')]),
+                         set(['drone']))
+        self.assertEqual(pool.shard_keys([Resource(uri='rocon:/.*/buzz')]),
+                         set(['drone', 'turtlebot']))
+        self.assertEqual(pool.shard_keys([Resource(uri='rocon:/pr2')]),
+                         set())
+
+    def test_allocate_one_shard(self):
+        pool = ShardedResourcePool(FLEET)
+        pool.known_resources()
+        rq = request(ROBERTO_NAME)
+        alloc = pool.allocate(rq)
+        self.assertEqual(len(alloc), 1)
+        self.assertEqual(pool[ROBERTO_NAME].owner, RQ_UUID)
+        self.assertTrue(pool.shards['turtlebot'].changed)
+        self.assertFalse(pool.shards['drone'].changed)
+        rq.grant(alloc)
+        pool.release_request(rq)
+        self.assertEqual(pool[ROBERTO_NAME].status, CurrentStatus.AVAILABLE)
+
+    def test_allocate_two_shards(self):
+        pool = ShardedResourcePool(FLEET)
+        rq = request('rocon:/.*/buzz', MARVIN_NAME)
+        alloc = pool.allocate(rq)
+        self.assertEqual([res.uri for res in alloc], [BUZZ_NAME, MARVIN_NAME])
+        self.assertEqual(pool[BUZZ_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(pool.match_list(rq.msg.resources,
+                                         {CurrentStatus.AVAILABLE}), [])
+        pool.release_resources(alloc)
+        self.assertEqual(pool[BUZZ_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.AVAILABLE)
+
+    def test_allocate_two_shards_snapshot(self):
+        for engine in ('object', 'columnar'):
+            if engine == 'columnar' and columnar_pool.numpy is None:
+                continue
+            pool = ShardedResourcePool(FLEET, engine=engine)
+            snap = pool.snapshot()
+            rq = request(ROBERTO_NAME, BUZZ_NAME)
+            self.assertTrue(pool.allocate(rq))
+            self.assertEqual(pool[ROBERTO_NAME].owner, RQ_UUID)
+            self.assertEqual(pool[BUZZ_NAME].owner, RQ_UUID)
+            self.assertEqual(pool.shards['drone'].owned,
+                             {RQ_UUID: set([BUZZ_NAME])})
+
+            # the snapshot does not change
+            for name in (ROBERTO_NAME, BUZZ_NAME):
+                self.assertEqual(snap[name].status, CurrentStatus.AVAILABLE)
+                self.assertIsNone(snap[name].owner)
+            self.assertEqual(snap.shards['drone'].owned, {})
+
+            # nor does the pool, when allocating in the snapshot
+            self.assertTrue(snap.allocate(request(MARVIN_NAME, BUZZ_NAME)))
+            self.assertEqual(pool[MARVIN_NAME].status,
+                             CurrentStatus.AVAILABLE)
+
+    def test_allocate_with_exclusions(self):
+        pool = ShardedResourcePool(FLEET)
+        rq = request('rocon:/.*/buzz', 'rocon:/turtlebot/.*')
+        self.assertEqual(pool.allocate(rq, set([BUZZ_NAME])), [])
+        alloc = pool.allocate(rq, set([MARVIN_NAME]))
+        self.assertEqual([res.uri for res in alloc], [BUZZ_NAME, ROBERTO_NAME])
+        self.assertEqual(pool.allocate(request(MARVIN_NAME),
+                                       set([MARVIN_NAME])), [])
+
+    def test_allocate_unknown_shard(self):
+        pool = ShardedResourcePool(FLEET)
+        self.assertEqual(pool.allocate(request('rocon:/pr2')), [])
+        self.assertRaises(InvalidRequestError, pool.allocate, request())
+
+    def test_match_stats(self):
+        pool = ShardedResourcePool(FLEET)
+        pool.stats = MatchStats()
+        self.assertIs(pool.shards['drone'].stats, pool.stats)
+        pool.allocate(request(MARVIN_NAME))
+        pool.allocate(request('rocon:/.*/buzz', ROBERTO_NAME))
+        self.assertEqual(pool.stats.allocations, 2)
+        self.assertEqual(pool.stats.allocations_granted, 2)
+        self.assertEqual(pool.stats.resources_scanned, 1 + 1 + 1)
+        pool.update([])                 # adds no shards
+        self.assertIs(pool.snapshot().stats, pool.stats)
+        pool.stats = None
+        self.assertIsNone(pool.shards['turtlebot'].stats)
+
+    def test_feasible_merge(self):
+        pool = ShardedResourcePool(FLEET)
+        snap = pool.snapshot()
+        self.assertTrue(snap.feasible(request(BUZZ_NAME).msg.resources))
+        self.assertEqual(pool._feasible, {})
+        pool.merge_feasible(snap)
+        self.assertEqual(len(pool._feasible), 1)
+        snap = pool.snapshot()
+        self.assertEqual(len(snap._feasible), 1)
+
+        # results are discarded after membership changes
+        self.assertFalse(snap.feasible(request('rocon:/pr2').msg.resources))
+        pool.update([])
+        pool.merge_feasible(snap)
+        self.assertEqual(len(pool._feasible), 1)
+        self.assertFalse(pool.feasible(request(BUZZ_NAME).msg.resources))
+
+    def test_membership(self):
+        pool = ShardedResourcePool(FLEET)
+        self.assertTrue(pool.allocate(request(BUZZ_NAME)))
+        members = pool.membership()
+        self.assertEqual(members.generation, pool.generation)
+        self.assertEqual(members[BUZZ_NAME].status, CurrentStatus.AVAILABLE)
+        self.assertFalse(pool.shards['drone']._shared)
+        self.assertTrue(members.feasible(request(BUZZ_NAME).msg.resources))
+        pool.merge_feasible(members)
+        self.assertEqual(len(pool._feasible), 1)
+        pool.update([])
+        self.assertNotEqual(members.generation, pool.generation)
+        self.assertFalse(pool.membership().feasible(
+            request(BUZZ_NAME).msg.resources))
+
+    def test_status_counts(self):
+        pool = ShardedResourcePool(FLEET)
+        self.assertTrue(pool.allocate(request(BUZZ_NAME)))
+        self.assertEqual(pool.status_counts(),
+                         {CurrentStatus.AVAILABLE: 2,
+                          CurrentStatus.ALLOCATED: 1,
+                          CurrentStatus.MISSING: 0})
+
+    def test_update_locks_one_shard(self):
+        pool = ShardedResourcePool(FLEET)
+        drones = [ConcertClient(name='buzz',
+                                platform_info=PlatformInfo(uri=BUZZ_NAME),
+                                apps=[App(name=TELEOP_RAPP)])]
+        with pool.locks['turtlebot']:
+            # another thread can still allocate drones
+            thread = threading.Thread(target=pool.allocate,
+                                      args=(request(BUZZ_NAME),))
+            thread.start()
+            thread.join(5.0)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(pool[BUZZ_NAME].status, CurrentStatus.ALLOCATED)
+        self.assertEqual(pool.update(drones), [])
+        self.assertEqual(pool[MARVIN_NAME].status, CurrentStatus.MISSING)
+        self.assertEqual(pool[BUZZ_NAME].status, CurrentStatus.ALLOCATED)
+        marvin = ConcertClient(name='marvin',
+                               platform_info=PlatformInfo(uri=MARVIN_NAME),
+                               apps=[App(name=TELEOP_RAPP)])
+        self.assertEqual(pool.update(drones + [marvin]), [MARVIN_NAME])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_sharded_pool',
+                    TestShardedResourcePool)
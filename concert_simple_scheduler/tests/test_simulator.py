@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import unittest
+
+# module being tested:
+from concert_simple_scheduler.simulator import *
+
+
+class TestSimulator(unittest.TestCase):
+    """Unit tests for the discrete-event scheduler simulator.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_empty_run(self):
+        sim = Simulator(clients=0, arrival_rate=1.0, reschedule_period=0.0)
+        results = sim.run(max_events=0)
+        self.assertEqual(results['events'], 0)
+        self.assertEqual(results['grants'], 0)
+        self.assertEqual(results['virtual_time'], 0.0)
+
+    def test_duration(self):
+        sim = Simulator(clients=4, arrival_rate=2.0)
+        results = sim.run(duration=10.0)
+        self.assertEqual(results['virtual_time'], 10.0)
+        self.assertGreater(results['arrivals'], 0)
+        results = sim.run(duration=5.0)
+        self.assertEqual(results['virtual_time'], 15.0)
+
+    def test_accounting(self):
+        sim = Simulator(clients=5, requesters=3, arrival_rate=4.0,
+                        hold_time=2.0, patience=1.0, max_resources=2,
+                        priorities=3, churn_rate=0.5)
+        results = sim.run(max_events=500)
+        self.assertEqual(results['events'], 500)
+        self.assertEqual(results['arrivals'],
+                         results['grants'] + results['abandons']
+                         + results['waiting'])
+        self.assertEqual(results['grants'],
+                         results['releases'] + results['holding'])
+        self.assertEqual(results['grants'], results['core_granted'])
+        self.assertEqual(results['latency_count'], results['grants'])
+        self.assertEqual(results['waiting'],
+                         results['core_ready_queue']
+                         + results['core_blocked_queue'])
+
+    def test_preemption(self):
+        core = SchedulerCore(preemption=True)
+        sim = Simulator(core, clients=2, arrival_rate=4.0, hold_time=5.0,
+                        priorities=4)
+        results = sim.run(max_events=300)
+        self.assertGreater(results['preemptions'], 0)
+        self.assertEqual(results['grants'], results['core_granted'])
+
+    def test_reproducible(self):
+        kwargs = dict(clients=3, arrival_rate=3.0, patience=2.0,
+                      churn_rate=0.2, seed=42)
+        first = Simulator(**kwargs).run(max_events=300)
+        second = Simulator(**kwargs).run(max_events=300)
+        for key in ['arrivals', 'grants', 'abandons', 'releases', 'churn',
+                    'virtual_time', 'latency_mean']:
+            self.assertEqual(first[key], second[key])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_simulator',
+                    TestSimulator)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import random
+import unittest
+
+# module being tested:
+from concert_simple_scheduler.timer_wheel import *
+
+
+class TestTimerWheel(unittest.TestCase):
+    """Unit tests for hierarchical timer wheel class.
+
+    These tests do not require a running ROS core.
+    """
+
+    def test_bad_resolution(self):
+        self.assertRaises(ValueError, TimerWheel, resolution=0.0)
+
+    def test_cascade(self):
+        tw = TimerWheel(slots=4, levels=2)
+        tw.add('a', 5.0)                # level one
+        tw.add('b', 40.0)               # overflow
+        self.assertEqual(tw.advance(4.0), [])
+        self.assertEqual(tw.advance(5.0), ['a'])
+        self.assertEqual(tw.advance(39.0), [])
+        self.assertEqual(tw.advance(40.0), ['b'])
+        self.assertEqual(len(tw), 0)
+
+    def test_empty(self):
+        tw = TimerWheel()
+        self.assertEqual(len(tw), 0)
+        self.assertNotIn('a', tw)
+        self.assertEqual(tw.advance(100.0), [])
+        self.assertEqual(tw.tick, 100)
+
+    def test_expire_once(self):
+        tw = TimerWheel()
+        tw.add('a', 2.5)
+        self.assertIn('a', tw)
+        self.assertEqual(tw.advance(2.9), [])  # never early
+        self.assertEqual(tw.advance(3.0), ['a'])
+        self.assertNotIn('a', tw)
+        self.assertEqual(tw.advance(10.0), [])
+
+    def test_jump(self):
+        tw = TimerWheel(slots=4, levels=2)
+        tw.add('a', 3.0)
+        tw.add('b', 1000.0)
+        self.assertEqual(tw.advance(500.0), ['a'])
+        self.assertEqual(tw.advance(999.0), [])
+        self.assertEqual(tw.advance(1000.0), ['b'])
+
+    def test_next_expiry(self):
+        tw = TimerWheel(slots=4, levels=2)
+        self.assertIsNone(tw.next_expiry())
+        tw.add('a', 2.5)
+        self.assertEqual(tw.next_expiry(), 3.0)
+        tw.add('b', 1.0)
+        self.assertEqual(tw.next_expiry(), 1.0)
+        tw.remove('b')
+        self.assertEqual(tw.next_expiry(), 1.0)  # early, never late
+        self.assertEqual(tw.advance(1.0), [])
+        self.assertEqual(tw.next_expiry(), 3.0)
+        tw.remove('a')
+        self.assertEqual(tw.advance(3.0), [])
+        tw.add('c', 9.0)                # level one
+        self.assertEqual(tw.next_expiry(), 8.0)
+        tw.add('d', 100.0)              # overflow
+        self.assertEqual(tw.advance(9.0), ['c'])
+        self.assertEqual(tw.next_expiry(), 16.0)
+        tw.add('e', 0.0)                # already due
+        self.assertEqual(tw.next_expiry(), 9.0)
+
+    def test_past_deadline(self):
+        tw = TimerWheel(start=10.0)
+        tw.add('a', 5.0)
+        self.assertEqual(tw.advance(10.0), ['a'])
+
+    def test_random(self):
+        rng = random.Random(7)
+        tw = TimerWheel(resolution=0.5, slots=8, levels=3)
+        deadlines = {}
+        now = 0.0
+        for i in range(2000):
+            key = rng.randrange(300)
+            if rng.random() < 0.2:
+                tw.remove(key)
+                deadlines.pop(key, None)
+            else:
+                deadline = now + rng.expovariate(0.02)
+                tw.add(key, deadline)
+                deadlines[key] = deadline
+            now += rng.expovariate(1.0)
+            expired = tw.advance(now)
+            for key in expired:
+                self.assertTrue(deadlines.pop(key) <= now)
+            for deadline in deadlines.values():
+                self.assertTrue(deadline > now - tw.resolution)
+        self.assertEqual(len(tw), len(deadlines))
+
+    def test_remove(self):
+        tw = TimerWheel()
+        tw.add('a', 5.0)
+        tw.add('b', 5.0)
+        tw.remove('a')
+        tw.remove('c')                  # not there
+        self.assertEqual(len(tw), 1)
+        self.assertEqual(tw.advance(6.0), ['b'])
+
+    def test_replace(self):
+        tw = TimerWheel()
+        tw.add('a', 5.0)
+        tw.add('a', 8.0)
+        self.assertEqual(len(tw), 1)
+        self.assertEqual(tw.advance(6.0), [])
+        self.assertEqual(tw.advance(8.0), ['a'])
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_timer_wheel',
+                    TestTimerWheel)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+# enable some python3 compatibility options:
+# (unicode_literals not compatible with python2 uuid module)
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+# module being tested:
+from concert_simple_scheduler.tracing import *
+
+
+@traced('double')
+def double(x):
+    """ Traced function for testing. """
+    if x is None:
+        raise ValueError('no value')
+    return 2 * x
+
+
+class TestTracing(unittest.TestCase):
+    """Unit tests for tracing hooks and sinks.
+
+    These tests do not require a running ROS core.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        set_sink(None)
+        shutil.rmtree(self.dir)
+
+    def test_disabled(self):
+        self.assertIsNone(get_sink())
+        self.assertEqual(double(21), 42)
+        self.assertEqual(double.__name__, 'double')
+
+    def test_ring_buffer(self):
+        sink = RingBufferSink(capacity=2)
+        self.assertIsNone(set_sink(sink))
+        self.assertIs(get_sink(), sink)
+        for i in range(3):
+            self.assertEqual(double(i), 2 * i)
+        self.assertRaises(ValueError, double, None)
+        events = sink.events()
+        self.assertEqual(len(events), 2)  # oldest ones discarded
+        name, start, duration, ident = events[-1]
+        self.assertEqual(name, 'double')
+        self.assertTrue(duration >= 0.0)
+        self.assertEqual(ident, threading.current_thread().ident)
+        self.assertIs(set_sink(None), sink)
+        double(1)
+        self.assertEqual(len(sink.events()), 2)
+
+    def test_chrome_trace(self):
+        path = os.path.join(self.dir, 'trace.json')
+        sink = make_sink('chrome', path)
+        set_sink(sink)
+        double(1)
+        double(2)
+        set_sink(None)
+        sink.close()
+        with open(path) as trace_file:
+            trace = json.load(trace_file)
+        events = trace['traceEvents']
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]['name'], 'double')
+        self.assertEqual(events[0]['ph'], 'X')
+        self.assertTrue(events[1]['ts'] >= events[0]['ts'])
+
+    def test_make_sink(self):
+        self.assertIsInstance(make_sink('null'), NullSink)
+        self.assertIsInstance(make_sink('ring'), RingBufferSink)
+        self.assertEqual(make_sink('chrome').path, 'scheduler_trace.json')
+        self.assertRaises(ValueError, make_sink, 'perfetto')
+        sink = NullSink()
+        set_sink(sink)
+        self.assertEqual(double(3), 6)
+        sink.close()
+
+    def test_sampling_profiler(self):
+        profiler = SamplingProfiler()
+        profiler.sample()
+        profiler.sample()
+        self.assertEqual(profiler.samples, 2)
+        stack, count = profiler.stacks.most_common(1)[0]
+        self.assertEqual(count, 2)
+        self.assertIn('test_tracing.py:test_sampling_profiler', stack)
+        path = os.path.join(self.dir, 'profile.txt')
+        profiler.write(path)
+        with open(path) as profile:
+            lines = profile.read().splitlines()
+        self.assertEqual(lines[0], stack + ' 2')
+
+    def test_sampling_thread(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        event = threading.Event()
+        event.wait(0.05)
+        profiler.stop()
+        self.assertTrue(profiler.samples > 0)
+        samples = profiler.samples
+        event.wait(0.01)
+        self.assertEqual(profiler.samples, samples)  # really stopped
+        profiler.stop()                 # safe to repeat
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('concert_simple_scheduler',
+                    'test_tracing',
+                    TestTracing)